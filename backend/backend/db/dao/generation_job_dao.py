@@ -0,0 +1,301 @@
+from datetime import timedelta
+from typing import List, Optional
+
+from fastapi import Depends
+from loguru import logger
+from sqlalchemy import and_, func, null, or_, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.db.dependencies import get_db_session
+from backend.db.models.generation_job import (
+    DONE,
+    FAILED,
+    QUEUED,
+    RUNNING,
+    GenerationJob,
+)
+
+# Channel the workers listen on, with the id of every new job.
+JOBS_CHANNEL = "generation_jobs"
+# Channel the web workers listen on, with the id of every finished job.
+DONE_CHANNEL = "generation_jobs_done"
+
+
+class GenerationJobDAO:
+    """
+    Class for accessing the generation job queue.
+
+    Every change is committed right away, so other processes see it and
+    the notifications (sent on commit) go out.
+    """
+
+    def __init__(self, session: AsyncSession = Depends(get_db_session)):
+        self.session = session
+
+    async def _notify(self, channel: str, job_id: str) -> None:
+        await self.session.execute(select(func.pg_notify(channel, job_id)))
+
+    async def enqueue(
+        self,
+        id: str,
+        prompt: str,
+        config: dict,
+        context: dict,
+        owner_id: str,
+        max_attempts: int,
+        retention: float = 0,
+    ) -> Optional[GenerationJob]:
+        """
+        Queue a generation and wake up a worker.
+
+        IDs derived from an idempotency key make retries find their job: a
+        job with the same ID is only queued again if it failed, or if it
+        finished more than ``retention`` seconds ago.
+
+        :param id: ID of the job.
+        :param prompt: prompt of the playlist.
+        :param config: generation config.
+        :param context: generation context.
+        :param owner_id: Spotify ID of the user.
+        :param max_attempts: runs before the job is failed.
+        :param retention: seconds a finished job answers its retries.
+        :return: the queued job, None if the existing job stands.
+        """
+        values = {
+            "id": id,
+            "status": QUEUED,
+            "prompt": prompt,
+            "config": config,
+            "context": context,
+            "owner_id": owner_id,
+            "attempts": 0,
+            "max_attempts": max_attempts,
+        }
+        stmt = insert(GenerationJob).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[GenerationJob.id],
+            set_={
+                **{name: stmt.excluded[name] for name in values if name != "id"},
+                "result": null(),
+                "error": null(),
+                "playlist_id": null(),
+                "locked_by": null(),
+                "run_after": func.now(),
+                "created_at": func.now(),
+                "updated_at": func.now(),
+            },
+            where=or_(
+                GenerationJob.status == FAILED,
+                and_(
+                    GenerationJob.status == DONE,
+                    GenerationJob.updated_at
+                    < func.now() - timedelta(seconds=retention),
+                ),
+            ),
+        ).returning(GenerationJob)
+        job = await self.session.scalar(
+            stmt, execution_options={"populate_existing": True}
+        )
+        if job is not None:
+            await self._notify(JOBS_CHANNEL, id)
+            logger.info(f"Queued generation job {id}")
+        await self.session.commit()
+        return job
+
+    async def get(self, id: str) -> Optional[GenerationJob]:
+        """
+        Get a job by ID.
+
+        :param id: ID of the job.
+        :return: the job if found, else None.
+        """
+        # Jobs change in other processes, never answer from the identity map.
+        query = (
+            select(GenerationJob)
+            .where(GenerationJob.id == id)
+            .execution_options(populate_existing=True)
+        )
+        return await self.session.scalar(query)
+
+    async def claim(
+        self, worker_id: str, visibility_timeout: float
+    ) -> Optional[GenerationJob]:
+        """
+        Take the next runnable job.
+
+        Jobs locked by a concurrent claim are skipped instead of waited for,
+        so workers never block each other. Running jobs whose worker stopped
+        renewing them are runnable again.
+
+        :param worker_id: ID of the claiming worker.
+        :param visibility_timeout: seconds the job stays reserved.
+        :return: the claimed job, or None if no job is runnable.
+        """
+        candidate = (
+            select(GenerationJob.id)
+            .where(
+                GenerationJob.status.in_((QUEUED, RUNNING)),
+                GenerationJob.run_after <= func.now(),
+                GenerationJob.attempts < GenerationJob.max_attempts,
+            )
+            .order_by(GenerationJob.run_after)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        stmt = (
+            update(GenerationJob)
+            .where(GenerationJob.id == candidate)
+            .values(
+                status=RUNNING,
+                attempts=GenerationJob.attempts + 1,
+                locked_by=worker_id,
+                run_after=func.now() + timedelta(seconds=visibility_timeout),
+            )
+            .returning(GenerationJob)
+            .execution_options(synchronize_session=False)
+        )
+        job = await self.session.scalar(stmt)
+        await self.session.commit()
+        return job
+
+    async def extend(self, id: str, worker_id: str, visibility_timeout: float) -> bool:
+        """
+        Keep a running job reserved.
+
+        :param id: ID of the job.
+        :param worker_id: ID of the worker running it.
+        :param visibility_timeout: seconds the job stays reserved from now.
+        :return: False if the job was claimed by another worker meanwhile.
+        """
+        stmt = (
+            update(GenerationJob)
+            .where(
+                GenerationJob.id == id,
+                GenerationJob.status == RUNNING,
+                GenerationJob.locked_by == worker_id,
+            )
+            .values(run_after=func.now() + timedelta(seconds=visibility_timeout))
+            .returning(GenerationJob.id)
+            .execution_options(synchronize_session=False)
+        )
+        extended = await self.session.scalar(stmt)
+        await self.session.commit()
+        return extended is not None
+
+    async def record_playlist(self, id: str, worker_id: str, playlist_id: str) -> bool:
+        """
+        Remember the Spotify playlist created by a run, for its retries.
+
+        :param id: ID of the job.
+        :param worker_id: ID of the worker running it.
+        :param playlist_id: ID of the created playlist.
+        :return: False if the job was claimed by another worker meanwhile.
+        """
+        stmt = (
+            update(GenerationJob)
+            .where(GenerationJob.id == id, GenerationJob.locked_by == worker_id)
+            .values(playlist_id=playlist_id)
+            .returning(GenerationJob.id)
+            .execution_options(synchronize_session=False)
+        )
+        recorded = await self.session.scalar(stmt)
+        await self.session.commit()
+        return recorded is not None
+
+    async def complete(self, id: str, worker_id: str, result: dict) -> bool:
+        """
+        Store the result of a job and notify the web workers.
+
+        :param id: ID of the job.
+        :param worker_id: ID of the worker that ran it.
+        :param result: generated playlist.
+        :return: False if the job was claimed by another worker meanwhile.
+        """
+        stmt = (
+            update(GenerationJob)
+            .where(GenerationJob.id == id, GenerationJob.locked_by == worker_id)
+            .values(status=DONE, result=result, error=None, locked_by=None)
+            .returning(GenerationJob.id)
+            .execution_options(synchronize_session=False)
+        )
+        completed = await self.session.scalar(stmt)
+        if completed is not None:
+            await self._notify(DONE_CHANNEL, id)
+        await self.session.commit()
+        return completed is not None
+
+    async def fail(
+        self,
+        id: str,
+        worker_id: str,
+        error: str,
+        retry_in: Optional[float] = None,
+    ) -> Optional[str]:
+        """
+        Record a failed run, queueing the job again if it can be retried.
+
+        :param id: ID of the job.
+        :param worker_id: ID of the worker that ran it.
+        :param error: error of the run.
+        :param retry_in: seconds before the retry, None if not retryable.
+        :return: the new status, None if another worker claimed the job.
+        """
+        retry = retry_in is not None
+        stmt = (
+            update(GenerationJob)
+            .where(GenerationJob.id == id, GenerationJob.locked_by == worker_id)
+            .values(
+                status=QUEUED if retry else FAILED,
+                error=error,
+                locked_by=None,
+                run_after=func.now() + timedelta(seconds=retry_in or 0),
+            )
+            .returning(GenerationJob.attempts, GenerationJob.max_attempts)
+            .execution_options(synchronize_session=False)
+        )
+        row = (await self.session.execute(stmt)).first()
+        if row is None:
+            await self.session.commit()
+            return None
+        status = QUEUED if retry else FAILED
+        if retry and row.attempts >= row.max_attempts:
+            await self.session.execute(
+                update(GenerationJob)
+                .where(GenerationJob.id == id)
+                .values(status=FAILED)
+                .execution_options(synchronize_session=False),
+            )
+            status = FAILED
+        if status == FAILED:
+            await self._notify(DONE_CHANNEL, id)
+        await self.session.commit()
+        return status
+
+    async def fail_abandoned(self) -> List[str]:
+        """
+        Fail the running jobs whose worker died on their last attempt.
+
+        :return: IDs of the failed jobs.
+        """
+        stmt = (
+            update(GenerationJob)
+            .where(
+                GenerationJob.status == RUNNING,
+                GenerationJob.run_after < func.now(),
+                GenerationJob.attempts >= GenerationJob.max_attempts,
+            )
+            .values(
+                status=FAILED,
+                error="Worker stopped while running the job",
+                locked_by=None,
+            )
+            .returning(GenerationJob.id)
+            .execution_options(synchronize_session=False)
+        )
+        failed = list((await self.session.scalars(stmt)).all())
+        for job_id in failed:
+            await self._notify(DONE_CHANNEL, job_id)
+        await self.session.commit()
+        return failed
@@ -1,15 +1,26 @@
 from datetime import datetime
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
 from fastapi import Depends
 from loguru import logger
-from sqlalchemy import select
+from sqlalchemy import Row, delete, func, insert, select
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from backend.db.dependencies import get_db_session
 from backend.db.models.playlist import Playlist
 
+# Columns of the playlist listings, loaded as rows instead of ORM objects.
+LISTING_COLUMNS = (
+    Playlist.prompt,
+    Playlist.model,
+    Playlist.genres,
+    Playlist.num_songs,
+    Playlist.popularity,
+    Playlist.spotify_id,
+    Playlist.created_at,
+)
+
 
 class DatabaseError(Exception):
     """Exception raised for database-related errors."""
@@ -45,8 +56,9 @@ class PlaylistDAO:
         :param created_at: Timestamp when the playlist was created.
         :return: The created Playlist object if successful, else None.
         """
-        try:
-            playlist = Playlist(
+        stmt = (
+            insert(Playlist)
+            .values(
                 prompt=prompt,
                 id=id,
                 spotify_id=spotify_id,
@@ -57,11 +69,13 @@ class PlaylistDAO:
                 owner_id=owner_id,
                 created_at=created_at,
             )
-            self.session.add(playlist)
+            .returning(Playlist)
+        )
+        try:
+            # INSERT ... RETURNING hands back the stored row in the same round trip,
+            # so there is no need to refresh the instance after the commit.
+            playlist = await self.session.scalar(stmt)
             await self.session.commit()
-            await self.session.refresh(
-                playlist,
-            )  # Refresh the instance to get the generated id
             logger.info(f"Added playlist: {playlist}")
             return playlist
         except SQLAlchemyError as e:
@@ -148,19 +162,18 @@ class PlaylistDAO:
         owner_id: str,
         max_results: Optional[int] = 10,
         page: Optional[int] = 1,
-    ) -> List[Playlist]:
+    ) -> List[Row]:
         """
-        Get specific playlists based on the prompt and owner ID.
+        Get a page of the playlists of an owner.
 
         :param owner_id: ID of the owner.
-        :param prompt: Part or whole prompt of the playlist.
         :param max_results: Maximum number of results to return.
         :param page: Page number for pagination.
-        :return: List of playlists matching the prompt and owner ID.
+        :return: LISTING_COLUMNS of the playlists.
         """
         offset = (page - 1) * max_results
         query = (
-            select(Playlist)
+            select(*LISTING_COLUMNS)
             .where(
                 Playlist.owner_id == owner_id,
             )
@@ -171,7 +184,7 @@ class PlaylistDAO:
         try:
             rows = await self.session.execute(query)
             logger.info(f"Fetched playlists for owner_id {owner_id}")
-            return list(rows.scalars().fetchall())
+            return list(rows.all())
         except SQLAlchemyError as e:
             logger.error(f"Error fetching Playlists: {e}")
             raise DatabaseError(
@@ -182,17 +195,15 @@ class PlaylistDAO:
         self,
         owner_id: str,
         prompt: str,
-    ) -> List[Playlist]:
+    ) -> List[Row]:
         """
         Get specific playlists based on the prompt and owner ID.
 
         :param owner_id: ID of the owner.
         :param prompt: Part or whole prompt of the playlist.
-        :param max_results: Maximum number of results to return.
-        :param page: Page number for pagination.
-        :return: List of playlists matching the prompt and owner ID.
+        :return: LISTING_COLUMNS of the playlists matching the prompt.
         """
-        query = select(Playlist).where(
+        query = select(*LISTING_COLUMNS).where(
             Playlist.owner_id == owner_id,
             Playlist.prompt.ilike(f"%{prompt}%"),
         )
@@ -202,13 +213,48 @@ class PlaylistDAO:
             logger.info(
                 f"Fetched playlists for owner_id {owner_id} with prompt '{prompt}'"
             )
-            return list(rows.scalars().fetchall())
+            return list(rows.all())
         except SQLAlchemyError as e:
             logger.error(f"Error fetching Playlists with prompt '{prompt}': {e}")
             raise DatabaseError(
                 f"Error fetching Playlists with prompt '{prompt}'",
             ) from e
 
+    async def get_popular_prompts(
+        self,
+        model: str,
+        since: datetime,
+        limit: int,
+    ) -> List[Tuple[str, int, int]]:
+        """
+        Get the prompts generated most often with a model.
+
+        Prompts differing only by case and whitespace are counted together.
+
+        :param model: name of the model.
+        :param since: only playlists created after it.
+        :param limit: maximum number of prompts.
+        :return: prompt, popularity and number of playlists, most frequent first.
+        """
+        prompt = func.lower(
+            func.trim(func.regexp_replace(Playlist.prompt, r"\s+", " ", "g"))
+        )
+        uses = func.count().label("uses")
+        query = (
+            select(prompt, Playlist.popularity, uses)
+            .where(Playlist.model == model, Playlist.created_at >= since)
+            .group_by(prompt, Playlist.popularity)
+            .order_by(uses.desc())
+            .limit(limit)
+        )
+
+        try:
+            rows = await self.session.execute(query)
+            return [tuple(row) for row in rows.all()]
+        except SQLAlchemyError as e:
+            logger.error(f"Error fetching popular prompts: {e}")
+            raise DatabaseError("Error fetching popular prompts") from e
+
     async def delete_by_id(
         self,
         id: str,
@@ -219,12 +265,19 @@ class PlaylistDAO:
         :param id: ID of Playlist.
         :return: True if deleted, else returns false.
         """
-        query = select(Playlist).where(Playlist.id == id)
+        # IDs aren't unique, only the first matching playlist is deleted.
+        first_match = (
+            select(Playlist.spotify_id).where(Playlist.id == id).limit(1)
+        ).scalar_subquery()
+        stmt = (
+            delete(Playlist)
+            .where(Playlist.spotify_id == first_match)
+            .returning(Playlist.spotify_id)
+            .execution_options(synchronize_session=False)
+        )
         try:
-            result = await self.session.execute(query)
-            playlist = result.scalars().first()
-            if playlist:
-                await self.session.delete(playlist)
+            result = await self.session.execute(stmt)
+            if result.first() is not None:
                 logger.info(f"Deleted Playlist with id {id}")
                 return True
             else:
@@ -244,15 +297,16 @@ class PlaylistDAO:
         :param spotify_id: spotify_id of Playlist.
         :return: True if deleted, else returns false.
         """
-        query = select(Playlist).where(Playlist.spotify_id == spotify_id)
+        stmt = (
+            delete(Playlist)
+            .where(Playlist.spotify_id == spotify_id)
+            .returning(Playlist.spotify_id)
+            .execution_options(synchronize_session=False)
+        )
 
         try:
-            result = await self.session.execute(query)
-            playlist = result.scalars().first()
-            logger.info(f"FOUND PLAYLIST {playlist}")
-
-            if playlist:
-                await self.session.delete(playlist)
+            result = await self.session.execute(stmt)
+            if result.first() is not None:
                 logger.info(f"Deleted Playlist with spotify_id {spotify_id}")
                 return True
             else:
@@ -0,0 +1,256 @@
+"""
+Benchmark the database round trips of the DAO writes.
+
+Usage::
+
+    python -m backend.db.dao.roundtrip_benchmark --runs 50
+
+Runs the writes of UserDAO and PlaylistDAO on the configured database
+(its tables must exist), next to the statements they used to send (add,
+commit and refresh; update then get; select then delete), each in its own
+session committed like a request's. A ``before_cursor_execute`` listener
+counts the statements of every call. The users and playlists it creates are
+deleted.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+from sqlalchemy import delete, event, select, update
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+
+from backend.db.dao.playlist_dao import PlaylistDAO
+from backend.db.dao.user_dao import UserDAO
+from backend.db.models.playlist import Playlist
+from backend.db.models.user import User
+from backend.settings import settings
+
+# Prefix of the Spotify IDs of the benchmark rows.
+ID_PREFIX = "roundtrip-benchmark-"
+
+PATHS = ("before", "dao")
+
+Write = Callable[[AsyncSession, str], Awaitable[Any]]
+
+
+class StatementCounter:
+    """Counts the statements and commits sent by an engine."""
+
+    def __init__(self, engine: AsyncEngine):
+        self.engine = engine
+        self.statements = 0
+        self.commits = 0
+        event.listen(engine.sync_engine, "before_cursor_execute", self._on_statement)
+        event.listen(engine.sync_engine, "commit", self._on_commit)
+
+    def _on_statement(self, *args: Any) -> None:
+        self.statements += 1
+
+    def _on_commit(self, *args: Any) -> None:
+        self.commits += 1
+
+    def remove(self) -> None:
+        """Stop counting."""
+        event.remove(
+            self.engine.sync_engine, "before_cursor_execute", self._on_statement
+        )
+        event.remove(self.engine.sync_engine, "commit", self._on_commit)
+
+    def take(self) -> Tuple[int, int]:
+        """
+        Get the counts since the last call.
+
+        :return: statements and commits.
+        """
+        counts = (self.statements, self.commits)
+        self.statements = self.commits = 0
+        return counts
+
+
+def _user_values(spotify_id: str) -> Dict[str, Any]:
+    now = datetime.now(timezone.utc)
+    return {
+        "id": uuid.uuid4().hex[:20],
+        "spotify_id": spotify_id,
+        "spotify_token": "token",
+        "spotify_refresh_token": "refresh-token",
+        "spotify_token_created_at": now,
+        "email": "benchmark@example.com",
+        "username": "benchmark",
+        "register_date": now,
+    }
+
+
+def _playlist_values(spotify_id: str) -> Dict[str, Any]:
+    return {
+        "prompt": "jazz for rainy days",
+        "id": uuid.uuid4().hex[:20],
+        "spotify_id": f"{spotify_id}-playlist",
+        "model": "Moodika-Model-A",
+        "genres": str(["jazz", "rainy-day"]),
+        "num_songs": 20,
+        "popularity": 50,
+        "owner_id": spotify_id,
+        "created_at": datetime.now(timezone.utc),
+    }
+
+
+def _token_values() -> Dict[str, Any]:
+    return {
+        "spotify_token": "new-token",
+        "spotify_refresh_token": "new-refresh-token",
+        "spotify_token_created_at": datetime.now(timezone.utc),
+    }
+
+
+async def _create_user_before(session: AsyncSession, spotify_id: str) -> None:
+    user = User(**_user_values(spotify_id))
+    session.add(user)
+    await session.commit()
+    await session.refresh(user)
+
+
+async def _create_playlist_before(session: AsyncSession, spotify_id: str) -> None:
+    playlist = Playlist(**_playlist_values(spotify_id))
+    session.add(playlist)
+    await session.commit()
+    await session.refresh(playlist)
+
+
+async def _update_tokens_before(session: AsyncSession, spotify_id: str) -> None:
+    stmt = (
+        update(User)
+        .where(User.spotify_id == spotify_id)
+        .values(**_token_values())
+        .execution_options(synchronize_session="fetch")
+    )
+    await session.execute(stmt)
+    await session.commit()
+    await session.get(User, spotify_id)
+
+
+async def _delete_playlist_before(session: AsyncSession, spotify_id: str) -> None:
+    query = select(Playlist).where(Playlist.spotify_id == f"{spotify_id}-playlist")
+    playlist = (await session.execute(query)).scalars().first()
+    await session.delete(playlist)
+
+
+async def _delete_user_before(session: AsyncSession, spotify_id: str) -> None:
+    query = select(User).where(User.spotify_id == spotify_id)
+    user = (await session.execute(query)).scalars().first()
+    await session.delete(user)
+    await session.commit()
+
+
+async def _create_user(session: AsyncSession, spotify_id: str) -> None:
+    await UserDAO(session).create(**_user_values(spotify_id))
+
+
+async def _create_playlist(session: AsyncSession, spotify_id: str) -> None:
+    await PlaylistDAO(session).create(**_playlist_values(spotify_id))
+
+
+async def _update_tokens(session: AsyncSession, spotify_id: str) -> None:
+    await UserDAO(session).update_spotify_tokens(spotify_id, **_token_values())
+
+
+async def _delete_playlist(session: AsyncSession, spotify_id: str) -> None:
+    await PlaylistDAO(session).delete_by_spotify_id(f"{spotify_id}-playlist")
+
+
+async def _delete_user(session: AsyncSession, spotify_id: str) -> None:
+    await UserDAO(session).delete(spotify_id)
+
+
+# The writes in the order they run: name, as they were, with the DAOs.
+WRITES: List[Tuple[str, Write, Write]] = [
+    ("create user", _create_user_before, _create_user),
+    ("create playlist", _create_playlist_before, _create_playlist),
+    ("update tokens", _update_tokens_before, _update_tokens),
+    ("delete playlist", _delete_playlist_before, _delete_playlist),
+    ("delete user", _delete_user_before, _delete_user),
+]
+
+
+async def _run_write(
+    session_factory: async_sessionmaker,
+    write: Write,
+    spotify_id: str,
+) -> float:
+    # Committed and closed like the sessions of get_db_session.
+    start = time.perf_counter()
+    session = session_factory()
+    try:
+        await write(session, spotify_id)
+    finally:
+        await session.commit()
+        await session.close()
+    return time.perf_counter() - start
+
+
+async def benchmark(runs: int) -> None:
+    """
+    Compare the statements and latency of the writes, before and with RETURNING.
+
+    :param runs: times each sequence of writes runs per path.
+    """
+    engine = create_async_engine(str(settings.db_url))
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    counter = StatementCounter(engine)
+    # (write, path) -> [(statements, commits, seconds)]
+    results: Dict[Tuple[str, str], List[Tuple[int, int, float]]] = defaultdict(list)
+    try:
+        for run in range(runs):
+            for path in PATHS:
+                spotify_id = f"{ID_PREFIX}{path}-{run}-{uuid.uuid4().hex[:8]}"
+                for name, before, dao_write in WRITES:
+                    write = before if path == "before" else dao_write
+                    counter.take()
+                    seconds = await _run_write(session_factory, write, spotify_id)
+                    results[(name, path)].append((*counter.take(), seconds))
+    finally:
+        async with engine.begin() as connection:
+            owners = select(User.spotify_id).where(
+                User.spotify_id.startswith(ID_PREFIX)
+            )
+            await connection.execute(
+                delete(Playlist).where(Playlist.owner_id.in_(owners))
+            )
+            await connection.execute(
+                delete(User).where(User.spotify_id.startswith(ID_PREFIX)),
+            )
+        await engine.dispose()
+
+    print(f"{runs} runs on {settings.db_host}:{settings.db_port}/{settings.db_base}")
+    print(f"{'write':<16} {'path':<7} {'statements':>10} {'commits':>8} {'p50 ms':>8}")
+    for name, _, _ in WRITES:
+        for path in PATHS:
+            calls = results[(name, path)]
+            statements = sum(call[0] for call in calls) / len(calls)
+            commits = sum(call[1] for call in calls) / len(calls)
+            p50 = statistics.median(call[2] * 1000 for call in calls)
+            print(
+                f"{name:<16} {path:<7} {statements:>10.1f} {commits:>8.1f} {p50:>8.1f}",
+            )
+
+
+def main() -> None:
+    """Run the benchmark with the options given on the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(benchmark(args.runs))
+
+
+if __name__ == "__main__":
+    main()
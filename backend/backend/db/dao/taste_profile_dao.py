@@ -0,0 +1,67 @@
+from datetime import datetime, timezone
+from typing import List, Optional, Sequence
+
+from fastapi import Depends
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.db.dependencies import get_db_session
+from backend.db.models.taste_profile import TasteProfile
+
+
+class TasteProfileDAO:
+    """Class for accessing the taste profiles of the users."""
+
+    def __init__(self, session: AsyncSession = Depends(get_db_session)):
+        self.session = session
+
+    async def get(self, owner_id: str, time_range: str) -> Optional[TasteProfile]:
+        """
+        Get the profile of a user, expired or not.
+
+        :param owner_id: Spotify ID of the user.
+        :param time_range: Spotify time range of the profile.
+        :return: the profile if it was ever computed, else None.
+        """
+        query = select(TasteProfile).where(
+            TasteProfile.owner_id == owner_id,
+            TasteProfile.time_range == time_range,
+        )
+        return await self.session.scalar(query)
+
+    async def get_expired_ranges(
+        self, owner_id: str, time_ranges: Sequence[str]
+    ) -> List[str]:
+        """
+        Get the time ranges whose profile is missing or expired.
+
+        :param owner_id: Spotify ID of the user.
+        :param time_ranges: time ranges to check.
+        :return: the ones to compute again.
+        """
+        query = select(TasteProfile.time_range).where(
+            TasteProfile.owner_id == owner_id,
+            TasteProfile.time_range.in_(time_ranges),
+            TasteProfile.expires_at > datetime.now(timezone.utc),
+        )
+        fresh = set((await self.session.scalars(query)).all())
+        return [time_range for time_range in time_ranges if time_range not in fresh]
+
+    async def upsert(self, profile: dict) -> None:
+        """
+        Store a profile, replacing the previous one of its user and time range.
+
+        :param profile: values of the profile.
+        """
+        stmt = insert(TasteProfile).values(**profile)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[TasteProfile.owner_id, TasteProfile.time_range],
+            set_={
+                name: stmt.excluded[name]
+                for name in profile
+                if name not in ("owner_id", "time_range")
+            },
+        )
+        await self.session.execute(stmt)
+        await self.session.commit()
@@ -3,11 +3,12 @@ from typing import List, Optional
 
 from fastapi import Depends
 from loguru import logger
-from sqlalchemy import select, update
+from sqlalchemy import delete, insert, select, update
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from backend.db.dependencies import get_db_session
+from backend.db.models.playlist import Playlist
 from backend.db.models.user import User
 
 
@@ -45,9 +46,9 @@ class UserDAO:
         :param register_date: Registration date of the user.
         :return: The created User object if successful, else None.
         """
-        try:
-
-            user = User(
+        stmt = (
+            insert(User)
+            .values(
                 id=id,
                 spotify_id=spotify_id,
                 spotify_token=spotify_token,
@@ -57,11 +58,13 @@ class UserDAO:
                 username=username,
                 register_date=register_date,
             )
-            self.session.add(user)
+            .returning(User)
+        )
+        try:
+            # INSERT ... RETURNING hands back the stored row in the same round trip,
+            # so there is no need to refresh the instance after the commit.
+            user = await self.session.scalar(stmt)
             await self.session.commit()
-            await self.session.refresh(
-                user,
-            )  # Refresh the instance to get the generated id
             logger.info(f"Added user: {user}")
             return user
         except SQLAlchemyError as e:
@@ -148,7 +151,8 @@ class UserDAO:
         :return: Updated user if successful.
         """
         try:
-            # Create an update query
+            # UPDATE ... RETURNING gives back the updated row directly; populate_existing
+            # refreshes the instance already held by the session (if any) with it.
             stmt = (
                 update(User)
                 .where(User.spotify_id == spotify_id)
@@ -157,27 +161,17 @@ class UserDAO:
                     spotify_refresh_token=spotify_refresh_token,
                     spotify_token_created_at=spotify_token_created_at,
                 )
-                .execution_options(synchronize_session="fetch")
+                .returning(User)
+                .execution_options(populate_existing=True)
             )
 
-            result = await self.session.execute(stmt)
+            updated_user = await self.session.scalar(stmt)
             await self.session.commit()
 
-            if result.rowcount == 0:
+            if not updated_user:
                 logger.info(f"No user found with spotify_id {spotify_id}")
                 raise Exception(f"No user found with spotify_id {spotify_id}")
 
-            updated_user = await self.session.get(User, spotify_id)
-            logger.info(f"User with spotify_id {spotify_id} has been updated")
-
-            if not updated_user:
-                logger.info(
-                    f"User with spotify_id {spotify_id} could not be fetched after update"
-                )
-                raise Exception(
-                    f"User with spotify_id {spotify_id} could not be fetched after update"
-                )
-
             logger.info(f"Updated tokens for user spotify_id {spotify_id}")
             return updated_user
 
@@ -197,13 +191,26 @@ class UserDAO:
         :param spotify_id: spotify_id of the User.
         :return: True if deleted, else returns false.
         """
-        query = select(User).where(User.spotify_id == spotify_id)
+        # The user's playlists are removed in a data-modifying CTE of the same
+        # statement, mirroring the ORM "delete-orphan" cascade without loading them.
+        deleted_playlists = (
+            delete(Playlist)
+            .where(Playlist.owner_id == spotify_id)
+            .returning(Playlist.spotify_id)
+            .cte("deleted_playlists")
+        )
+        stmt = (
+            delete(User)
+            .where(User.spotify_id == spotify_id)
+            .add_cte(deleted_playlists)
+            .returning(User.spotify_id)
+            .execution_options(synchronize_session=False)
+        )
         try:
-            result = await self.session.execute(query)
-            user = result.scalars().first()
-            if user:
-                await self.session.delete(user)
-                await self.session.commit()
+            result = await self.session.execute(stmt)
+            deleted = result.first() is not None
+            await self.session.commit()
+            if deleted:
                 logger.info(f"Deleted user with spotify_id {spotify_id}")
                 return True
             else:
@@ -0,0 +1,45 @@
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import Depends
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.db.dependencies import get_db_session
+from backend.db.models.warm_prompt import WarmPrompt
+
+
+class WarmPromptDAO:
+    """Class for accessing the precomputed parameters of popular prompts."""
+
+    def __init__(self, session: AsyncSession = Depends(get_db_session)):
+        self.session = session
+
+    async def get_all(self) -> List[WarmPrompt]:
+        """
+        Get every precomputed prompt.
+
+        :return: the prompts, most used first.
+        """
+        query = select(WarmPrompt).order_by(WarmPrompt.uses.desc())
+        return list((await self.session.scalars(query)).all())
+
+    async def last_refresh(self) -> Optional[datetime]:
+        """
+        Get when the prompts were last computed.
+
+        :return: time of the last refresh, None if they never were.
+        """
+        return await self.session.scalar(select(func.max(WarmPrompt.refreshed_at)))
+
+    async def replace_all(self, prompts: List[dict]) -> None:
+        """
+        Replace the precomputed prompts in one transaction, so readers see
+        either the old set or the new one.
+
+        :param prompts: values of the new rows.
+        """
+        await self.session.execute(delete(WarmPrompt))
+        if prompts:
+            await self.session.execute(insert(WarmPrompt), prompts)
+        await self.session.commit()
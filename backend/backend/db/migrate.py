@@ -0,0 +1,117 @@
+"""
+One-shot schema migration command.
+
+Run it once per deploy, before starting the web workers::
+
+    python -m backend.db.migrate
+"""
+import asyncio
+from pathlib import Path
+from typing import Optional
+
+from alembic import command
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+from loguru import logger
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from backend.settings import settings
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+MIGRATIONS_DIR = Path(__file__).parent / "migrations"
+
+# Revision matching the schema that used to be created with ``meta.create_all``.
+INITIAL_REVISION = "5f2d8c1a7b3e"
+
+
+class SchemaRevisionError(Exception):
+    """Raised when the database schema is not at the expected revision."""
+
+
+def get_alembic_config() -> Config:
+    """
+    Build the alembic configuration independently of the current directory.
+
+    :return: alembic config.
+    """
+    config = Config(str(PROJECT_ROOT / "alembic.ini"))
+    config.set_main_option("script_location", str(MIGRATIONS_DIR))
+    return config
+
+
+def get_head_revision() -> Optional[str]:
+    """
+    Get the latest revision shipped with the code.
+
+    :return: head revision id.
+    """
+    return ScriptDirectory.from_config(get_alembic_config()).get_current_head()
+
+
+async def get_current_revision(engine: AsyncEngine) -> Optional[str]:
+    """
+    Get the revision the database is currently stamped with.
+
+    :param engine: engine connected to the database.
+    :return: current revision id or None if the database is not versioned.
+    """
+    async with engine.connect() as conn:
+        try:
+            result = await conn.execute(text("SELECT version_num FROM alembic_version"))
+        except DBAPIError:
+            return None
+        return result.scalar()
+
+
+async def verify_schema_revision(engine: AsyncEngine) -> None:
+    """
+    Check that the database was migrated to the head revision.
+
+    This is a single cheap query, so it is safe to run on every worker boot.
+
+    :param engine: engine connected to the database.
+    :raises SchemaRevisionError: if the schema is missing or outdated.
+    """
+    head = get_head_revision()
+    current = await get_current_revision(engine)
+    if current != head:
+        raise SchemaRevisionError(
+            f"Database schema is at revision {current}, expected {head}. "
+            "Run `python -m backend.db.migrate` before starting the application.",
+        )
+    logger.info(f"Database schema is at revision {current}")
+
+
+async def _is_unversioned_legacy_schema() -> bool:
+    """
+    Check for a schema created by ``meta.create_all`` without alembic.
+
+    :return: True if the tables exist but the database is not stamped.
+    """
+    engine = create_async_engine(str(settings.db_url))
+    try:
+        async with engine.connect() as conn:
+            result = await conn.execute(
+                text(
+                    "SELECT to_regclass('alembic_version') IS NULL "
+                    "AND to_regclass('users') IS NOT NULL",
+                ),
+            )
+            return bool(result.scalar())
+    finally:
+        await engine.dispose()
+
+
+def main() -> None:
+    """Upgrade the database to the latest revision."""
+    config = get_alembic_config()
+    if asyncio.run(_is_unversioned_legacy_schema()):
+        logger.info(f"Adopting existing schema as revision {INITIAL_REVISION}")
+        command.stamp(config, INITIAL_REVISION)
+    command.upgrade(config, "head")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Initial migration.
+
+Creates the users and playlist tables as they were previously
+bootstrapped with ``meta.create_all`` on startup.
+
+Revision ID: 5f2d8c1a7b3e
+Revises:
+Create Date: 2026-10-19 09:12:41.503127
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "5f2d8c1a7b3e"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Run the upgrade migrations."""
+    op.create_table(
+        "users",
+        sa.Column("spotify_id", sa.String(length=62), nullable=False),
+        sa.Column("id", sa.String(length=20), nullable=False),
+        sa.Column("spotify_token", sa.String(), nullable=False),
+        sa.Column("spotify_refresh_token", sa.String(), nullable=False),
+        sa.Column(
+            "spotify_token_created_at",
+            sa.DateTime(timezone=True),
+            nullable=False,
+        ),
+        sa.Column("email", sa.String(length=100), nullable=True),
+        sa.Column("username", sa.String(length=200), nullable=True),
+        sa.Column("register_date", sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint("spotify_id"),
+    )
+    op.create_index(op.f("ix_users_id"), "users", ["id"], unique=False)
+    op.create_index(
+        op.f("ix_users_spotify_id"),
+        "users",
+        ["spotify_id"],
+        unique=False,
+    )
+    op.create_table(
+        "playlist",
+        sa.Column("spotify_id", sa.String(length=62), nullable=False),
+        sa.Column("id", sa.String(length=20), nullable=False),
+        sa.Column("prompt", sa.String(length=200), nullable=False),
+        sa.Column("model", sa.String(length=32), nullable=False),
+        sa.Column("genres", sa.String(length=300), nullable=False),
+        sa.Column("num_songs", sa.Integer(), nullable=False),
+        sa.Column("popularity", sa.Integer(), nullable=False),
+        sa.Column("owner_id", sa.String(length=62), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(["owner_id"], ["users.spotify_id"]),
+        sa.PrimaryKeyConstraint("spotify_id"),
+    )
+    op.create_index(op.f("ix_playlist_id"), "playlist", ["id"], unique=False)
+    op.create_index(
+        op.f("ix_playlist_owner_id"),
+        "playlist",
+        ["owner_id"],
+        unique=False,
+    )
+    op.create_index(
+        op.f("ix_playlist_spotify_id"),
+        "playlist",
+        ["spotify_id"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Run the downgrade migrations."""
+    op.drop_index(op.f("ix_playlist_spotify_id"), table_name="playlist")
+    op.drop_index(op.f("ix_playlist_owner_id"), table_name="playlist")
+    op.drop_index(op.f("ix_playlist_id"), table_name="playlist")
+    op.drop_table("playlist")
+    op.drop_index(op.f("ix_users_spotify_id"), table_name="users")
+    op.drop_index(op.f("ix_users_id"), table_name="users")
+    op.drop_table("users")
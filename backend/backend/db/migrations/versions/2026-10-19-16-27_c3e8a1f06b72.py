@@ -0,0 +1,35 @@
+"""Add the precomputed parameters of popular prompts.
+
+Revision ID: c3e8a1f06b72
+Revises: 9b41e7c2d5a8
+Create Date: 2026-10-19 16:27:44.503112
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "c3e8a1f06b72"
+down_revision = "9b41e7c2d5a8"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Run the upgrade migrations."""
+    op.create_table(
+        "warm_prompt",
+        sa.Column("key", sa.String(length=200), nullable=False),
+        sa.Column("popularity", sa.Integer(), nullable=False),
+        sa.Column("prompt", sa.String(length=200), nullable=False),
+        sa.Column("uses", sa.Integer(), nullable=False),
+        sa.Column("genres", sa.JSON(), nullable=False),
+        sa.Column("params", sa.JSON(), nullable=False),
+        sa.Column("refreshed_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("key", "popularity"),
+    )
+
+
+def downgrade() -> None:
+    """Run the downgrade migrations."""
+    op.drop_table("warm_prompt")
@@ -0,0 +1,38 @@
+"""Add the taste profiles of the users.
+
+Revision ID: e7a4d29b1c03
+Revises: c3e8a1f06b72
+Create Date: 2026-10-19 18:52:09.661385
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "e7a4d29b1c03"
+down_revision = "c3e8a1f06b72"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    """Run the upgrade migrations."""
+    op.create_table(
+        "taste_profile",
+        sa.Column("owner_id", sa.String(length=62), nullable=False),
+        sa.Column("time_range", sa.String(length=16), nullable=False),
+        sa.Column("features", sa.JSON(), nullable=False),
+        sa.Column("genres", sa.JSON(), nullable=False),
+        sa.Column("seed_tracks", sa.JSON(), nullable=False),
+        sa.Column("seed_artists", sa.JSON(), nullable=False),
+        sa.Column("tracks", sa.Integer(), nullable=False),
+        sa.Column("refreshed_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("expires_at", sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(["owner_id"], ["users.spotify_id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("owner_id", "time_range"),
+    )
+
+
+def downgrade() -> None:
+    """Run the downgrade migrations."""
+    op.drop_table("taste_profile")
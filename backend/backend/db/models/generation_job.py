@@ -0,0 +1,48 @@
+from sqlalchemy import JSON, Column, DateTime, ForeignKey, Index, Integer, String, Text
+from sqlalchemy.sql import func
+
+from backend.db.base import Base
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class GenerationJob(Base):
+    """Playlist generation waiting for, or handled by, a worker process."""
+
+    __tablename__ = "generation_job"
+    id = Column(String(36), primary_key=True)
+    status = Column(String(16), nullable=False, default=QUEUED)
+    prompt = Column(String(200), nullable=False)
+    config = Column(JSON, nullable=False)
+    context = Column(JSON, nullable=False)
+    # The worker reads the user's current Spotify token when it runs the job.
+    owner_id = Column(
+        String(62),
+        ForeignKey("users.spotify_id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    result = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    # Spotify playlist created by an attempt, filled again by the retries
+    # instead of creating another one.
+    playlist_id = Column(String(62), nullable=True)
+    attempts = Column(Integer(), nullable=False, default=0)
+    max_attempts = Column(Integer(), nullable=False)
+    # Queued jobs run after it. Running jobs are claimed again after it if
+    # their worker stopped renewing it (visibility timeout).
+    run_after = Column(DateTime(timezone=True), nullable=False, default=func.now())
+    locked_by = Column(String(64), nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False, default=func.now())
+    updated_at = Column(
+        DateTime(timezone=True),
+        nullable=False,
+        default=func.now(),
+        onupdate=func.now(),
+    )
+
+    __table_args__ = (
+        Index("ix_generation_job_status_run_after", "status", "run_after"),
+    )
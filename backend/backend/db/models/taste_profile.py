@@ -0,0 +1,25 @@
+from sqlalchemy import JSON, Column, DateTime, ForeignKey, Integer, String
+from sqlalchemy.sql import func
+
+from backend.db.base import Base
+
+
+class TasteProfile(Base):
+    """Summary of a user's top tracks and artists over a Spotify time range."""
+
+    __tablename__ = "taste_profile"
+    owner_id = Column(
+        String(62),
+        ForeignKey("users.spotify_id", ondelete="CASCADE"),
+        primary_key=True,
+    )
+    # short_term, medium_term or long_term, as in the Spotify API.
+    time_range = Column(String(16), primary_key=True)
+    # Average audio features of the top tracks.
+    features = Column(JSON, nullable=False)
+    genres = Column(JSON, nullable=False)
+    seed_tracks = Column(JSON, nullable=False)
+    seed_artists = Column(JSON, nullable=False)
+    tracks = Column(Integer(), nullable=False)
+    refreshed_at = Column(DateTime(timezone=True), nullable=False, default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False)
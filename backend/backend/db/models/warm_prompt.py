@@ -0,0 +1,20 @@
+from sqlalchemy import JSON, Column, DateTime, Integer, String
+from sqlalchemy.sql import func
+
+from backend.db.base import Base
+
+
+class WarmPrompt(Base):
+    """Generation parameters precomputed for a frequent prompt."""
+
+    __tablename__ = "warm_prompt"
+    # Normalized prompt (see ``normalize_prompt``) and popularity it was
+    # computed for.
+    key = Column(String(200), primary_key=True)
+    popularity = Column(Integer(), primary_key=True)
+    # Most frequent wording of the prompt, the one the parameters come from.
+    prompt = Column(String(200), nullable=False)
+    uses = Column(Integer(), nullable=False)
+    genres = Column(JSON, nullable=False)
+    params = Column(JSON, nullable=False)
+    refreshed_at = Column(DateTime(timezone=True), nullable=False, default=func.now())
@@ -0,0 +1,6 @@
+"""
+Out-of-process inference server.
+
+Owns the genre model so the web workers don't each load their own copy,
+and serves batched scoring to them over a Unix domain socket.
+"""
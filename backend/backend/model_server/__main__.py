@@ -0,0 +1,19 @@
+import asyncio
+
+from backend.logging import configure_logging
+from backend.model_server.server import serve
+from backend.services.resources import MODEL_SERVER, apply_resource_plan
+
+
+def main() -> None:
+    """Entrypoint of the model server."""
+    configure_logging()
+    apply_resource_plan(MODEL_SERVER)
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass  # noqa: WPS420
+
+
+if __name__ == "__main__":
+    main()
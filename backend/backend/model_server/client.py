@@ -0,0 +1,106 @@
+import socket
+import threading
+from itertools import groupby
+from pathlib import Path
+from typing import List, Sequence
+
+import numpy as np
+
+from backend.model_server import protocol
+
+
+class ModelServerError(Exception):
+    """Raised when the model server can't score a request."""
+
+
+class ModelServerClient:
+    """
+    Blocking client of the model server.
+
+    Each thread keeps its own connection, so the client can be shared by
+    the threads of an executor without locking.
+    """
+
+    def __init__(self, socket_path: Path, timeout: float):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self) -> socket.socket:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            conn.settimeout(self.timeout)
+            conn.connect(str(self.socket_path))
+            self._local.conn = conn
+            self._local.request_id = 0
+        return conn
+
+    def _close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+        self._local.conn = None
+
+    def _recv_exactly(self, conn: socket.socket, size: int) -> bytes:
+        chunks = []
+        while size:
+            chunk = conn.recv(size)
+            if not chunk:
+                raise ConnectionError("Model server closed the connection")
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b"".join(chunks)
+
+    def _request(self, op: int, payload: bytes = b"") -> bytes:
+        # A stale connection (server restarted) is retried once.
+        for attempt in range(2):
+            try:
+                conn = self._connection()
+                self._local.request_id = (self._local.request_id + 1) % 2**32
+                request_id = self._local.request_id
+                conn.sendall(protocol.encode_message(op, request_id, payload))
+                header = self._recv_exactly(conn, protocol.HEADER.size)
+                status, response_id, length = protocol.decode_header(header)
+                response = self._recv_exactly(conn, length)
+            except (OSError, protocol.ProtocolError) as e:
+                self._close()
+                if attempt:
+                    raise ModelServerError(f"Model server unreachable: {e}") from e
+                continue
+            if response_id != request_id:
+                self._close()
+                raise ModelServerError("Model server answered another request")
+            if status != protocol.STATUS_OK:
+                raise ModelServerError(response.decode(errors="replace"))
+            return response
+        raise AssertionError("unreachable")  # pragma: no cover
+
+    def ping(self) -> None:
+        self._request(protocol.OP_PING)
+
+    def score(self, query: str, candidates: Sequence[str]) -> np.ndarray:
+        """
+        Score candidates against a query.
+
+        :param query: free text.
+        :param candidates: texts to score against it.
+        :return: one score per candidate.
+        """
+        payload = protocol.encode_strings([query, *candidates])
+        return protocol.decode_scores(self._request(protocol.OP_SCORE, payload))
+
+
+class RemoteGenreScorer:
+    """Genre scorer delegating to the model server, like a local backend."""
+
+    def __init__(self, client: ModelServerClient):
+        self.client = client
+        # Fail early if the server isn't running.
+        self.client.ping()
+
+    def predict(self, pairs: Sequence[Sequence[str]]) -> np.ndarray:
+        scores: List[np.ndarray] = []
+        for query, group in groupby(pairs, key=lambda pair: pair[0]):
+            scores.append(self.client.score(query, [pair[1] for pair in group]))
+        return np.concatenate(scores) if scores else np.array([], dtype=np.float32)
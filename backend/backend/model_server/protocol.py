@@ -0,0 +1,79 @@
+"""
+Binary protocol of the model server.
+
+Every message is a fixed header followed by a payload::
+
+    request:  op (u8) | request id (u32) | payload length (u32) | payload
+    response: status (u8) | request id (u32) | payload length (u32) | payload
+
+A score request carries the query and its candidates as a count (u16)
+followed by length-prefixed (u32) UTF-8 strings. A successful response
+carries one little-endian float32 score per candidate, an error response
+the UTF-8 error message. Requests may be pipelined on a connection, the
+request id matches a response with its request.
+"""
+import struct
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+HEADER = struct.Struct("!BII")
+COUNT = struct.Struct("!H")
+LENGTH = struct.Struct("!I")
+SCORE_DTYPE = np.dtype("<f4")
+
+OP_PING = 0
+OP_SCORE = 1
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+# Payloads above this size are rejected, to survive garbage on the socket.
+MAX_PAYLOAD = 16 * 1024 * 1024
+
+
+class ProtocolError(Exception):
+    """Raised when a message can't be decoded."""
+
+
+def encode_message(code: int, request_id: int, payload: bytes = b"") -> bytes:
+    return HEADER.pack(code, request_id, len(payload)) + payload
+
+
+def decode_header(header: bytes) -> Tuple[int, int, int]:
+    code, request_id, length = HEADER.unpack(header)
+    if length > MAX_PAYLOAD:
+        raise ProtocolError(f"Payload of {length} bytes is too large")
+    return code, request_id, length
+
+
+def encode_strings(strings: Sequence[str]) -> bytes:
+    parts = [COUNT.pack(len(strings))]
+    for string in strings:
+        data = string.encode()
+        parts.append(LENGTH.pack(len(data)))
+        parts.append(data)
+    return b"".join(parts)
+
+
+def decode_strings(payload: bytes) -> List[str]:
+    try:
+        (count,) = COUNT.unpack_from(payload, 0)
+        offset = COUNT.size
+        strings = []
+        for _ in range(count):
+            (length,) = LENGTH.unpack_from(payload, offset)
+            offset += LENGTH.size
+            strings.append(payload[offset : offset + length].decode())
+            offset += length
+    except (struct.error, UnicodeDecodeError) as e:
+        raise ProtocolError(f"Invalid strings payload: {e}") from e
+    return strings
+
+
+def encode_scores(scores: Sequence[float]) -> bytes:
+    return np.asarray(scores, dtype=SCORE_DTYPE).tobytes()
+
+
+def decode_scores(payload: bytes) -> np.ndarray:
+    return np.frombuffer(payload, dtype=SCORE_DTYPE).astype(np.float32)
@@ -0,0 +1,198 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+from loguru import logger
+
+from backend.model_server import protocol
+from backend.services.recommendations_manager.recommendation_models.moodika.model_a.genre_scorer import (
+    create_genre_scorer,
+)
+from backend.services.resources import get_resource_plan
+from backend.settings import settings
+
+
+class ScoreRequest(NamedTuple):
+    """Query to score against its candidates, waiting for a batch."""
+
+    query: str
+    candidates: List[str]
+    future: "asyncio.Future[np.ndarray]"
+
+
+class Batcher:
+    """
+    Groups the score requests of all the connections into batches.
+
+    A batch is run as soon as it holds ``max_batch`` pairs or its first
+    request waited ``max_wait`` seconds, so the model always works on
+    large batches under load without delaying a lone request much.
+    """
+
+    def __init__(self, scorer, max_batch: int, max_wait: float, workers: int):
+        self.scorer = scorer
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue: "asyncio.Queue[ScoreRequest]" = asyncio.Queue()
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers,
+            thread_name_prefix="model-server",
+        )
+        self._slots = asyncio.Semaphore(workers)
+        self.batches = 0
+        self.pairs = 0
+
+    async def score(self, query: str, candidates: List[str]) -> np.ndarray:
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put(ScoreRequest(query, candidates, future))
+        return await future
+
+    async def run(self) -> None:
+        while True:
+            await self._slots.acquire()
+            batch = [await self.queue.get()]
+            size = len(batch[0].candidates)
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    request = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(request)
+                size += len(request.candidates)
+            asyncio.ensure_future(self._run_batch(batch))
+
+    async def _run_batch(self, batch: List[ScoreRequest]) -> None:
+        pairs = [
+            [request.query, candidate]
+            for request in batch
+            for candidate in request.candidates
+        ]
+        try:
+            scores = await asyncio.get_running_loop().run_in_executor(
+                self.executor,
+                self.scorer.predict,
+                pairs,
+            )
+        except Exception as e:
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(e)
+            return
+        finally:
+            self._slots.release()
+
+        self.batches += 1
+        self.pairs += len(pairs)
+        offset = 0
+        for request in batch:
+            count = len(request.candidates)
+            if not request.future.done():
+                request.future.set_result(np.asarray(scores[offset : offset + count]))
+            offset += count
+
+
+async def _handle_request(
+    batcher: Batcher,
+    op: int,
+    request_id: int,
+    payload: bytes,
+    writer: asyncio.StreamWriter,
+) -> None:
+    try:
+        if op == protocol.OP_PING:
+            response = b""
+        elif op == protocol.OP_SCORE:
+            query, *candidates = protocol.decode_strings(payload)
+            response = protocol.encode_scores(await batcher.score(query, candidates))
+        else:
+            raise protocol.ProtocolError(f"Unknown operation {op}")
+    except Exception as e:
+        logger.error(f"Model server request failed: {e}")
+        writer.write(
+            protocol.encode_message(protocol.STATUS_ERROR, request_id, str(e).encode()),
+        )
+    else:
+        writer.write(protocol.encode_message(protocol.STATUS_OK, request_id, response))
+
+
+async def _serve_connection(
+    batcher: Batcher,
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+) -> None:
+    pending = set()
+    try:
+        while True:
+            header = await reader.readexactly(protocol.HEADER.size)
+            op, request_id, length = protocol.decode_header(header)
+            payload = await reader.readexactly(length)
+            # Pipelined requests of a connection are scored concurrently.
+            task = asyncio.ensure_future(
+                _handle_request(batcher, op, request_id, payload, writer),
+            )
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+    except asyncio.IncompleteReadError:
+        pass  # noqa: WPS420  # The client closed the connection.
+    except protocol.ProtocolError as e:
+        logger.warning(f"Closing model server connection: {e}")
+    finally:
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        writer.close()
+
+
+async def serve(socket_path: Optional[Path] = None) -> None:
+    """
+    Load the genre model and serve it until cancelled.
+
+    :param socket_path: Unix socket to listen on.
+    """
+    socket_path = socket_path or settings.model_server_socket
+    if socket_path is None:
+        raise ValueError("BACKEND_MODEL_SERVER_SOCKET is not set")
+
+    start = time.perf_counter()
+    scorer = create_genre_scorer(settings.genre_model_backend, settings.genre_model_dir)
+    logger.info(
+        f"Genre model ({settings.genre_model_backend.value}) loaded "
+        f"in {time.perf_counter() - start:.2f}s",
+    )
+    batcher = Batcher(
+        scorer,
+        max_batch=settings.model_server_max_batch,
+        max_wait=settings.model_server_batch_wait,
+        workers=get_resource_plan().inference_workers,
+    )
+
+    if socket_path.exists():
+        socket_path.unlink()
+    socket_path.parent.mkdir(parents=True, exist_ok=True)
+    server = await asyncio.start_unix_server(
+        lambda reader, writer: _serve_connection(batcher, reader, writer),
+        path=str(socket_path),
+    )
+    os.chmod(socket_path, 0o660)
+    logger.info(f"Model server listening on {socket_path}")
+
+    batching = asyncio.ensure_future(batcher.run())
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        batching.cancel()
+        batcher.executor.shutdown(wait=False)
+        if socket_path.exists():
+            socket_path.unlink()
+        logger.info(
+            f"Model server stopped after {batcher.batches} batches "
+            f"of {batcher.pairs} pairs",
+        )
@@ -0,0 +1,110 @@
+"""
+Notifications of the generation job queue.
+
+Jobs live in the ``generation_job`` table (see ``GenerationJobDAO``); new
+and finished jobs are announced with Postgres ``NOTIFY``, so workers and
+waiting requests wake up right away instead of polling. Notifications
+are only a shortcut: both sides still poll the table every
+``generation_queue_poll_interval`` in case one is missed.
+"""
+import asyncio
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+from loguru import logger
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from backend.db.dao.generation_job_dao import DONE_CHANNEL
+from backend.db.models.generation_job import DONE, FAILED, GenerationJob
+from backend.settings import settings
+
+
+class Listener:
+    """Dedicated connection receiving the notifications of a channel."""
+
+    def __init__(self, channel: str, callback: Callable[[str], None]):
+        self.channel = channel
+        self.callback = callback
+        self._conn: Optional[AsyncConnection] = None
+        self._driver_conn = None
+
+    def _on_notification(
+        self, connection, pid, channel, payload
+    ) -> None:  # noqa: WPS110
+        self.callback(payload)
+
+    async def start(self, engine: AsyncEngine) -> None:
+        self._conn = await engine.connect()
+        raw_conn = await self._conn.get_raw_connection()
+        # LISTEN is only exposed by the asyncpg connection itself.
+        self._driver_conn = raw_conn.driver_connection
+        await self._driver_conn.add_listener(self.channel, self._on_notification)
+        logger.info(f"Listening to {self.channel}")
+
+    async def stop(self) -> None:
+        if self._conn is None:
+            return
+        try:
+            await self._driver_conn.remove_listener(self.channel, self._on_notification)
+        except Exception as e:
+            logger.warning(f"Failed to stop listening to {self.channel}: {e}")
+        await self._conn.close()
+        self._conn = None
+
+
+class JobWaiter:
+    """Lets requests wait for the jobs they queued, in a web worker."""
+
+    def __init__(self) -> None:
+        self._waiters: Dict[str, Set["asyncio.Future[None]"]] = {}
+        self._listener = Listener(DONE_CHANNEL, self._on_done)
+
+    def _on_done(self, job_id: str) -> None:
+        for future in self._waiters.pop(job_id, ()):
+            if not future.done():
+                future.set_result(None)
+
+    async def start(self, engine: AsyncEngine) -> None:
+        await self._listener.start(engine)
+
+    async def stop(self) -> None:
+        await self._listener.stop()
+
+    async def wait(
+        self,
+        job_id: str,
+        get_job: Callable[[], Awaitable[Optional[GenerationJob]]],
+        timeout: float,
+    ) -> Optional[GenerationJob]:
+        """
+        Wait until a job is done or failed.
+
+        :param job_id: ID of the job.
+        :param get_job: reads the job from the database.
+        :param timeout: seconds to wait.
+        :return: the job as last read, finished or not.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            # Registered before reading, so a job finishing in between
+            # isn't missed.
+            future = loop.create_future()
+            self._waiters.setdefault(job_id, set()).add(future)
+            try:
+                job = await get_job()
+                remaining = deadline - loop.time()
+                if job is None or job.status in (DONE, FAILED) or remaining <= 0:
+                    return job
+                try:
+                    await asyncio.wait_for(
+                        future,
+                        min(remaining, settings.generation_queue_poll_interval),
+                    )
+                except asyncio.TimeoutError:
+                    pass  # noqa: WPS420  # Read the job again.
+            finally:
+                waiters = self._waiters.get(job_id)
+                if waiters is not None:
+                    waiters.discard(future)
+                    if not waiters:
+                        del self._waiters[job_id]
@@ -0,0 +1,50 @@
+"""
+In-process metrics registry.
+
+Services register a provider returning a JSON-serializable snapshot of
+their state, and the monitoring API exposes all of them at once.
+"""
+from typing import Callable, Dict, Optional, Sequence
+
+from loguru import logger
+
+_providers: Dict[str, Callable[[], dict]] = {}
+
+
+def register_metrics(name: str, provider: Callable[[], dict]) -> None:
+    """
+    Register a metrics provider.
+
+    :param name: name the metrics are exposed under.
+    :param provider: callable returning the current metrics.
+    """
+    _providers[name] = provider
+
+
+def collect_metrics() -> Dict[str, dict]:
+    """
+    Collect the metrics of every registered provider.
+
+    :return: metrics keyed by provider name.
+    """
+    metrics = {}
+    for name, provider in list(_providers.items()):
+        try:
+            metrics[name] = provider()
+        except Exception as e:
+            logger.error(f"Failed to collect metrics {name}: {e}")
+    return metrics
+
+
+def percentile(sorted_values: Sequence[float], fraction: float) -> Optional[float]:
+    """
+    Get a percentile of sorted values, rounded for display.
+
+    :param sorted_values: values in ascending order.
+    :param fraction: percentile between 0 and 1.
+    :return: the percentile or None without values.
+    """
+    if not sorted_values:
+        return None
+    index = min(int(len(sorted_values) * fraction), len(sorted_values) - 1)
+    return round(sorted_values[index], 3)
@@ -0,0 +1,246 @@
+"""
+Precomputed parameters of the most frequent prompts.
+
+A handful of prompts ("workout", "study", "party") make a large share of
+the generations. Every ``prompt_warmup_interval``, one process mines the
+playlist table for the most frequent ones and computes their genres and
+averaged audio features with the application's Spotify token, in the
+background lane; the results are stored in the ``warm_prompt`` table.
+Every process generating playlists reloads the table into memory, and
+generations of these prompts go straight to the recommendation.
+
+The refresh runs under a Postgres advisory lock, so only one process
+pays for it however many are running.
+"""
+import asyncio
+import math
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+
+from backend.db.dao.playlist_dao import PlaylistDAO
+from backend.db.dao.warm_prompt_dao import WarmPromptDAO
+from backend.services.recommendations_manager.recommendation_models.moodika.model_a.prompt_cache import (
+    CachedParams,
+    get_warm_prompts,
+    normalize_prompt,
+)
+from backend.services.recommendations_manager.recommender_manager import (
+    recommender_manager,
+)
+from backend.services.recommendations_manager.registry import MOODIKA_MODEL_A
+from backend.services.spotify_manager.spotify_client import BACKGROUND, spotify_lane
+from backend.services.spotify_manager.spotify_manager import spotify_manager
+from backend.settings import settings
+
+# Key of the advisory lock held while the prompts are refreshed.
+WARMUP_LOCK_ID = 4_521_906_187
+# Rows mined per prompt kept, since wordings are merged after the query.
+MINING_FACTOR = 4
+
+PromptKey = Tuple[str, int]
+
+
+async def _popular_prompts(
+    session_factory: async_sessionmaker,
+) -> List[Tuple[str, int, int]]:
+    """
+    Find the most frequent prompts, wordings of the same prompt merged.
+
+    :return: most frequent wording, popularity and uses of each prompt.
+    """
+    since = datetime.now(timezone.utc) - timedelta(
+        days=settings.prompt_warmup_window_days
+    )
+    async with session_factory() as session:
+        rows = await PlaylistDAO(session).get_popular_prompts(
+            MOODIKA_MODEL_A.name,
+            since,
+            settings.prompt_warmup_size * MINING_FACTOR,
+        )
+    uses: Counter = Counter()
+    wordings: Dict[PromptKey, str] = {}
+    for prompt, popularity, count in rows:
+        key = (normalize_prompt(prompt), popularity)
+        if not key[0]:
+            continue
+        # Rows come most frequent first, so the first wording is the top one.
+        wordings.setdefault(key, prompt)
+        uses[key] += count
+    return [
+        (wordings[key], key[1], count)
+        for key, count in uses.most_common(settings.prompt_warmup_size)
+        if count >= settings.prompt_warmup_min_uses
+    ]
+
+
+def _valid_params(params: Optional[dict]) -> bool:
+    return bool(params) and all(
+        not isinstance(value, float) or math.isfinite(value)
+        for value in params.values()
+    )
+
+
+async def refresh_warm_prompts(session_factory: async_sessionmaker) -> int:
+    """
+    Compute the parameters of the most frequent prompts and store them.
+
+    Prompts failing to compute keep their previous parameters.
+
+    :param session_factory: sessions of the database.
+    :return: number of prompts computed.
+    """
+    prompts = await _popular_prompts(session_factory)
+    if not prompts:
+        return 0
+    async with session_factory() as session:
+        previous = {
+            (row.key, row.popularity): row
+            for row in await WarmPromptDAO(session).get_all()
+        }
+    model = await recommender_manager.load_model(MOODIKA_MODEL_A.name)
+    access_token = await spotify_manager.get_app_access_token()
+
+    rows = []
+    computed = 0
+    with spotify_lane(BACKGROUND):
+        for prompt, popularity, uses in prompts:
+            key = normalize_prompt(prompt)
+            try:
+                genres, params = await model.precompute(
+                    prompt, popularity, access_token
+                )
+            except Exception as e:
+                logger.warning(f"Prompt '{prompt}' not warmed up: {e}")
+                genres, params = None, None
+            if genres and _valid_params(params):
+                computed += 1
+                rows.append(
+                    {
+                        "key": key,
+                        "popularity": popularity,
+                        "prompt": prompt,
+                        "uses": uses,
+                        "genres": list(genres),
+                        "params": dict(params),
+                        "refreshed_at": datetime.now(timezone.utc),
+                    },
+                )
+            elif (key, popularity) in previous:
+                old = previous[(key, popularity)]
+                rows.append(
+                    {
+                        "key": old.key,
+                        "popularity": old.popularity,
+                        "prompt": old.prompt,
+                        "uses": uses,
+                        "genres": old.genres,
+                        "params": old.params,
+                        "refreshed_at": old.refreshed_at,
+                    },
+                )
+
+    async with session_factory() as session:
+        await WarmPromptDAO(session).replace_all(rows)
+    logger.info(f"Warmed up {computed}/{len(prompts)} popular prompts")
+    return computed
+
+
+async def load_warm_prompts(session_factory: async_sessionmaker) -> int:
+    """
+    Load the precomputed prompts into this process.
+
+    :param session_factory: sessions of the database.
+    :return: number of prompts loaded.
+    """
+    async with session_factory() as session:
+        rows = await WarmPromptDAO(session).get_all()
+    now = time.monotonic()
+    get_warm_prompts().replace(
+        CachedParams(
+            prompt=row.prompt,
+            genres=list(row.genres),
+            params=dict(row.params),
+            popularity=row.popularity,
+            cost=0.0,
+            created_at=now,
+            used_at=now,
+        )
+        for row in rows
+    )
+    return len(rows)
+
+
+class PromptWarmup:
+    """Keeps the precomputed prompts of a process up to date."""
+
+    def __init__(self, engine: AsyncEngine, session_factory: async_sessionmaker):
+        self.engine = engine
+        self.session_factory = session_factory
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    async def _refresh_due(self) -> bool:
+        async with self.session_factory() as session:
+            last_refresh = await WarmPromptDAO(session).last_refresh()
+        if last_refresh is None:
+            return True
+        age = datetime.now(timezone.utc) - last_refresh
+        return age.total_seconds() >= settings.prompt_warmup_interval
+
+    async def refresh_if_due(self) -> bool:
+        """
+        Refresh the prompts, unless another process is or just did.
+
+        :return: whether this process refreshed them.
+        """
+        async with self.engine.connect() as conn:
+            # Session level lock, released with the connection if we die.
+            locked = await conn.scalar(
+                select(func.pg_try_advisory_lock(WARMUP_LOCK_ID))
+            )
+            await conn.commit()
+            if not locked:
+                return False
+            try:
+                if not await self._refresh_due():
+                    return False
+                await refresh_warm_prompts(self.session_factory)
+                return True
+            finally:
+                await conn.scalar(select(func.pg_advisory_unlock(WARMUP_LOCK_ID)))
+                await conn.commit()
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await self.refresh_if_due()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Popular prompts not refreshed: {e}")
+            try:
+                loaded = await load_warm_prompts(self.session_factory)
+                logger.debug(f"Loaded {loaded} precomputed prompts")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Precomputed prompts not loaded: {e}")
+            await asyncio.sleep(settings.prompt_warmup_reload_interval)
+
+    def start(self) -> None:
+        self._task = asyncio.ensure_future(self.run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass  # noqa: WPS420
+        self._task = None
@@ -0,0 +1,198 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Optional, TypeVar
+
+from backend.services.metrics import percentile
+from backend.services.recommendations_manager.registry import ModelSpec
+from backend.services.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    ServiceUnavailableError,
+)
+
+T = TypeVar("T")
+
+# Number of recent latencies kept to compute percentiles.
+LATENCY_WINDOW = 200
+
+
+class ModelUnavailableError(ServiceUnavailableError):
+    """Raised when a model can't take a generation right now."""
+
+
+class ModelOverloadedError(ModelUnavailableError):
+    """Raised when all the generation slots of a model are busy."""
+
+
+class ModelTimeoutError(ModelUnavailableError):
+    """Raised when a generation takes longer than the model's timeout."""
+
+
+class ModelStats:
+    """Call counters and latencies of a model."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.successes = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.in_flight = 0
+        self.latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+
+    def started(self) -> None:
+        with self._lock:
+            self.calls += 1
+            self.in_flight += 1
+
+    def finished(self, latency: float, success: bool) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            self.latencies.append(latency)
+            if success:
+                self.successes += 1
+            else:
+                self.failures += 1
+
+    def timed_out(self) -> None:
+        with self._lock:
+            self.timeouts += 1
+
+    def was_rejected(self) -> None:
+        with self._lock:
+            self.rejected += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            latencies = sorted(self.latencies)
+            return {
+                "calls": self.calls,
+                "successes": self.successes,
+                "failures": self.failures,
+                "timeouts": self.timeouts,
+                "rejected": self.rejected,
+                "in_flight": self.in_flight,
+                "latency_p50": percentile(latencies, 0.5),
+                "latency_p95": percentile(latencies, 0.95),
+            }
+
+
+class ModelRuntime:
+    """
+    Isolates the executions of one model from the others.
+
+    Each model gets its own concurrency limit, a timeout and a circuit
+    breaker, so a slow or failing backend only rejects its own requests.
+    Blocking models run in their own thread pool sized to the concurrency
+    limit, instead of exhausting the shared worker threads; asyncio models
+    run on the event loop and are cancelled when they time out.
+    """
+
+    def __init__(self, spec: ModelSpec):
+        self.spec = spec
+        self.breaker = CircuitBreaker(
+            name=spec.name,
+            failure_threshold=spec.failure_threshold,
+            recovery_timeout=spec.recovery_timeout,
+        )
+        self.stats = ModelStats()
+        self.load_error: Optional[str] = None
+        self._executor = ThreadPoolExecutor(
+            max_workers=spec.max_concurrency,
+            thread_name_prefix=f"model-{spec.name}",
+        )
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        # Created lazily so it belongs to the running event loop.
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.spec.max_concurrency)
+        return self._slots
+
+    async def run(self, func: Callable[..., Any], *args) -> T:
+        """
+        Run a call of the model within its limits.
+
+        :param func: blocking callable or coroutine function.
+        :param args: arguments of the callable.
+        :raises ModelUnavailableError: if the circuit is open.
+        :raises ModelOverloadedError: if no slot frees up within the queue timeout.
+        :raises ModelTimeoutError: if the call exceeds the model timeout.
+        :return: result of the callable.
+        """
+        slots = self._get_slots()
+        try:
+            await asyncio.wait_for(slots.acquire(), timeout=self.spec.queue_timeout)
+        except asyncio.TimeoutError:
+            self.stats.was_rejected()
+            raise ModelOverloadedError(
+                f"Model {self.spec.name} is busy, try again later",
+                retry_after=self.spec.queue_timeout,
+            )
+
+        try:
+            self.breaker.before_call()
+        except CircuitOpenError as e:
+            slots.release()
+            self.stats.was_rejected()
+            raise ModelUnavailableError(
+                f"Model {self.spec.name} is temporarily unavailable",
+                retry_after=e.retry_after,
+            ) from e
+
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        self.stats.started()
+        if asyncio.iscoroutinefunction(func):
+            future = asyncio.ensure_future(func(*args))
+        else:
+            future = loop.run_in_executor(self._executor, func, *args)
+
+        def _on_done(fut: "asyncio.Future[T]") -> None:
+            # The slot is only given back when the call really finishes,
+            # a blocking call keeps running after the caller timed out.
+            slots.release()
+            error = None if fut.cancelled() else fut.exception()
+            success = not fut.cancelled() and error is None and fut.result() is not None
+            self.stats.finished(time.perf_counter() - start, success=success)
+            if success or isinstance(error, ServiceUnavailableError):
+                # An unavailable dependency (Spotify, OpenAI...) has its own
+                # breaker, it doesn't mean the model itself is broken.
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+
+        future.add_done_callback(_on_done)
+        try:
+            return await asyncio.wait_for(
+                asyncio.shield(future),
+                timeout=self.spec.timeout,
+            )
+        except asyncio.TimeoutError:
+            if isinstance(future, asyncio.Task):
+                future.cancel()
+            self.stats.timed_out()
+            raise ModelTimeoutError(
+                f"Model {self.spec.name} took longer than {self.spec.timeout}s",
+            )
+
+    def snapshot(self) -> dict:
+        """
+        Get the health and latency stats of the model.
+
+        :return: dictionary with the limits, circuit breaker and call stats.
+        """
+        return {
+            "load_error": self.load_error,
+            "max_concurrency": self.spec.max_concurrency,
+            "timeout": self.spec.timeout,
+            "circuit": self.breaker.snapshot(),
+            **self.stats.snapshot(),
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
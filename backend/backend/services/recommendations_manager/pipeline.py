@@ -0,0 +1,142 @@
+import asyncio
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Tuple
+
+from backend.services.metrics import percentile, register_metrics
+
+# Number of recent runs kept per pipeline to compute percentiles.
+TIMINGS_WINDOW = 200
+
+
+class PipelineStats:
+    """Durations of the stages of a pipeline over its recent runs."""
+
+    def __init__(self) -> None:
+        self.runs = 0
+        self.failures = 0
+        self.stages: Dict[str, Deque[float]] = defaultdict(
+            lambda: deque(maxlen=TIMINGS_WINDOW),
+        )
+        self.totals: Deque[float] = deque(maxlen=TIMINGS_WINDOW)
+        # Time saved by running independent stages concurrently.
+        self.overlaps: Deque[float] = deque(maxlen=TIMINGS_WINDOW)
+        self._lock = threading.Lock()
+
+    def record(self, timings: Dict[str, float], total: float, success: bool) -> None:
+        with self._lock:
+            self.runs += 1
+            if not success:
+                self.failures += 1
+            for stage, duration in timings.items():
+                self.stages[stage].append(duration)
+            self.totals.append(total)
+            self.overlaps.append(max(sum(timings.values()) - total, 0.0))
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            stages = {
+                stage: {
+                    "p50": percentile(sorted(durations), 0.5),
+                    "p95": percentile(sorted(durations), 0.95),
+                }
+                for stage, durations in self.stages.items()
+            }
+            totals = sorted(self.totals)
+            overlaps = sorted(self.overlaps)
+            return {
+                "runs": self.runs,
+                "failures": self.failures,
+                "total_p50": percentile(totals, 0.5),
+                "total_p95": percentile(totals, 0.95),
+                "overlap_p50": percentile(overlaps, 0.5),
+                "stages": stages,
+            }
+
+
+_stats: Dict[str, PipelineStats] = defaultdict(PipelineStats)
+register_metrics(
+    "pipelines",
+    lambda: {name: stats.snapshot() for name, stats in list(_stats.items())},
+)
+
+
+class Pipeline:
+    """
+    Small dependency graph of async stages.
+
+    Each stage starts as soon as the stages it depends on are done and
+    receives their results as arguments, so independent stages (e.g. CPU
+    inference in an executor and Spotify requests) overlap and a run takes
+    as long as its slowest path instead of the sum of its stages.
+
+    Stages can only depend on stages added before them, which keeps the
+    graph acyclic. The duration of every stage is recorded under the name
+    of the pipeline and exposed with the other metrics.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._stages: Dict[
+            str, Tuple[Callable[..., Awaitable[Any]], Tuple[str, ...]]
+        ] = {}
+
+    def stage(
+        self,
+        name: str,
+        func: Callable[..., Awaitable[Any]],
+        *depends_on: str,
+    ) -> "Pipeline":
+        """
+        Add a stage.
+
+        :param name: name of the stage.
+        :param func: coroutine function called with the results of its dependencies.
+        :param depends_on: names of the stages it needs.
+        :raises ValueError: if a dependency isn't declared yet.
+        :return: the pipeline, to chain the declarations.
+        """
+        unknown = [dep for dep in depends_on if dep not in self._stages]
+        if unknown:
+            raise ValueError(f"Stage {name} depends on unknown stages {unknown}")
+        self._stages[name] = (func, depends_on)
+        return self
+
+    async def run(self) -> Dict[str, Any]:
+        """
+        Run every stage.
+
+        If a stage fails, the stages still running are cancelled and the
+        error is raised.
+
+        :return: results keyed by stage name.
+        """
+        tasks: Dict[str, "asyncio.Future[Any]"] = {}
+        timings: Dict[str, float] = {}
+
+        async def _run_stage(name: str) -> Any:  # noqa: WPS430
+            func, depends_on = self._stages[name]
+            inputs = [await tasks[dep] for dep in depends_on]
+            start = time.perf_counter()
+            try:
+                return await func(*inputs)
+            finally:
+                timings[name] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for name in self._stages:
+            tasks[name] = asyncio.ensure_future(_run_stage(name))
+        success = False
+        try:
+            await asyncio.gather(*tasks.values())
+            success = True
+        finally:
+            for task in tasks.values():
+                task.cancel()
+            _stats[self.name].record(
+                timings,
+                time.perf_counter() - start,
+                success=success,
+            )
+        return {name: task.result() for name, task in tasks.items()}
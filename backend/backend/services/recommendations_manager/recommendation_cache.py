@@ -0,0 +1,145 @@
+"""
+Cache of Spotify recommendations with quantized parameters.
+
+The models ask for float targets like ``target_energy=0.8417``, so exact
+keys would never repeat. Targets are rounded to buckets of configurable
+width per audio feature, and the cache keeps a full page of candidates per
+key, so requests for fewer tracks are served by slicing it.
+"""
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple
+
+from backend.services.metrics import register_metrics
+from backend.settings import settings
+
+# Bucket width of the parameters missing from the settings.
+DEFAULT_BUCKET = 0.1
+
+CacheKey = Tuple[Tuple[str, ...], Tuple[Tuple[str, object], ...]]
+
+
+def _feature_name(param: str) -> str:
+    for prefix in ("target_", "min_", "max_"):
+        if param.startswith(prefix):
+            return param[len(prefix) :]
+    return param
+
+
+def quantize_params(
+    params: Mapping[str, object], buckets: Mapping[str, float]
+) -> tuple:
+    """
+    Round numeric parameters to the bucket of their audio feature.
+
+    :param params: recommendation parameters.
+    :param buckets: bucket width per audio feature.
+    :return: hashable, order independent parameters.
+    """
+    quantized = []
+    for name, value in params.items():
+        if value is None:
+            continue
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            width = buckets.get(_feature_name(name), DEFAULT_BUCKET)
+            value = round(round(value / width) * width, 6)
+        quantized.append((name, value))
+    return tuple(sorted(quantized))
+
+
+@dataclass
+class CachedRecommendations:
+    track_uris: List[str]
+    expires_at: float
+
+
+class ModelCacheStats:
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+
+    def to_dict(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 3) if total else None,
+        }
+
+
+class RecommendationCache:
+    """
+    LRU cache of candidate tracks per quantized request.
+
+    Entries expire after ``ttl`` seconds, and the least recently used one is
+    evicted beyond ``size`` entries.
+    """
+
+    def __init__(self, size: int, ttl: float, buckets: Mapping[str, float]):
+        self.size = size
+        self.ttl = ttl
+        self.buckets = dict(buckets)
+        self.entries: "OrderedDict[CacheKey, CachedRecommendations]" = OrderedDict()
+        self.evictions = 0
+        self.stats: Dict[str, ModelCacheStats] = defaultdict(ModelCacheStats)
+        self._lock = threading.Lock()
+
+    def key(self, params: Mapping[str, object], genres: Sequence[str]) -> CacheKey:
+        return tuple(sorted(genres)), quantize_params(params, self.buckets)
+
+    def get(self, key: CacheKey, limit: int, model: str) -> Optional[List[str]]:
+        """
+        Get the first tracks cached for a request.
+
+        :param key: key of the request.
+        :param limit: number of tracks wanted.
+        :param model: model asking, for the metrics.
+        :return: the tracks, or None if fewer are cached.
+        """
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry.expires_at < time.monotonic():
+                del self.entries[key]
+                entry = None
+            if entry is None or len(entry.track_uris) < limit:
+                self.stats[model].misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.stats[model].hits += 1
+            return entry.track_uris[:limit]
+
+    def put(self, key: CacheKey, track_uris: List[str]) -> None:
+        with self._lock:
+            self.entries[key] = CachedRecommendations(
+                track_uris=track_uris,
+                expires_at=time.monotonic() + self.ttl,
+            )
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self.entries),
+                "evictions": self.evictions,
+                "models": {
+                    model: stats.to_dict() for model, stats in self.stats.items()
+                },
+            }
+
+
+@lru_cache(maxsize=1)
+def get_recommendation_cache() -> RecommendationCache:
+    """Create the cache of this process from the settings."""
+    cache = RecommendationCache(
+        size=settings.recommendation_cache_size,
+        ttl=settings.recommendation_cache_ttl,
+        buckets=settings.recommendation_cache_buckets,
+    )
+    register_metrics("recommendation_cache", cache.snapshot)
+    return cache
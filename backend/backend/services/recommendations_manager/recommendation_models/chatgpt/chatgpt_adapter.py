@@ -1,44 +1,96 @@
 import json
 import os
 
-import spotipy
+import openai
 from loguru import logger
-from openai import OpenAI
+from openai import AsyncOpenAI
 
+from backend.services.metrics import register_metrics
 from backend.services.recommendations_manager.recommendation_models.recommender_model import (
     RecommenderModel,
 )
+from backend.services.recommendations_manager.track_recommendations import (
+    recommend_tracks,
+)
+from backend.services.resilience import (
+    Failure,
+    ServiceGuard,
+    ServiceUnavailableError,
+    parse_retry_after,
+)
+from backend.services.spotify_manager.spotify_client import (
+    AsyncSpotify,
+    get_spotify_client,
+)
+from backend.settings import settings
+
+
+def classify_openai_error(error: Exception) -> Failure:
+    """
+    Tell whether a failed OpenAI call is worth retrying.
+
+    :param error: exception raised by the OpenAI client.
+    :return: how to handle the failure.
+    """
+    if isinstance(error, openai.APIConnectionError):
+        return Failure(retryable=True)
+    if isinstance(error, openai.APIStatusError):
+        retryable = error.status_code == 429 or error.status_code >= 500
+        retry_after = parse_retry_after(error.response.headers.get("retry-after"))
+        return Failure(retryable, retry_after)
+    return Failure(retryable=False)
+
+
+openai_guard = ServiceGuard(
+    service="openai",
+    classify=classify_openai_error,
+    max_attempts=settings.openai_max_attempts,
+    base_delay=settings.retry_base_delay,
+    max_delay=settings.retry_max_delay,
+    failure_threshold=settings.breaker_failure_threshold,
+    recovery_timeout=settings.breaker_recovery_timeout,
+)
+register_metrics("openai", openai_guard.snapshot)
 
 
 class ChatGPTAdapter(RecommenderModel):
     def __init__(self, config: dict):
         super().__init__(config)
-        self.sp = None
+        self.client = None
+
+    def initialize(self):
+        """
+        Initialize the model by creating the OpenAI client.
+        """
         api_key = os.environ.get("BACKEND_CHATGTP_SECRET")
         if not api_key:
             logger.critical("OpenAI API key not found in environment variables.")
             raise ValueError("OpenAI API key is missing.")
-        self.client = OpenAI(api_key=api_key)
-
-    def initialize(self, access_token: str):
-        """
-        Initialize the model by authorizing the Spotify API.
-        """
-        try:
-            self.sp = self.authorize(access_token)
-            logger.info(f"{self.name} initialized and authorized with Spotify.")
-        except Exception as e:
-            logger.critical(f"Failed to authorize Spotify API: {e}")
-            raise
+        # Retries are handled by the OpenAI guard.
+        self.client = AsyncOpenAI(
+            api_key=api_key,
+            timeout=settings.openai_timeout,
+            max_retries=0,
+        )
+        logger.info(f"{self.name} initialized.")
 
     def finalize(self):
         """
-        Finalize the model. For the ChatGPT API, there might not be much cleanup necessary.
+        Finalize the model by dropping the OpenAI client.
+
+        Closing the async client is a coroutine, its connections are simply
+        released when it's garbage collected.
         """
-        self.sp = None
+        self.client = None
         logger.info(f"{self.name} finalized and cleaned up.")
 
-    def generate_playlist(self, prompt: str, config: dict, context: dict) -> dict:
+    async def generate_playlist(
+        self,
+        prompt: str,
+        config: dict,
+        context: dict,
+        access_token: str,
+    ) -> dict:
         """
         Generate a playlist based on the provided prompt, configuration, and context.
 
@@ -46,6 +98,7 @@ class ChatGPTAdapter(RecommenderModel):
             prompt (str): The input prompt for generating recommendations.
             config (dict): Additional configuration for the recommendation.
             context (dict): Contextual information.
+            access_token (str): Spotify access token of the user.
 
         Returns:
             dict: A dictionary containing the prompt, configuration, and context with the Spotify playlist ID.
@@ -53,21 +106,22 @@ class ChatGPTAdapter(RecommenderModel):
 
         try:
             logger.info(f"Generating playlist with {self.name}...")
+            sp = self.authorize(access_token)
 
             if not json.loads(config.get("generate_genres")):
-                genre_text = self.predict_genre(prompt)
+                genre_text = await self.predict_genre(prompt)
                 config["genres"] = genre_text
             else:
                 genre_text = config.get("genres")
 
             logger.info(f"Genres: {genre_text}")
-            params = self.generate_params(prompt, config.get("popularity"))
+            params = await self.generate_params(prompt, config.get("popularity"))
             logger.info(f"Params: {params}")
-            tracks = self.recommend(
-                params, genre_text, self.sp, config.get("num_songs")
+            tracks = await self.recommend(
+                params, genre_text, sp, config.get("num_songs")
             )
             logger.info(f"Playlist (Song URIs): {tracks}")
-            spotify_id = self.create_spotify_playlist(tracks, prompt, self.sp)
+            spotify_id = await self.create_spotify_playlist(tracks, prompt, sp)
 
             response = {
                 "prompt": prompt,
@@ -77,6 +131,8 @@ class ChatGPTAdapter(RecommenderModel):
 
             return response
 
+        except ServiceUnavailableError:
+            raise
         except ValueError as e:
             print("ValueError:", e)
             logger.critical(e)
@@ -93,17 +149,19 @@ class ChatGPTAdapter(RecommenderModel):
 
             logger.critical(e)
 
-    def authorize(self, access_token: str) -> spotipy.Spotify:
+    def authorize(self, access_token: str) -> AsyncSpotify:
         """
-        Create and return a Spotipy instance
+        Create and return a Spotify client for the user
         """
-        return spotipy.Spotify(auth=access_token)
+        return get_spotify_client(access_token)
 
-    def predict_genre(self, prompt: str) -> list:
+    async def predict_genre(self, prompt: str) -> list:
         """
         Use OpenAI to predict music genres from the given prompt.
         """
-        response = self.client.chat.completions.create(
+        response = await openai_guard.acall(
+            "chat.completions",
+            self.client.chat.completions.create,
             model="gpt-3.5-turbo-0125",
             messages=[
                 {
@@ -137,11 +195,13 @@ class ChatGPTAdapter(RecommenderModel):
 
         return genres
 
-    def generate_params(self, prompt: str, popularity: int) -> dict:
+    async def generate_params(self, prompt: str, popularity: int) -> dict:
         """
         Use OpenAI to generate Spotify song parameters from the given prompt.
         """
-        response = self.client.chat.completions.create(
+        response = await openai_guard.acall(
+            "chat.completions",
+            self.client.chat.completions.create,
             model="gpt-3.5-turbo-0125",
             messages=[
                 {
@@ -178,8 +238,8 @@ class ChatGPTAdapter(RecommenderModel):
 
         return audio_features
 
-    def recommend(
-        self, param_dict: dict, genre_list: list, sp: spotipy.Spotify, num_songs: int
+    async def recommend(
+        self, param_dict: dict, genre_list: list, sp: AsyncSpotify, num_songs: int
     ) -> list:
         """
         Get Spotify recommendations based on the provided parameters and genres.
@@ -187,41 +247,30 @@ class ChatGPTAdapter(RecommenderModel):
         logger.info(f"Params for recommendation: {param_dict}")
         logger.info(f"Asked for this number of songs: {num_songs}")
         logger.info(f"This is the genre_list: {genre_list}")
-        logger.info(f"This is the spotipy instance: {sp.me()}")
 
-        result = sp.recommendations(
-            seed_genres=genre_list, limit=num_songs, **param_dict
+        track_uris = await recommend_tracks(
+            sp, param_dict, genre_list, num_songs, model=self.name
         )
-        logger.info(
-            f"This was the result for track recommendations from Spotify {result}."
-        )
-
-        if not result:
-            logger.warning(f"Nothing was returned from Spotify for url {param_dict}.")
-            raise Exception("Nothing returned from Spotify.")
-
-        track_uris = [track["uri"] for track in result["tracks"]]
+        logger.info(f"Recommended tracks: {track_uris}")
 
         return track_uris
 
-    def create_spotify_playlist(
-        self, track_uris: list, input_text: str, sp: spotipy.Spotify
+    async def create_spotify_playlist(
+        self, track_uris: list, input_text: str, sp: AsyncSpotify
     ) -> str:
         """
         Create a Spotify playlist with the given tracks for the current user.
         """
         # Define username and playlist name to generate
-        user_id = sp.me()["id"]
+        user_id = (await sp.me())["id"]
         playlist_to_add = f"{input_text} - Meloturle generated"
 
         # Create playlist from given track URIs
-        sp.user_playlist_create(user_id, playlist_to_add)
-
-        playlists = sp.user_playlists(user_id)
+        playlist = await sp.user_playlist_create(user_id, playlist_to_add)
 
-        playlist_uid = playlists["items"][0]["id"]
+        playlist_uid = playlist["id"]
         # Add tracks
-        sp.playlist_add_items(playlist_uid, track_uris)
+        await sp.playlist_add_items(playlist_uid, track_uris)
         logger.info(
             f"Spotify playlist '{playlist_to_add}' was created for user '{user_id}'."
         )
@@ -0,0 +1,180 @@
+"""
+Keyword fast path of the genre prediction.
+
+Many prompts literally name the genres or moods they want ("jazz for
+rainy days", "k-pop workout"). Those are matched against an index of the
+genres and their aliases, and only the prompts the index can't explain
+well enough go through the cross-encoder.
+"""
+import re
+import threading
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from backend.services.metrics import register_metrics
+
+# Maximum number of genres passed to Spotify, like the model path.
+MAX_GENRES = 5
+
+# Other ways prompts name a genre, on top of the genre name itself.
+ALIASES: Dict[str, Tuple[str, ...]] = {
+    "alt-rock": ("alternative rock",),
+    "drum-and-bass": ("drum n bass", "drum & bass", "dnb", "d&b"),
+    "edm": ("electronic dance music",),
+    "electronic": ("electronica",),
+    "hip-hop": ("hiphop", "rap", "rapper", "trap"),
+    "holidays": ("christmas", "xmas", "holiday season"),
+    "j-pop": ("jpop",),
+    "j-rock": ("jrock",),
+    "k-pop": ("kpop",),
+    "chill": ("chilled", "chillout", "chill out", "relax", "relaxing", "lofi", "lo fi"),
+    "classical": ("orchestra", "orchestral", "symphony"),
+    "country": ("cowboy",),
+    "happy": ("cheerful", "joyful", "upbeat"),
+    "heavy-metal": ("heavy metal",),
+    "kids": ("children songs",),
+    "movies": ("movie", "film"),
+    "r-n-b": ("r&b", "rnb", "r and b", "rhythm and blues"),
+    "rainy-day": ("rainy", "rain"),
+    "road-trip": ("roadtrip", "road trip", "driving", "drive"),
+    "rock-n-roll": ("rock and roll", "rock & roll", "rock n roll"),
+    "romance": ("romantic", "love songs", "date night"),
+    "sad": ("sadness", "heartbreak", "breakup", "crying", "melancholic"),
+    "show-tunes": ("broadway", "musicals"),
+    "sleep": ("sleeping", "bedtime"),
+    "soundtracks": ("soundtrack", "ost"),
+    "study": ("studying", "focus", "concentration"),
+    "synth-pop": ("synthpop",),
+    "work-out": ("workout", "gym", "exercise", "training", "running", "cardio"),
+    "world-music": ("world music",),
+}
+
+# Words that don't say anything about the genre.
+STOPWORDS = frozenset(
+    (
+        "a an and at be by for from i im in into is it me my of on or our "
+        "some that the this to vibe vibes with music song songs playlist "
+        "playlists track tracks tune tunes something kind like feel feeling "
+        "make makes while when during day days night mood please want need "
+        "good best great really very just"
+    ).split(),
+)
+
+_TOKEN = re.compile(r"[a-z0-9&]+")
+
+
+def _stem(token: str) -> str:
+    """Light suffix stripping, applied to both the index and the prompts."""
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 5 and token.endswith("ing"):
+        return token[:-3]
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    return [_stem(token) for token in _TOKEN.findall(text.lower().replace("-", " "))]
+
+
+class GenreLexicon:
+    """
+    Index of the genres by the phrases naming them.
+
+    Phrases are indexed by their first token, so matching a prompt is a
+    single left-to-right pass trying the longest phrase first at each
+    position: linear in the prompt length.
+    """
+
+    def __init__(self, genres: Iterable[str], aliases: Dict[str, Tuple[str, ...]]):
+        self.phrases: Dict[str, List[Tuple[Tuple[str, ...], str]]] = {}
+        for genre in genres:
+            for phrase in (genre, *aliases.get(genre, ())):
+                tokens = tuple(tokenize(phrase))
+                if tokens:
+                    self.phrases.setdefault(tokens[0], []).append((tokens, genre))
+        for candidates in self.phrases.values():
+            candidates.sort(key=lambda candidate: len(candidate[0]), reverse=True)
+
+    def match(self, prompt: str) -> Tuple[List[str], float]:
+        """
+        Find the genres named in a prompt.
+
+        :param prompt: free text of the user.
+        :return: genres in order of appearance, and the share of the
+            meaningful words of the prompt they explain.
+        """
+        tokens = tokenize(prompt)
+        genres: List[str] = []
+        matched = 0
+        content = sum(token not in STOPWORDS for token in tokens)
+        index = 0
+        while index < len(tokens):
+            for phrase, genre in self.phrases.get(tokens[index], ()):
+                if tuple(tokens[index : index + len(phrase)]) == phrase:
+                    if genre not in genres:
+                        genres.append(genre)
+                    matched += sum(token not in STOPWORDS for token in phrase)
+                    index += len(phrase)
+                    break
+            else:
+                index += 1
+        coverage = matched / content if content else 0.0
+        return genres[:MAX_GENRES], coverage
+
+
+class LexiconStats:
+    """Share of the prompts answered by the fast path."""
+
+    def __init__(self) -> None:
+        self.hits = 0
+        self.partial = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def record(self, genres: List[str], hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            elif genres:
+                self.partial += 1
+            else:
+                self.misses += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            total = self.hits + self.partial + self.misses
+            return {
+                "hits": self.hits,
+                # Genres were found but didn't explain enough of the prompt.
+                "partial": self.partial,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 3) if total else None,
+            }
+
+
+lexicon_stats = LexiconStats()
+register_metrics("genre_lexicon", lexicon_stats.snapshot)
+
+
+@lru_cache(maxsize=1)
+def get_lexicon(genres: Tuple[str, ...]) -> GenreLexicon:
+    return GenreLexicon(genres, ALIASES)
+
+
+def match_genres(
+    prompt: str, genres: Iterable[str], min_coverage: float
+) -> Optional[List[str]]:
+    """
+    Answer the genre prediction from the lexicon when confident enough.
+
+    :param prompt: free text of the user.
+    :param genres: available genres.
+    :param min_coverage: share of the meaningful words the matches must explain.
+    :return: the genres, or None to fall back to the model.
+    """
+    found, coverage = get_lexicon(tuple(genres)).match(prompt)
+    hit = bool(found) and coverage >= min_coverage
+    lexicon_stats.record(found, hit)
+    return found if hit else None
@@ -0,0 +1,327 @@
+"""
+Export, verify and benchmark the ONNX backends of the genre model.
+
+Usage::
+
+    python -m backend.services.recommendations_manager.recommendation_models.moodika.model_a.genre_onnx export
+    python -m backend.services.recommendations_manager.recommendation_models.moodika.model_a.genre_onnx verify
+    python -m backend.services.recommendations_manager.recommendation_models.moodika.model_a.genre_onnx benchmark
+    python -m backend.services.recommendations_manager.recommendation_models.moodika.model_a.genre_onnx tokenize
+
+Exporting and verifying need both the torch and the onnx extras.
+"""
+import argparse
+import json
+import multiprocessing
+import resource
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+from backend.services.metrics import percentile
+from backend.services.recommendations_manager.recommendation_models.moodika.model_a import (
+    config as cfg,
+)
+from backend.services.recommendations_manager.recommendation_models.moodika.model_a.genre_scorer import (
+    MODEL_NAME,
+    ONNX_INT8_MODEL_FILE,
+    ONNX_MODEL_FILE,
+    SCORER_CONFIG_FILE,
+    GenrePairEncoder,
+    create_genre_scorer,
+    encode_pairs,
+    load_tokenizer,
+    score_genres,
+)
+from backend.services.resources import get_resource_plan
+from backend.settings import GenreModelBackend, settings
+
+# Prompts the backends are compared on, against every genre of the config.
+SAMPLE_PROMPTS = (
+    "rainy sunday morning with a coffee",
+    "getting pumped before a heavy leg day at the gym",
+    "driving through the desert at night with the windows down",
+    "sad breakup songs to cry to",
+    "summer beach party with friends",
+    "focus music for studying maths",
+    "80s synth vibes",
+    "quiet dinner by candlelight",
+)
+# Maximum score difference of the torch and fp32 ONNX backends with the reference.
+FP32_TOLERANCE = 1e-3
+# Genres passed to Spotify that must be the same for every prompt.
+TOP_K = 5
+
+
+def export(model_dir: Path, quantize: bool, opset: int) -> None:
+    """
+    Export the cross-encoder to ONNX, with its tokenizer.
+
+    :param model_dir: directory to write the model to.
+    :param quantize: also write an int8 dynamically quantized model.
+    :param opset: ONNX opset version.
+    """
+    import torch  # noqa: WPS433
+    from sentence_transformers import CrossEncoder  # noqa: WPS433
+
+    cross_encoder = CrossEncoder(MODEL_NAME)
+    tokenizer = cross_encoder.tokenizer
+    model = cross_encoder.model.eval()
+
+    sample = tokenizer(
+        [["a sample prompt", "rock"]],
+        padding=True,
+        truncation="longest_first",
+        return_tensors="pt",
+    )
+    input_names = [
+        name
+        for name in ("input_ids", "attention_mask", "token_type_ids")
+        if name in sample
+    ]
+
+    class _Logits(torch.nn.Module):  # noqa: WPS431
+        def __init__(self) -> None:
+            super().__init__()
+            self.model = model
+
+        def forward(self, *inputs):
+            return self.model(**dict(zip(input_names, inputs))).logits
+
+    model_dir.mkdir(parents=True, exist_ok=True)
+    dynamic_axes: Dict[str, Dict[int, str]] = {
+        name: {0: "batch", 1: "sequence"} for name in input_names
+    }
+    dynamic_axes["logits"] = {0: "batch"}
+    with torch.no_grad():
+        torch.onnx.export(
+            _Logits(),
+            tuple(sample[name] for name in input_names),
+            str(model_dir / ONNX_MODEL_FILE),
+            input_names=input_names,
+            output_names=["logits"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+        )
+    tokenizer.save_pretrained(str(model_dir))
+
+    activation = cross_encoder.default_activation_function
+    scorer_config = {
+        "model": MODEL_NAME,
+        "activation": "sigmoid"
+        if isinstance(activation, torch.nn.Sigmoid)
+        else "identity",
+        "max_length": cross_encoder.max_length or tokenizer.model_max_length,
+    }
+    (model_dir / SCORER_CONFIG_FILE).write_text(json.dumps(scorer_config, indent=2))
+    print(f"Exported {MODEL_NAME} to {model_dir / ONNX_MODEL_FILE}")
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic  # noqa: WPS433
+
+        quantize_dynamic(
+            str(model_dir / ONNX_MODEL_FILE),
+            str(model_dir / ONNX_INT8_MODEL_FILE),
+            weight_type=QuantType.QInt8,
+        )
+        print(f"Quantized to {model_dir / ONNX_INT8_MODEL_FILE}")
+
+
+def _scores(backend: GenreModelBackend, model_dir: Path) -> np.ndarray:
+    scorer = create_genre_scorer(backend, model_dir)
+    return np.array(
+        [score_genres(scorer, prompt, cfg.genres) for prompt in SAMPLE_PROMPTS],
+    )
+
+
+def _top_genres(scores: np.ndarray) -> List[List[str]]:
+    return [
+        [cfg.genres[idx] for idx in np.argsort(row)[::-1][:TOP_K]] for row in scores
+    ]
+
+
+def _reference_scores(model_dir: Path) -> np.ndarray:
+    # CrossEncoder.predict tokenizes every pair, unlike the scorers.
+    scorer = create_genre_scorer(GenreModelBackend.TORCH, model_dir)
+    return np.array(
+        [
+            scorer.model.predict([[prompt, genre] for genre in cfg.genres])
+            for prompt in SAMPLE_PROMPTS
+        ],
+    )
+
+
+def verify(model_dir: Path) -> bool:
+    """
+    Check that the backends score genres like the torch model.
+
+    The reference is the sentence-transformers model tokenizing every pair
+    itself. The torch and fp32 backends must match its scores within
+    ``FP32_TOLERANCE``. The int8 model can't, so it must pick the same top
+    genres for every prompt.
+
+    :param model_dir: directory of the exported models.
+    :return: whether every available backend passed.
+    """
+    reference = _reference_scores(model_dir)
+    reference_top = _top_genres(reference)
+    passed = True
+    for backend in GenreModelBackend:
+        model_file = {
+            GenreModelBackend.ONNX: ONNX_MODEL_FILE,
+            GenreModelBackend.ONNX_INT8: ONNX_INT8_MODEL_FILE,
+        }.get(backend)
+        if model_file is not None and not (model_dir / model_file).exists():
+            print(f"{backend.value}: not exported, skipped")
+            continue
+        scores = _scores(backend, model_dir)
+        max_diff = float(np.abs(scores - reference).max())
+        same_top = sum(
+            top == ref for top, ref in zip(_top_genres(scores), reference_top)
+        )
+        ok = (
+            same_top == len(SAMPLE_PROMPTS)
+            if backend == GenreModelBackend.ONNX_INT8
+            else max_diff <= FP32_TOLERANCE
+        )
+        passed = passed and ok
+        print(
+            f"{backend.value}: max score difference {max_diff:.5f}, "
+            f"same top {TOP_K} genres for {same_top}/{len(SAMPLE_PROMPTS)} prompts "
+            f"-> {'OK' if ok else 'FAILED'}",
+        )
+    return passed
+
+
+def _benchmark_backend(backend: GenreModelBackend, model_dir: Path, runs: int) -> dict:
+    # Runs in its own process, so the RSS only accounts for this backend.
+    start = time.perf_counter()
+    scorer = create_genre_scorer(backend, model_dir)
+    load_time = time.perf_counter() - start
+    score_genres(scorer, SAMPLE_PROMPTS[0], cfg.genres)  # Warm up.
+
+    latencies = []
+    for run in range(runs):
+        prompt = SAMPLE_PROMPTS[run % len(SAMPLE_PROMPTS)]
+        start = time.perf_counter()
+        score_genres(scorer, prompt, cfg.genres)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    # ru_maxrss is in kilobytes on Linux.
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {
+        "load_seconds": round(load_time, 2),
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "peak_rss_mb": round(rss),
+    }
+
+
+def benchmark(model_dir: Path, runs: int) -> None:
+    """
+    Compare the latency and memory of every available backend.
+
+    :param model_dir: directory of the exported models.
+    :param runs: predictions timed per backend.
+    """
+    context = multiprocessing.get_context("spawn")
+    print(
+        f"Scoring {len(cfg.genres)} genres, {runs} runs, {get_resource_plan().intra_op_threads} thread(s)"
+    )
+    print(
+        f"{'backend':<10} {'load s':>8} {'p50 ms':>8} {'p95 ms':>8} {'peak RSS MB':>12}"
+    )
+    for backend in GenreModelBackend:
+        with context.Pool(1) as pool:
+            try:
+                result = pool.apply(_benchmark_backend, (backend, model_dir, runs))
+            except Exception as e:
+                print(f"{backend.value:<10} unavailable: {e}")
+                continue
+        print(
+            f"{backend.value:<10} {result['load_seconds']:>8} {result['p50_ms']:>8} "
+            f"{result['p95_ms']:>8} {result['peak_rss_mb']:>12}",
+        )
+
+
+def _time_encoding(encode, runs: int) -> List[float]:
+    latencies = []
+    for run in range(runs):
+        prompt = SAMPLE_PROMPTS[run % len(SAMPLE_PROMPTS)]
+        pairs = [[prompt, genre] for genre in cfg.genres]
+        start = time.perf_counter()
+        encode(pairs)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return latencies
+
+
+def benchmark_tokenization(model_dir: Path, runs: int) -> bool:
+    """
+    Compare tokenizing every pair with building them from cached genre tokens.
+
+    Only needs the exported tokenizer. Both must produce the same inputs.
+
+    :param model_dir: directory of the exported model.
+    :param runs: encodings timed per method.
+    :return: whether the cached inputs match the tokenizer's.
+    """
+    tokenizer, scorer_config = load_tokenizer(model_dir)
+    encoder = GenrePairEncoder(tokenizer, scorer_config["max_length"])
+    if not encoder.enabled:
+        print("The tokenizer isn't supported by the cached encoder")
+        return False
+    same = 0
+    for prompt in SAMPLE_PROMPTS:
+        pairs = [[prompt, genre] for genre in cfg.genres]
+        expected = encode_pairs(tokenizer, pairs)
+        actual = encoder.encode(pairs)
+        same += all(np.array_equal(actual[name], expected[name]) for name in expected)
+    print(f"Same inputs for {same}/{len(SAMPLE_PROMPTS)} prompts")
+
+    print(f"Encoding {len(cfg.genres)} pairs, {runs} runs")
+    print(f"{'method':<10} {'p50 ms':>8} {'p95 ms':>8}")
+    methods = (
+        ("tokenizer", lambda pairs: encode_pairs(tokenizer, pairs)),
+        ("cached", encoder.encode),
+    )
+    for name, encode in methods:
+        encode([[SAMPLE_PROMPTS[0], genre] for genre in cfg.genres])  # Warm up.
+        latencies = _time_encoding(encode, runs)
+        print(
+            f"{name:<10} {percentile(latencies, 0.5) * 1000:>8.3f} "
+            f"{percentile(latencies, 0.95) * 1000:>8.3f}",
+        )
+    return same == len(SAMPLE_PROMPTS)
+
+
+def main() -> None:
+    """Run the command given on the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--model-dir", type=Path, default=settings.genre_model_dir)
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="export the model to ONNX")
+    export_parser.add_argument("--no-quantize", action="store_true")
+    export_parser.add_argument("--opset", type=int, default=14)
+    commands.add_parser("verify", help="compare ONNX scores with torch")
+    benchmark_parser = commands.add_parser("benchmark", help="compare the backends")
+    benchmark_parser.add_argument("--runs", type=int, default=50)
+    tokenize_parser = commands.add_parser("tokenize", help="benchmark the tokenization")
+    tokenize_parser.add_argument("--runs", type=int, default=500)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export(args.model_dir, quantize=not args.no_quantize, opset=args.opset)
+    elif args.command == "verify":
+        sys.exit(0 if verify(args.model_dir) else 1)
+    elif args.command == "tokenize":
+        sys.exit(0 if benchmark_tokenization(args.model_dir, args.runs) else 1)
+    else:
+        benchmark(args.model_dir, args.runs)
+
+
+if __name__ == "__main__":
+    main()
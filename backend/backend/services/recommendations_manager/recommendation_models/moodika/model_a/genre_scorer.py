@@ -0,0 +1,318 @@
+"""
+Inference backends of the Moodika genre cross-encoder.
+
+The torch backend runs the sentence-transformers model as published. The
+ONNX backends run a graph exported from it (see ``genre_onnx``) with
+onnxruntime and the ``tokenizers`` library, so a worker using them needs
+neither torch nor sentence-transformers. All of them build their inputs
+from cached genre tokens with ``GenrePairEncoder``. Backends are only
+imported when selected.
+"""
+import json
+import threading
+from itertools import groupby
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from backend.services.resources import configure_torch, get_resource_plan
+from backend.settings import GenreModelBackend
+
+MODEL_NAME = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+# Files written by the export, in settings.genre_model_dir.
+ONNX_MODEL_FILE = "model.onnx"
+ONNX_INT8_MODEL_FILE = "model.int8.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+SCORER_CONFIG_FILE = "scorer.json"
+# Candidate lists whose tokens are kept, the genres of the config in practice.
+MAX_CACHED_CANDIDATES = 16
+
+
+def load_tokenizer(model_dir: Path):
+    """
+    Load the exported tokenizer, set up like the torch model's.
+
+    :param model_dir: directory of the exported model.
+    :return: tokenizer and the scorer config written by the export.
+    """
+    from tokenizers import Tokenizer  # noqa: WPS433
+
+    scorer_config = json.loads((model_dir / SCORER_CONFIG_FILE).read_text())
+    tokenizer = Tokenizer.from_file(str(model_dir / TOKENIZER_FILE))
+    tokenizer.enable_truncation(max_length=scorer_config["max_length"])
+    tokenizer.enable_padding()
+    return tokenizer, scorer_config
+
+
+def encode_pairs(tokenizer, pairs: Sequence[Sequence[str]]) -> Dict[str, np.ndarray]:
+    """
+    Tokenize (text, genre) pairs with the tokenizer.
+
+    :param tokenizer: tokenizer of the model.
+    :param pairs: pairs to tokenize.
+    :return: model inputs.
+    """
+    encodings = tokenizer.encode_batch([tuple(pair) for pair in pairs])
+    return {
+        "input_ids": np.array([enc.ids for enc in encodings], dtype=np.int64),
+        "attention_mask": np.array(
+            [enc.attention_mask for enc in encodings],
+            dtype=np.int64,
+        ),
+        "token_type_ids": np.array(
+            [enc.type_ids for enc in encodings],
+            dtype=np.int64,
+        ),
+    }
+
+
+class GenrePairEncoder:
+    """
+    Builds the inputs of (text, genre) pairs from cached genre tokens.
+
+    Every prediction pairs a prompt with the same genres, so the genres are
+    tokenized once and only the prompt is tokenized per request. The pairs
+    are then laid out as ``[CLS] prompt [SEP] genre [SEP]`` in per-thread
+    buffers sized for the longest input, instead of tokenizing and padding
+    every pair again.
+
+    Only BERT-style tokenizers are supported; the layout is checked against
+    the tokenizer on creation and the encoder disables itself otherwise.
+    Pairs that would need truncation also go through the tokenizer.
+    """
+
+    def __init__(self, tokenizer, max_length: int):
+        self.tokenizer = tokenizer
+        self.max_length = max_length
+        self.cls_id = tokenizer.token_to_id("[CLS]")
+        self.sep_id = tokenizer.token_to_id("[SEP]")
+        self.pad_id = (tokenizer.padding or {}).get("pad_id", 0)
+        self._candidates: Dict[Tuple[str, ...], Tuple[np.ndarray, np.ndarray]] = {}
+        self._local = threading.local()
+        self._positions = np.arange(max_length)
+        self.enabled = self.cls_id is not None and self.sep_id is not None
+        if self.enabled:
+            sample = [["a sample prompt", "rock"], ["a sample prompt", "drum-and-bass"]]
+            expected = encode_pairs(tokenizer, sample)
+            actual = self.encode(sample)
+            self.enabled = actual is not None and all(
+                np.array_equal(actual[name], expected[name]) for name in expected
+            )
+
+    def _tokens(self, text: str) -> List[int]:
+        return self.tokenizer.encode(text, add_special_tokens=False).ids
+
+    def _candidate_tokens(
+        self, candidates: Tuple[str, ...]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Tokens of candidates, each followed by [SEP] and padded to the longest.
+
+        :return: token matrix and the length of each row without padding.
+        """
+        cached = self._candidates.get(candidates)
+        if cached is None:
+            encodings = self.tokenizer.encode_batch(
+                list(candidates),
+                add_special_tokens=False,
+            )
+            # The batch is padded by the tokenizer, the mask gives the lengths.
+            ids = [enc.ids[: sum(enc.attention_mask)] for enc in encodings]
+            lengths = np.array([len(row_ids) + 1 for row_ids in ids], dtype=np.int64)
+            tokens = np.full(
+                (len(candidates), lengths.max()), self.pad_id, dtype=np.int64
+            )
+            for row, row_ids in enumerate(ids):
+                tokens[row, : len(row_ids)] = row_ids
+                tokens[row, len(row_ids)] = self.sep_id
+            if len(self._candidates) >= MAX_CACHED_CANDIDATES:
+                self._candidates.clear()
+            cached = self._candidates[candidates] = (tokens, lengths)
+        return cached
+
+    def _buffers(self, size: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        buffers = getattr(self._local, "buffers", None)
+        if buffers is None or buffers[0].size < size:
+            buffers = tuple(np.empty(size, dtype=np.int64) for _ in range(3))
+            self._local.buffers = buffers
+        return buffers
+
+    def encode(self, pairs: Sequence[Sequence[str]]) -> Optional[Dict[str, np.ndarray]]:
+        """
+        Build the model inputs of pairs.
+
+        The arrays are views of buffers of the calling thread, only valid
+        until its next call.
+
+        :param pairs: (text, genre) pairs, grouped by text.
+        :return: model inputs, or None if the tokenizer must be used.
+        """
+        groups = []
+        for text, group in groupby(pairs, key=lambda pair: pair[0]):
+            candidates = tuple(pair[1] for pair in group)
+            prompt = self._tokens(text)
+            tokens, lengths = self._candidate_tokens(candidates)
+            groups.append((prompt, tokens, lengths))
+        if not groups:
+            return None
+        seq_len = max(len(prompt) + 2 + tokens.shape[1] for prompt, tokens, _ in groups)
+        if seq_len > self.max_length:
+            return None
+
+        rows = len(pairs)
+        ids_buffer, mask_buffer, type_buffer = self._buffers(rows * self.max_length)
+        input_ids = ids_buffer[: rows * seq_len].reshape(rows, seq_len)
+        attention_mask = mask_buffer[: rows * seq_len].reshape(rows, seq_len)
+        token_type_ids = type_buffer[: rows * seq_len].reshape(rows, seq_len)
+        input_ids.fill(self.pad_id)
+        positions = self._positions[:seq_len]
+
+        start = 0
+        for prompt, tokens, lengths in groups:
+            end = start + len(lengths)
+            second = len(prompt) + 2
+            input_ids[start:end, 0] = self.cls_id
+            input_ids[start:end, 1 : second - 1] = prompt
+            input_ids[start:end, second - 1] = self.sep_id
+            input_ids[start:end, second : second + tokens.shape[1]] = tokens
+            totals = (second + lengths)[:, None]
+            np.less(positions, totals, out=attention_mask[start:end], casting="unsafe")
+            np.greater_equal(
+                positions, second, out=token_type_ids[start:end], casting="unsafe"
+            )
+            token_type_ids[start:end] &= attention_mask[start:end]
+            start = end
+        return {
+            "input_ids": input_ids,
+            "attention_mask": attention_mask,
+            "token_type_ids": token_type_ids,
+        }
+
+
+class TorchGenreScorer:
+    """
+    Scores (text, genre) pairs with the sentence-transformers model.
+
+    The inputs are built by a ``GenrePairEncoder`` over a copy of the
+    model's tokenizer, like the ONNX backends, and handed to the model as
+    tensors sharing their buffers. ``CrossEncoder.predict`` is only used
+    when the encoder can't build them.
+    """
+
+    def __init__(self, model_name: str = MODEL_NAME):
+        import torch  # noqa: WPS433
+        from sentence_transformers import CrossEncoder  # noqa: WPS433
+        from tokenizers import Tokenizer  # noqa: WPS433
+
+        configure_torch()
+        self.torch = torch
+        self.model = CrossEncoder(model_name)
+        hf_tokenizer = self.model.tokenizer
+        max_length = self.model.max_length or hf_tokenizer.model_max_length
+        # Set up like the exported tokenizer, see load_tokenizer.
+        tokenizer = Tokenizer.from_str(hf_tokenizer.backend_tokenizer.to_str())
+        tokenizer.enable_truncation(max_length=max_length)
+        tokenizer.enable_padding(
+            pad_id=hf_tokenizer.pad_token_id,
+            pad_token=hf_tokenizer.pad_token,
+        )
+        self.encoder = GenrePairEncoder(tokenizer, max_length)
+        self.input_names = set(hf_tokenizer.model_input_names)
+        self.activation = self.model.default_activation_function
+
+    def predict(self, pairs: Sequence[Sequence[str]]) -> np.ndarray:
+        inputs = self.encoder.encode(pairs) if self.encoder.enabled else None
+        if inputs is None:
+            return self.model.predict(pairs)
+        device = self.model.model.device
+        features = {
+            name: self.torch.from_numpy(value).to(device)
+            for name, value in inputs.items()
+            if name in self.input_names
+        }
+        with self.torch.inference_mode():
+            logits = self.model.model(**features, return_dict=True).logits
+            scores = self.activation(logits)
+        # Same shape as CrossEncoder.predict: one score per pair.
+        if scores.shape[1] == 1:
+            scores = scores[:, 0]
+        return scores.cpu().numpy()
+
+
+class OnnxGenreScorer:
+    """
+    Scores (text, genre) pairs with the exported ONNX graph.
+
+    Tokenization matches the torch model (same tokenizer, truncation and
+    padding), and so does the final activation, recorded at export time.
+    """
+
+    def __init__(self, model_dir: Path, quantized: bool = False):
+        import onnxruntime  # noqa: WPS433
+
+        model_file = ONNX_INT8_MODEL_FILE if quantized else ONNX_MODEL_FILE
+        if not (model_dir / model_file).exists():
+            raise FileNotFoundError(
+                f"{model_dir / model_file} not found, export it with "
+                "python -m backend.services.recommendations_manager."
+                "recommendation_models.moodika.model_a.genre_onnx export",
+            )
+        self.tokenizer, scorer_config = load_tokenizer(model_dir)
+        self.sigmoid = scorer_config["activation"] == "sigmoid"
+        self.encoder = GenrePairEncoder(self.tokenizer, scorer_config["max_length"])
+
+        options = onnxruntime.SessionOptions()
+        plan = get_resource_plan()
+        options.intra_op_num_threads = plan.intra_op_threads
+        options.inter_op_num_threads = plan.inter_op_threads
+        options.graph_optimization_level = (
+            onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        )
+        self.session = onnxruntime.InferenceSession(
+            str(model_dir / model_file),
+            options,
+            providers=["CPUExecutionProvider"],
+        )
+        self.input_names = {node.name for node in self.session.get_inputs()}
+
+    def predict(self, pairs: Sequence[Sequence[str]]) -> np.ndarray:
+        inputs = self.encoder.encode(pairs) if self.encoder.enabled else None
+        if inputs is None:
+            inputs = encode_pairs(self.tokenizer, pairs)
+        inputs = {
+            name: value for name, value in inputs.items() if name in self.input_names
+        }
+        logits = self.session.run(None, inputs)[0][:, 0]
+        if self.sigmoid:
+            return 1 / (1 + np.exp(-logits))
+        return logits
+
+
+def create_genre_scorer(backend: GenreModelBackend, model_dir: Path):
+    """
+    Create the scorer of a backend.
+
+    :param backend: inference backend.
+    :param model_dir: directory of the exported ONNX model.
+    :return: scorer with a ``predict(pairs)`` method.
+    """
+    if backend == GenreModelBackend.TORCH:
+        return TorchGenreScorer()
+    return OnnxGenreScorer(
+        model_dir,
+        quantized=backend == GenreModelBackend.ONNX_INT8,
+    )
+
+
+def score_genres(scorer, text: str, genres: List[str]) -> np.ndarray:
+    """
+    Score how well each genre matches a text.
+
+    :param scorer: scorer of any backend.
+    :param text: free text of the user.
+    :param genres: candidate genres.
+    :return: one score per genre.
+    """
+    return scorer.predict([[text, genre] for genre in genres])
@@ -1,13 +1,29 @@
+import asyncio
 import logging
+from functools import lru_cache
 
 import numpy as np
 import pandas as pd
-import spotipy
-from sentence_transformers import CrossEncoder
+from loguru import logger
 
 from backend.services.recommendations_manager.recommendation_models.moodika.model_a import (
     config as cfg,
 )
+from backend.services.recommendations_manager.recommendation_models.moodika.model_a.genre_lexicon import (
+    match_genres,
+)
+from backend.services.recommendations_manager.recommendation_models.moodika.model_a.genre_scorer import (
+    create_genre_scorer,
+)
+from backend.services.recommendations_manager.track_recommendations import (
+    recommend_tracks,
+)
+from backend.services.resilience import ServiceUnavailableError
+from backend.services.spotify_manager.spotify_client import (
+    AsyncSpotify,
+    get_spotify_client,
+)
+from backend.settings import settings
 
 logging.basicConfig(
     filename=cfg.LOGFILE_NAME,
@@ -16,22 +32,54 @@ logging.basicConfig(
 )
 
 
-def authorize(access_token: str):
+def authorize(access_token: str) -> AsyncSpotify:
     """
-    Create and return a Spotipy instance
+    Create and return a Spotify client for the user
     """
-    sp = spotipy.Spotify(auth=access_token)
+    sp = get_spotify_client(access_token)
     return sp
 
 
+@lru_cache(maxsize=1)
+def get_similarity_model():
+    """
+    Load the genre cross-encoder once per process, with the configured
+    inference backend (torch or ONNX), or connect to the model server
+    that owns it.
+    """
+    if settings.model_server_socket is not None:
+        from backend.model_server.client import (  # noqa: WPS433
+            ModelServerClient,
+            RemoteGenreScorer,
+        )
+
+        return RemoteGenreScorer(
+            ModelServerClient(
+                settings.model_server_socket,
+                timeout=settings.model_server_timeout,
+            ),
+        )
+    return create_genre_scorer(settings.genre_model_backend, settings.genre_model_dir)
+
+
 def predict_genre(prompt):
     """
     Takes given free text and returns the most similar genres over a given similarity threshold (limit 5).
     Threshold can be configured in config file.
     If no genres are found over similarity threshold, a default list of genres is returned (can be configured as well).
+    Prompts naming their genres explicitly are answered from the lexicon, without the model.
     """
+    if settings.genre_lexicon_enabled:
+        lexicon_genres = match_genres(
+            prompt,
+            cfg.genres,
+            min_coverage=settings.genre_lexicon_min_coverage,
+        )
+        if lexicon_genres is not None:
+            logger.debug(f"Genres of the prompt from the lexicon: {lexicon_genres}")
+            return lexicon_genres
 
-    similarity_model = CrossEncoder("cross-encoder/ms-marco-MiniLM-L-6-v2")
+    similarity_model = get_similarity_model()
 
     # We want to compute the similarity between the query sentence
     input_text = prompt
@@ -63,48 +111,35 @@ def predict_genre(prompt):
     return top_genres
 
 
-def recommend(param_dict, genre_list, sp, num_songs):
+async def recommend(param_dict, genre_list, sp, num_songs, model="moodika"):
     """
     Takes a dictionary of values for various audio parameters and returns a list of Spotify-recommended track URIs.
     """
-    # Send a request to Spotify API using Spotipy
-    result = sp.recommendations(seed_genres=genre_list, limit=num_songs, **param_dict)
-
-    # Iterate over response from Spotify, taking track URIs from recommended tracks
-    if result:
-        track_uris = []
-        print("Playlist")
-        for track in result["tracks"]:
-            # print(f"Song: {track['name']}, Artist: {dict(track['album']['artists'][0])['name']}\n")
-            track_uris.append(track["uri"])
-    else:
-        logging.warning(f"Nothing was returned from Spotify for url {param_dict}.")
-        raise Exception("Nothing returned from Spotify.")
+    # Spotify recommendations or the local track index, see recommend_tracks
+    track_uris = await recommend_tracks(sp, param_dict, genre_list, num_songs, model)
     return track_uris
 
 
-def create_spotify_playlist(track_uris, input_text, sp):
+async def create_spotify_playlist(track_uris, input_text, sp):
     """
-    Utilize Spotipy library to create a playlist given list of track URIs for current user
+    Create a playlist given list of track URIs for current user
     """
     # Define username and playlist name to generate
-    user_id = sp.me()["id"]
+    user_id = (await sp.me())["id"]
     print("userid" + user_id)
 
     playlist_to_add = f"{input_text} - Meloturle generated"
 
     # Create playlist from given track URIs
-    sp.user_playlist_create(user_id, playlist_to_add)
+    playlist = await sp.user_playlist_create(user_id, playlist_to_add)
     print("inside create_spotify_playlist")
 
-    playlists = sp.user_playlists(user_id)
-
-    playlist_uid = playlists["items"][0]["id"]
+    playlist_uid = playlist["id"]
     playlist_link = f"https://open.spotify.com/playlist/{playlist_uid}"
     # print(f"Track URIs: {track_uris}")
 
     # Add tracks
-    sp.playlist_add_items(playlist_uid, track_uris)
+    await sp.playlist_add_items(playlist_uid, track_uris)
     logging.info(
         f"Spotify playlist '{playlist_to_add}' was created for Spotify user '{user_id}'.",
     )
@@ -123,7 +158,7 @@ def raise_spotify_error():
     raise Exception(f"Nothing Returned from Spotify. Try using different input.")
 
 
-def generate_params(prompt, num_playlists, sp, popularity):
+async def generate_params(prompt, num_playlists, sp, popularity):
     """
     Generate parameters from given text.
     Process is as follows:
@@ -134,20 +169,21 @@ def generate_params(prompt, num_playlists, sp, popularity):
     4. Average the averages for each playlist, return a dictionary of average for each audio feature
     """
     try:
-        # Save text argument and initialize a Spotipy instance
+        # Save text argument
         input_text = prompt
-        # sp = authorize()
         # (1) Get all playlist uris from playlists in search results
-        playlists_results = sp.search(
-            q=input_text, limit=num_playlists, type="playlist"
+        playlists_results = (
+            await sp.search(q=input_text, limit=num_playlists, type="playlist")
         )["playlists"]
         print("inside generate_params")
 
         playlist_uris = [playlist["id"] for playlist in playlists_results["items"]]
         print("Playlist URIs (list of strings):", playlist_uris, "\n")
 
-        # (2) Get all track uris from playlists in search results
-        track_results = [sp.playlist_items(p_uri, limit=100) for p_uri in playlist_uris]
+        # (2) Get all track uris from playlists in search results, concurrently
+        track_results = await asyncio.gather(
+            *[sp.playlist_items(p_uri, limit=100) for p_uri in playlist_uris],
+        )
         if len(track_results) == 0:
             raise_spotify_error()
 
@@ -166,10 +202,12 @@ def generate_params(prompt, num_playlists, sp, popularity):
         # print("Track URIs (dict):\n", track_uris_dict)
 
         # (3) Get audio features of each track in each playlist
-        audio_features = [
-            sp.audio_features(tracks=track_uris_dict[playlist])
-            for playlist in track_uris_dict
-        ]
+        audio_features = await asyncio.gather(
+            *[
+                sp.audio_features(tracks=track_uris_dict[playlist])
+                for playlist in track_uris_dict
+            ],
+        )
 
         # (4) Average playlist averages to get average audio features for individual search
         audio_features = [
@@ -196,6 +234,8 @@ def generate_params(prompt, num_playlists, sp, popularity):
         # Add popularity given to parameter dictionary
         avg_audio_features["popularity"] = popularity
         print("Features averaged (series):\n", avg_audio_features, "\n")
+    except ServiceUnavailableError:
+        raise
     except Exception as e:
         logging.info("exception cause MOODIKA" + str(e.__cause__))
         logging.info("exception context MOODIKA" + str(e.__context__))
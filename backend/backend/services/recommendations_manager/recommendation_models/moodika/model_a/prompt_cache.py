@@ -0,0 +1,291 @@
+"""
+Semantic cache of the Moodika generation parameters.
+
+Prompts worded differently ("sad songs for a breakup", "breakup sad music")
+end up with nearly the same genres and averaged audio features, after
+dozens of Spotify calls. Prompts are embedded as hashed bags of stemmed
+words and character trigrams, and a prompt close enough to a recent one
+reuses its parameters; the recommendation itself still runs, so the
+tracks stay fresh.
+
+The most frequent prompts are also precomputed by a background job (see
+``backend.services.prompt_warmup``) and served from ``WarmPrompts``, so
+they are fast even right after a restart.
+"""
+import threading
+import time
+import zlib
+from collections import deque
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from backend.services.metrics import percentile, register_metrics
+from backend.services.recommendations_manager.recommendation_models.moodika.model_a.genre_lexicon import (
+    STOPWORDS,
+    tokenize,
+)
+from backend.settings import settings
+
+# Dimensions of the hashed prompt embeddings.
+EMBEDDING_DIM = 1024
+# Weight of the character trigrams relative to the whole words.
+TRIGRAM_WEIGHT = 0.3
+# Number of recent lookups kept to compute percentiles.
+TIMINGS_WINDOW = 500
+
+
+def _bucket(feature: str) -> int:
+    # crc32 is stable across processes, unlike hash().
+    return zlib.crc32(feature.encode()) % EMBEDDING_DIM
+
+
+def embed_prompt(prompt: str) -> Optional[np.ndarray]:
+    """
+    Embed a prompt for the similarity search.
+
+    Word order and filler words ("songs", "music", "for") are ignored, and
+    the trigrams keep inflections and typos of a word close to it.
+
+    :param prompt: free text of the user.
+    :return: unit vector, or None if the prompt has no meaningful word.
+    """
+    words = [token for token in tokenize(prompt) if token not in STOPWORDS]
+    if not words:
+        return None
+    vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    for word in words:
+        vector[_bucket(word)] += 1.0
+        padded = f"<{word}>"
+        for start in range(len(padded) - 2):
+            vector[_bucket(padded[start : start + 3])] += TRIGRAM_WEIGHT
+    return vector / np.linalg.norm(vector)
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    Reduce a prompt to its meaningful words, sorted.
+
+    "Workout  Music" and "music for a workout" are the same prompt.
+
+    :param prompt: free text of the user.
+    :return: normalized prompt, empty if it has no meaningful word.
+    """
+    return " ".join(
+        sorted({token for token in tokenize(prompt) if token not in STOPWORDS})
+    )
+
+
+@dataclass
+class CachedParams:
+    """Parameters generated for a prompt."""
+
+    prompt: str
+    # None if the genres came from the request config.
+    genres: Optional[List[str]]
+    params: dict
+    popularity: Optional[str]
+    # Time it took to generate them, saved by every hit.
+    cost: float
+    created_at: float
+    used_at: float
+
+
+class PromptCache:
+    """
+    Bounded index of the parameters of recent prompts.
+
+    The embeddings live in a single matrix, so a lookup is one
+    matrix-vector product. Entries expire after ``ttl`` seconds and the
+    least recently used one is evicted when the cache is full.
+    """
+
+    def __init__(self, size: int, threshold: float, ttl: float):
+        self.size = size
+        self.threshold = threshold
+        self.ttl = ttl
+        self.embeddings = np.zeros((size, EMBEDDING_DIM), dtype=np.float32)
+        self.entries: List[Optional[CachedParams]] = [None] * size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.saved_seconds = 0.0
+        self.lookups: Deque[float] = deque(maxlen=TIMINGS_WINDOW)
+        self.similarities: Deque[float] = deque(maxlen=TIMINGS_WINDOW)
+        self.generations: Deque[float] = deque(maxlen=TIMINGS_WINDOW)
+        self._lock = threading.Lock()
+
+    def _expired(self, entry: Optional[CachedParams], now: float) -> bool:
+        return entry is None or now - entry.created_at > self.ttl
+
+    def lookup(self, prompt: str, popularity: Optional[str]) -> Optional[CachedParams]:
+        """
+        Find the parameters of a similar prompt.
+
+        :param prompt: free text of the user.
+        :param popularity: popularity setting, which changes the parameters.
+        :return: cached parameters or None.
+        """
+        start = time.perf_counter()
+        vector = embed_prompt(prompt)
+        with self._lock:
+            found = None
+            similarity = 0.0
+            if vector is not None:
+                now = time.monotonic()
+                similarities = self.embeddings @ vector
+                for slot in np.argsort(similarities)[::-1]:
+                    similarity = float(similarities[slot])
+                    if similarity < self.threshold:
+                        break
+                    entry = self.entries[slot]
+                    if not self._expired(entry, now) and entry.popularity == popularity:
+                        entry.used_at = now
+                        found = entry
+                        break
+            if found is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.saved_seconds += found.cost
+                self.similarities.append(similarity)
+            self.lookups.append(time.perf_counter() - start)
+        return found
+
+    def store(
+        self,
+        prompt: str,
+        popularity: Optional[str],
+        genres: Optional[List[str]],
+        params: dict,
+        cost: float,
+    ) -> None:
+        """
+        Cache the parameters generated for a prompt.
+
+        :param prompt: free text of the user.
+        :param popularity: popularity setting they were generated with.
+        :param genres: predicted genres, None if they came from the config.
+        :param params: averaged audio features.
+        :param cost: seconds it took to generate them.
+        """
+        vector = embed_prompt(prompt)
+        if vector is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self.generations.append(cost)
+            free = [
+                slot
+                for slot, entry in enumerate(self.entries)
+                if self._expired(entry, now)
+            ]
+            if free:
+                slot = free[0]
+            else:
+                slot = min(range(self.size), key=lambda idx: self.entries[idx].used_at)
+                self.evictions += 1
+            self.embeddings[slot] = vector
+            self.entries[slot] = CachedParams(
+                prompt=prompt,
+                genres=genres,
+                params=params,
+                popularity=popularity,
+                cost=cost,
+                created_at=now,
+                used_at=now,
+            )
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            lookups = sorted(self.lookups)
+            generations = sorted(self.generations)
+            total = self.hits + self.misses
+            return {
+                "entries": sum(not self._expired(entry, now) for entry in self.entries),
+                "size": self.size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 3) if total else None,
+                "evictions": self.evictions,
+                "lookup_p50_ms": percentile([value * 1000 for value in lookups], 0.5),
+                "lookup_p95_ms": percentile([value * 1000 for value in lookups], 0.95),
+                # Time the cached parameters took to generate on a miss.
+                "generation_p50": percentile(generations, 0.5),
+                "saved_seconds": round(self.saved_seconds, 1),
+                "hit_similarity_p50": percentile(sorted(self.similarities), 0.5),
+            }
+
+
+class WarmPrompts:
+    """
+    Parameters precomputed for the most frequent prompts.
+
+    Lookups are exact on the normalized prompt, the set is replaced as a
+    whole when the precomputed prompts are reloaded.
+    """
+
+    def __init__(self) -> None:
+        self.entries: Dict[Tuple[str, Optional[int]], CachedParams] = {}
+        self.hits = 0
+        self.misses = 0
+        self.loaded_at: Optional[float] = None
+
+    def replace(self, entries: Iterable[CachedParams]) -> None:
+        # A new dict swapped in at once, so lookups never see a partial set.
+        self.entries = {
+            (normalize_prompt(entry.prompt), entry.popularity): entry
+            for entry in entries
+        }
+        self.loaded_at = time.monotonic()
+
+    def lookup(self, prompt: str, popularity: Optional[int]) -> Optional[CachedParams]:
+        """
+        Find the precomputed parameters of a prompt.
+
+        :param prompt: free text of the user.
+        :param popularity: popularity setting of the generation.
+        :return: precomputed parameters or None.
+        """
+        entry = self.entries.get((normalize_prompt(prompt), popularity))
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            entry.used_at = time.monotonic()
+        return entry
+
+    def snapshot(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 3) if total else None,
+            "loaded_seconds_ago": (
+                round(time.monotonic() - self.loaded_at) if self.loaded_at else None
+            ),
+        }
+
+
+@lru_cache(maxsize=1)
+def get_warm_prompts() -> WarmPrompts:
+    """Create the precomputed prompts of this process, empty until loaded."""
+    warm_prompts = WarmPrompts()
+    register_metrics("warm_prompts", warm_prompts.snapshot)
+    return warm_prompts
+
+
+@lru_cache(maxsize=1)
+def get_prompt_cache() -> PromptCache:
+    """Create the cache of this process from the settings."""
+    cache = PromptCache(
+        size=settings.prompt_cache_size,
+        threshold=settings.prompt_cache_similarity,
+        ttl=settings.prompt_cache_ttl,
+    )
+    register_metrics("prompt_cache", cache.snapshot)
+    return cache
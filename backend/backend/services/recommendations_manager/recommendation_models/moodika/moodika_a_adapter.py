@@ -1,53 +1,160 @@
+import asyncio
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 from loguru import logger
 
+from backend.services.recommendations_manager.pipeline import Pipeline
 from backend.services.recommendations_manager.recommendation_models.moodika.model_a.moodika import *
+from backend.services.recommendations_manager.recommendation_models.moodika.model_a.prompt_cache import (
+    get_prompt_cache,
+    get_warm_prompts,
+)
 from backend.services.recommendations_manager.recommendation_models.recommender_model import (
     RecommenderModel,
 )
+from backend.services.resilience import ServiceUnavailableError
+from backend.services.resources import get_resource_plan
+from backend.settings import settings
+
 
 class MoodikaAAdapter(RecommenderModel):
     def __init__(self, model_config: dict):
         super().__init__(model_config)
-        self.sp = None
+        self.inference_executor = None
 
-    def initialize(self, access_token: str):
+    def initialize(self):
         """
-        Initialize the MoodikaAAdapter by authorizing the Spotify API.
+        Initialize the MoodikaAAdapter by loading the genre similarity model,
+        so the first request doesn't pay for it, and starting the threads
+        the genre inference runs in.
+        """
+        get_similarity_model()
+        self.inference_executor = ThreadPoolExecutor(
+            max_workers=get_resource_plan().inference_workers,
+            thread_name_prefix="moodika-inference",
+        )
+        logger.info(f"{self.name} initialized.")
 
-        :param access_token: Spotify access token for authorization.
+    async def _genres(self, prompt: str, config: dict) -> list:
+        if json.loads(config.get("generate_genres")):
+            return config.get("genres")
+        # The cross-encoder is CPU bound, keep it off the event loop.
+        loop = asyncio.get_running_loop()
+        genres = await loop.run_in_executor(
+            self.inference_executor,
+            predict_genre,
+            prompt,
+        )
+        config["genres"] = genres
+        return genres
+
+    async def precompute(
+        self,
+        prompt: str,
+        popularity: int,
+        access_token: str,
+    ) -> tuple:
         """
-        try:
-            self.sp = authorize(access_token)
-            logger.info(f"{self.name} initialized and authorized with Spotify.")
-        except Exception as e:
-            logger.critical(f"Failed to authorize Spotify API: {e}")
-            raise
+        Generate the genres and parameters of a prompt ahead of any request.
 
-    def generate_playlist(self, prompt: str, config: dict, context: dict) -> dict:
+        :param prompt: prompt to warm up.
+        :param popularity: popularity setting of the generations.
+        :param access_token: Spotify access token, the application's one.
+        :return: predicted genres and averaged audio features.
+        """
+        sp = authorize(access_token)
+        genres, params = await asyncio.gather(
+            self._genres(prompt, {"generate_genres": "false"}),
+            generate_params(prompt, 20, sp, popularity),
+        )
+        return genres, params
+
+    async def generate_playlist(
+        self,
+        prompt: str,
+        config: dict,
+        context: dict,
+        access_token: str,
+    ) -> dict:
         """
         Generate a playlist based on the given prompt, configuration, and context.
 
+        The genre inference and the Spotify search of the parameters don't
+        depend on each other, so they run concurrently and only the
+        recommendation waits for both. Both are skipped for the popular
+        prompts precomputed in the background, and when a similar prompt
+        was generated recently (see ``prompt_cache``).
+
         :param prompt: The input prompt for generating the playlist.
         :param config: Configuration dictionary for generating the playlist.
         :param context: Context dictionary.
+        :param access_token: Spotify access token for authorization.
         :return: A dictionary containing the generated playlist details.
         """
         try:
             logger.info(f"Generating playlist with {self.name}...")
+            sp = authorize(access_token)
+            popularity = config.get("popularity")
+            cache = get_prompt_cache() if settings.prompt_cache_enabled else None
+            cached = None
+            if settings.prompt_warmup_enabled:
+                cached = get_warm_prompts().lookup(prompt, popularity)
+            if cached is None and cache is not None:
+                cached = cache.lookup(prompt, popularity)
+            if cached is not None:
+                logger.info(f"Reusing the parameters of the prompt '{cached.prompt}'")
+            params_cost = 0.0
 
-            if not json.loads(config.get("generate_genres")):
-                genre_text = predict_genre(prompt)
-                config["genres"] = genre_text
-            else:
-                genre_text = config.get("genres")
+            async def _genres():
+                if cached is not None and cached.genres is not None:
+                    if not json.loads(config.get("generate_genres")):
+                        config["genres"] = cached.genres
+                        return cached.genres
+                return await self._genres(prompt, config)
 
-            logger.info("\nGenres:" + str(genre_text))
-            params = generate_params(prompt, 20, self.sp, config.get("popularity"))
-            logger.info("\nParams:" + str(params))
-            tracks = recommend(params, genre_text, self.sp, config.get("num_songs"))
-            spotify_id = create_spotify_playlist(tracks, prompt, self.sp)
+            async def _params():
+                nonlocal params_cost
+                if cached is not None:
+                    return cached.params
+                start = time.perf_counter()
+                params = await generate_params(prompt, 20, sp, popularity)
+                params_cost = time.perf_counter() - start
+                return params
+
+            async def _tracks(genres, params):
+                logger.info("\nGenres:" + str(genres))
+                logger.info("\nParams:" + str(params))
+                return await recommend(
+                    params,
+                    genres,
+                    sp,
+                    config.get("num_songs"),
+                    model=self.name,
+                )
+
+            async def _playlist(tracks):
+                return await create_spotify_playlist(tracks, prompt, sp)
+
+            results = await (
+                Pipeline(self.name)
+                .stage("genres", _genres)
+                .stage("params", _params)
+                .stage("recommend", _tracks, "genres", "params")
+                .stage("create_playlist", _playlist, "recommend")
+                .run()
+            )
+            spotify_id = results["create_playlist"]
+            if cache is not None and cached is None and results["params"]:
+                predicted = not json.loads(config.get("generate_genres"))
+                cache.store(
+                    prompt,
+                    popularity,
+                    genres=results["genres"] if predicted else None,
+                    params=results["params"],
+                    cost=params_cost,
+                )
 
             response = {
                 "prompt": prompt,
@@ -57,21 +164,22 @@ class MoodikaAAdapter(RecommenderModel):
 
             return response
 
+        except ServiceUnavailableError:
+            raise
         except ValueError as e:
-            print("ValueError:", e)
-            logging.critical(e)
+            logger.critical(f"ValueError: {e}")
         except AttributeError as e:
-            print("AttributeError:", e)
-            logging.critical(e)
+            logger.critical(f"AttributeError: {e}")
         except TypeError as e:
-            print("TypeError:", e)
-            logging.critical(e)
+            logger.critical(f"TypeError: {e}")
         except Exception as e:
-            logging.critical(e)
+            logger.critical(e)
 
     def finalize(self):
         """
         Finalize the MoodikaAAdapter. Perform any necessary cleanup.
         """
-        self.sp = None
-        logging.info(f"{self.name} finalized and cleaned up.")
+        if self.inference_executor is not None:
+            self.inference_executor.shutdown(wait=False)
+        self.inference_executor = None
+        logger.info(f"{self.name} finalized and cleaned up.")
@@ -27,25 +27,36 @@ class RecommenderModel(ABC):
         }
 
     @abstractmethod
-    def generate_playlist(self, prompt, config, context):
+    def generate_playlist(self, prompt, config, context, access_token):
         """
         Generate a playlist based on the provided prompt, configuration, and context.
         This method should be implemented by subclasses.
 
+        Models are shared by concurrent requests, so anything specific to a request
+        (like the Spotify client of the user) must not be stored on the instance.
+        It may be a coroutine function, which is run on the event loop (the
+        built-in models are), or a blocking function, which is run in a thread.
+
         Args:
             prompt (str): The input prompt for generating recommendations.
             config (dict): Additional configuration for the recommendation.
             context (dict): Contextual information for generating recommendations.
+            access_token (str): Spotify access token of the user.
         """
 
     @abstractmethod
     def initialize(self):
         """
         Initialize the model. This method should be implemented by subclasses.
+
+        Called once when the model is loaded, to set up expensive resources
+        (ML models, API clients...) ahead of the first request.
         """
 
     @abstractmethod
     def finalize(self):
         """
         Finalize the model. This method should be implemented by subclasses for cleanup operations.
+
+        Called once when the application shuts down.
         """
@@ -1,56 +1,219 @@
-from typing import Dict, List
+import asyncio
+import importlib
+import sys
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
 
-from backend.services.recommendations_manager.recommendation_models.chatgpt.chatgpt_adapter import (
-    ChatGPTAdapter,
-)
-from backend.services.recommendations_manager.recommendation_models.moodika.moodika_a_adapter import (
-    MoodikaAAdapter,
+from loguru import logger
+
+from backend.services.metrics import register_metrics
+from backend.services.recommendations_manager.model_runtime import (
+    ModelRuntime,
+    ModelUnavailableError,
 )
 from backend.services.recommendations_manager.recommendation_models.recommender_model import (
     RecommenderModel,
 )
+from backend.services.recommendations_manager.registry import ModelSpec, discover_models
+from backend.services.resilience import CircuitState
+from backend.settings import settings
 
 
 class RecommenderManager:
-    def __init__(self):
-        self.models: Dict[str, RecommenderModel] = {
-            "Moodika-Model-A": MoodikaAAdapter(
-                {
-                    "name": "Moodika-Model-A",
-                    "description": "A playlist-based model that averages results from user-created Spotify playlists to provide recommendations. It leverages the collective input from existing playlists to generate a song profile.",
-                    "version": "1.0",
-                },
-            ),
-            "ChatGPT": ChatGPTAdapter(
-                {
-                    "name": "ChatGPT",
-                    "description": "Utilizes ChatGPT to derive Spotify parameters for generating recommendations, offering a conversational interface for personalized music suggestions.",
-                    "version": "3.0",
-                },
-            ),
+    """
+    Registry of recommendation models.
+
+    Models are registered by name and their adapters are only imported
+    and instantiated the first time they are used (or when warmed up).
+    Each model runs with its own concurrency limit, timeout and
+    circuit breaker (see ModelRuntime).
+    """
+
+    def __init__(self, specs: Iterable[ModelSpec]):
+        self.specs: Dict[str, ModelSpec] = {spec.name: spec for spec in specs}
+        self.runtimes: Dict[str, ModelRuntime] = {
+            name: ModelRuntime(spec) for name, spec in self.specs.items()
         }
+        self.models: Dict[str, RecommenderModel] = {}
+        # Incremented when a model is added, so cached catalogs are rebuilt.
+        self.version = 0
+        # Seconds spent importing and initializing each model, for startup reports.
+        self.load_costs: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def add_model(self, model: RecommenderModel, spec: Optional[ModelSpec] = None):
+        if spec is None:
+            spec = ModelSpec(
+                name=model.name,
+                description=model.description,
+                version=model.version,
+                adapter=f"{type(model).__module__}:{type(model).__qualname__}",
+            )
+        self.specs[spec.name] = spec
+        self.runtimes[spec.name] = ModelRuntime(spec)
+        self.models[spec.name] = model
+        self.version += 1
+
+    def get_model_specs(self) -> List[ModelSpec]:
+        return list(self.specs.values())
+
+    def get_model_spec(self, name: str) -> Optional[ModelSpec]:
+        return self.specs.get(name)
+
+    def get_model_stats(self, name: str) -> dict:
+        """
+        Get the health and latency stats of a model.
+
+        :param name: name of the model.
+        :return: dictionary with the model stats.
+        """
+        return {"loaded": name in self.models, **self.runtimes[name].snapshot()}
+
+    def get_all_model_stats(self) -> Dict[str, dict]:
+        return {name: self.get_model_stats(name) for name in self.specs}
+
+    def get_model_by_name(self, name: str) -> Optional[RecommenderModel]:
+        """
+        Get a model, importing and instantiating its adapter on first use.
+
+        :param name: name of the model.
+        :raises ModelUnavailableError: if the adapter can't be loaded.
+        :return: the model or None if no model is registered with that name.
+        """
+        model = self.models.get(name)
+        if model is not None:
+            return model
+        spec = self.specs.get(name)
+        if spec is None:
+            return None
+        with self._lock:
+            # Another thread may have loaded it while we were waiting.
+            if name not in self.models:
+                self.models[name] = self._load(spec)
+        return self.models[name]
+
+    def _load(self, spec: ModelSpec) -> RecommenderModel:
+        runtime = self.runtimes[spec.name]
+        modules_before = set(sys.modules)
+        try:
+            module_path, class_name = spec.adapter.split(":")
 
-    def add_model(self, model: RecommenderModel):
-        self.models[model.name] = model
+            start = time.perf_counter()
+            module = importlib.import_module(module_path)
+            import_time = time.perf_counter() - start
 
-    def get_all_models(self) -> List[RecommenderModel]:
-        return list(self.models.values())
+            model = getattr(module, class_name)(spec.get_model_info())
 
-    def get_model_by_name(self, name: str) -> RecommenderModel:
-        return self.models.get(name)
+            start = time.perf_counter()
+            model.initialize()
+            init_time = time.perf_counter() - start
+        except Exception as e:
+            # Only this model becomes unavailable, the others keep working.
+            runtime.load_error = str(e)
+            runtime.breaker.record_failure()
+            logger.error(f"Failed to load model {spec.name}: {e}")
+            raise ModelUnavailableError(
+                f"Model {spec.name} is not available",
+                retry_after=spec.recovery_timeout,
+            ) from e
 
-    def generate_playlist(
+        runtime.load_error = None
+        self.load_costs[spec.name] = {
+            "import_seconds": import_time,
+            "initialize_seconds": init_time,
+            "imported_modules": len(set(sys.modules) - modules_before),
+        }
+        logger.info(
+            f"Loaded model {spec.name}: import {import_time:.2f}s, "
+            f"initialize {init_time:.2f}s",
+        )
+        return model
+
+    async def load_model(self, name: str) -> Optional[RecommenderModel]:
+        """
+        Get a model, loading it in a thread so the event loop is never blocked.
+
+        :param name: name of the model.
+        :return: the model or None if no model is registered with that name.
+        """
+        model = self.models.get(name)
+        if model is not None:
+            return model
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.get_model_by_name, name)
+
+    async def warmup(self, names: Optional[Iterable[str]] = None) -> None:
+        """
+        Preload models in the background.
+
+        Failures are logged and the model is simply loaded again on first use.
+
+        :param names: models to preload, all registered models by default.
+        """
+        start = time.perf_counter()
+        for name in list(names or self.specs):
+            try:
+                await self.load_model(name)
+            except ModelUnavailableError:
+                pass  # noqa: WPS420
+        logger.info(
+            f"Models warmed up in {time.perf_counter() - start:.2f}s. "
+            f"Load costs: {self.load_costs}",
+        )
+
+    async def generate_playlist(
         self,
         prompt: str,
         config: dict,
         context: dict,
         access_token: str,
     ) -> dict:
-        model = self.get_model_by_name(config.get("model"))
-        if not model:
-            requested_model = config.get("model")
+        """
+        Generate a playlist with the model requested in the config.
+
+        :param prompt: The input prompt for generating the playlist.
+        :param config: Configuration of the generation, including the model name.
+        :param context: Context of the generation.
+        :param access_token: Spotify access token of the user.
+        :raises ValueError: if the model doesn't exist.
+        :raises ModelUnavailableError: if the model can't take the generation.
+        :return: the generated playlist.
+        """
+        requested_model = config.get("model")
+        runtime = self.runtimes.get(requested_model)
+        if runtime is None:
             raise ValueError(f"Model {requested_model} not found")
-        model.initialize(access_token=access_token)
-        response = model.generate_playlist(prompt, config, context)
-        model.finalize()
-        return response
+        if (
+            requested_model not in self.models
+            and runtime.breaker.state == CircuitState.OPEN
+        ):
+            # Don't retry loading a broken adapter on every request.
+            raise ModelUnavailableError(
+                f"Model {requested_model} is not available",
+                retry_after=runtime.breaker.snapshot()["retry_after"],
+            )
+        model = await self.load_model(requested_model)
+        return await runtime.run(
+            model.generate_playlist,
+            prompt,
+            config,
+            context,
+            access_token,
+        )
+
+    def shutdown(self) -> None:
+        """Finalize the loaded models and stop their threads."""
+        for name, model in self.models.items():
+            try:
+                model.finalize()
+            except Exception as e:
+                logger.error(f"Failed to finalize model {name}: {e}")
+        for runtime in self.runtimes.values():
+            runtime.shutdown()
+
+
+recommender_manager = RecommenderManager(
+    discover_models(settings.recommender_models).values()
+)
+register_metrics("models", recommender_manager.get_all_model_stats)
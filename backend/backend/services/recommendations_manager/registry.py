@@ -0,0 +1,131 @@
+import dataclasses
+from dataclasses import dataclass
+from importlib.metadata import entry_points
+from typing import Any, Dict, Iterable, List
+
+from loguru import logger
+
+# Entry point group plugins use to declare recommendation models.
+# Each entry point must resolve to a ModelSpec, e.g. in pyproject.toml:
+#
+#   [tool.poetry.plugins."backend.recommender_models"]
+#   "My-Model" = "my_package.specs:MY_MODEL"
+ENTRY_POINT_GROUP = "backend.recommender_models"
+
+
+@dataclass(frozen=True)
+class ModelSpec:
+    """
+    Declaration of a recommendation model and its resource limits.
+
+    The adapter is referenced by its import path ("package.module:ClassName"),
+    so listing the available models never imports the heavy dependencies
+    (torch, sentence-transformers, pandas, openai...) an adapter relies on.
+    """
+
+    name: str
+    description: str
+    version: str
+    adapter: str
+    # Generations of this model allowed to run at the same time.
+    max_concurrency: int = 4
+    # Seconds a request may wait for a free slot before being rejected.
+    queue_timeout: float = 5.0
+    # Seconds a single generation may take.
+    timeout: float = 120.0
+    # Consecutive failures that open the model's circuit breaker.
+    failure_threshold: int = 5
+    # Seconds the circuit stays open before trying the model again.
+    recovery_timeout: float = 30.0
+
+    def get_model_info(self) -> dict:
+        """
+        Get information about the model without loading it.
+
+        :return: dictionary containing model name, description, and version.
+        """
+        return {
+            "name": self.name,
+            "description": self.description,
+            "version": self.version,
+        }
+
+
+MOODIKA_MODEL_A = ModelSpec(
+    name="Moodika-Model-A",
+    description="A playlist-based model that averages results from user-created Spotify playlists to provide recommendations. It leverages the collective input from existing playlists to generate a song profile.",
+    version="1.0",
+    adapter="backend.services.recommendations_manager.recommendation_models.moodika.moodika_a_adapter:MoodikaAAdapter",
+    # Generations mostly wait on Spotify without holding a thread.
+    max_concurrency=64,
+)
+
+CHATGPT = ModelSpec(
+    name="ChatGPT",
+    description="Utilizes ChatGPT to derive Spotify parameters for generating recommendations, offering a conversational interface for personalized music suggestions.",
+    version="3.0",
+    adapter="backend.services.recommendations_manager.recommendation_models.chatgpt.chatgpt_adapter:ChatGPTAdapter",
+    # Generations mostly wait on OpenAI and Spotify without holding a thread.
+    max_concurrency=64,
+)
+
+# Built-in models, available even when the package metadata isn't installed.
+DEFAULT_MODELS = (MOODIKA_MODEL_A, CHATGPT)
+
+
+def _entry_point_specs() -> List[ModelSpec]:
+    eps: Any = entry_points()
+    if hasattr(eps, "select"):
+        group = eps.select(group=ENTRY_POINT_GROUP)
+    else:  # Python < 3.10
+        group = eps.get(ENTRY_POINT_GROUP, [])
+
+    specs = []
+    for entry_point in group:
+        try:
+            spec = entry_point.load()
+        except Exception as e:
+            logger.error(f"Failed to load model plugin {entry_point.name}: {e}")
+            continue
+        if not isinstance(spec, ModelSpec):
+            logger.error(
+                f"Model plugin {entry_point.name} doesn't resolve to a ModelSpec",
+            )
+            continue
+        specs.append(spec)
+    return specs
+
+
+def discover_models(
+    overrides: Dict[str, Dict[str, Any]],
+    defaults: Iterable[ModelSpec] = DEFAULT_MODELS,
+) -> Dict[str, ModelSpec]:
+    """
+    Collect the model declarations.
+
+    Built-in models come first, then models declared through entry points
+    and finally the configuration, which may tune the limits of any model,
+    declare new ones (by giving all ModelSpec fields) or disable one
+    (with ``{"enabled": false}``).
+
+    :param overrides: per-model configuration, keyed by model name.
+    :param defaults: built-in models.
+    :return: model declarations keyed by name.
+    """
+    specs = {spec.name: spec for spec in defaults}
+    for spec in _entry_point_specs():
+        specs[spec.name] = spec
+
+    for name, options in overrides.items():
+        options = dict(options)
+        if not options.pop("enabled", True):
+            specs.pop(name, None)
+            continue
+        try:
+            if name in specs:
+                specs[name] = dataclasses.replace(specs[name], **options)
+            else:
+                specs[name] = ModelSpec(name=name, **options)
+        except TypeError as e:
+            logger.error(f"Invalid configuration for model {name}: {e}")
+    return specs
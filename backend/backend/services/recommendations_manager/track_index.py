@@ -0,0 +1,253 @@
+"""
+Local nearest-neighbour index of track audio features.
+
+Tracks are stored as normalized audio-feature vectors with the genres they
+were recommended for, and queried by target features and genres, so
+playlists can be recommended without Spotify's recommendations endpoint.
+
+The index is a dense matrix searched with vectorized distances: with a
+dozen dimensions and up to a few hundred thousand tracks, a brute-force
+pass is a few milliseconds and, unlike a ball tree, takes new tracks
+without rebuilding anything.
+"""
+import os
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence
+
+import numpy as np
+from loguru import logger
+
+from backend.services.metrics import register_metrics
+from backend.settings import settings
+
+# Audio features indexed, with the range they are scaled from to [0, 1].
+FEATURE_RANGES: Dict[str, tuple] = {
+    "acousticness": (0.0, 1.0),
+    "danceability": (0.0, 1.0),
+    "energy": (0.0, 1.0),
+    "instrumentalness": (0.0, 1.0),
+    "liveness": (0.0, 1.0),
+    "loudness": (-60.0, 0.0),
+    "speechiness": (0.0, 1.0),
+    "tempo": (0.0, 250.0),
+    "valence": (0.0, 1.0),
+}
+FEATURES = tuple(FEATURE_RANGES)
+_LOW = np.array([FEATURE_RANGES[name][0] for name in FEATURES], dtype=np.float32)
+_SPAN = np.array(
+    [FEATURE_RANGES[name][1] - FEATURE_RANGES[name][0] for name in FEATURES],
+    dtype=np.float32,
+)
+INITIAL_CAPACITY = 1024
+INITIAL_GENRES = 128
+
+
+def _target_vector(targets: Mapping[str, object]) -> tuple:
+    """
+    Scale the target features of a recommendation request.
+
+    Accepts the parameters of both models, with or without the
+    ``target_`` prefix of the Spotify API.
+
+    :return: scaled targets and the mask of the features given.
+    """
+    vector = np.zeros(len(FEATURES), dtype=np.float32)
+    mask = np.zeros(len(FEATURES), dtype=bool)
+    for column, name in enumerate(FEATURES):
+        value = targets.get(f"target_{name}", targets.get(name))
+        if isinstance(value, (int, float)):
+            vector[column] = value
+            mask[column] = True
+    return np.clip((vector - _LOW) / _SPAN, 0, 1), mask
+
+
+class TrackIndex:
+    """
+    Audio features and genre tags of the tracks seen so far.
+
+    Rows grow by doubling the arrays, and a track seen again only gains the
+    new genres. Safe to use from several threads.
+    """
+
+    def __init__(self) -> None:
+        self.vectors = np.zeros((INITIAL_CAPACITY, len(FEATURES)), dtype=np.float32)
+        self.tags = np.zeros((INITIAL_CAPACITY, INITIAL_GENRES), dtype=bool)
+        self.uris: List[str] = []
+        self.rows: Dict[str, int] = {}
+        self.genres: Dict[str, int] = {}
+        self.queries = 0
+        self.short_queries = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.uris)
+
+    def _genre_column(self, genre: str) -> int:
+        column = self.genres.get(genre)
+        if column is None:
+            column = self.genres[genre] = len(self.genres)
+            if column >= self.tags.shape[1]:
+                tags = np.zeros(
+                    (self.tags.shape[0], self.tags.shape[1] * 2), dtype=bool
+                )
+                tags[:, : self.tags.shape[1]] = self.tags
+                self.tags = tags
+        return column
+
+    def _grow(self) -> None:
+        capacity = self.vectors.shape[0] * 2
+        vectors = np.zeros((capacity, len(FEATURES)), dtype=np.float32)
+        vectors[: len(self)] = self.vectors[: len(self)]
+        tags = np.zeros((capacity, self.tags.shape[1]), dtype=bool)
+        tags[: len(self)] = self.tags[: len(self)]
+        self.vectors, self.tags = vectors, tags
+
+    def add(
+        self, tracks: Iterable[Optional[Mapping]], genres: Sequence[str] = ()
+    ) -> int:
+        """
+        Add tracks from their Spotify audio features.
+
+        :param tracks: audio features objects, None entries are skipped.
+        :param genres: genres to tag the tracks with.
+        :return: number of new tracks.
+        """
+        added = 0
+        with self._lock:
+            columns = [self._genre_column(genre) for genre in genres]
+            for track in tracks:
+                if not track or not track.get("uri"):
+                    continue
+                row = self.rows.get(track["uri"])
+                if row is None:
+                    if any(track.get(name) is None for name in FEATURES):
+                        continue
+                    if len(self) == self.vectors.shape[0]:
+                        self._grow()
+                    row = self.rows[track["uri"]] = len(self)
+                    self.uris.append(track["uri"])
+                    raw = np.array([track[name] for name in FEATURES], dtype=np.float32)
+                    self.vectors[row] = np.clip((raw - _LOW) / _SPAN, 0, 1)
+                    added += 1
+                self.tags[row, columns] = True
+        return added
+
+    def query(
+        self, targets: Mapping[str, object], genres: Sequence[str], k: int
+    ) -> List[str]:
+        """
+        Find the tracks closest to target features.
+
+        :param targets: target audio features, like the recommendation parameters.
+        :param genres: only tracks tagged with one of them, all tracks if empty.
+        :param k: number of tracks.
+        :return: uris of up to k tracks, closest first.
+        """
+        vector, mask = _target_vector(targets)
+        with self._lock:
+            self.queries += 1
+            count = len(self)
+            candidates = np.arange(count)
+            if genres:
+                columns = [
+                    self.genres[genre] for genre in genres if genre in self.genres
+                ]
+                if not columns:
+                    self.short_queries += 1
+                    return []
+                candidates = candidates[self.tags[:count, columns].any(axis=1)]
+            distances = ((self.vectors[candidates][:, mask] - vector[mask]) ** 2).sum(
+                axis=1
+            )
+            if len(candidates) > k:
+                nearest = np.argpartition(distances, k)[:k]
+            else:
+                nearest = np.arange(len(candidates))
+            nearest = nearest[np.argsort(distances[nearest], kind="stable")]
+            if len(nearest) < k:
+                self.short_queries += 1
+            return [self.uris[candidates[idx]] for idx in nearest]
+
+    def save(self, path: Path) -> None:
+        """
+        Write the index atomically, so readers never see a partial file.
+
+        :param path: npz file.
+        """
+        with self._lock:
+            count = len(self)
+            genres = sorted(self.genres, key=self.genres.get)
+            arrays = {
+                "vectors": self.vectors[:count],
+                "tags": self.tags[:count, : len(genres)],
+                "uris": np.array(self.uris, dtype=str),
+                "genres": np.array(genres, dtype=str),
+                "features": np.array(FEATURES, dtype=str),
+            }
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as tmp_file:
+            np.savez_compressed(tmp_file, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "TrackIndex":
+        """
+        Read an index written by ``save``, or start an empty one.
+
+        :param path: npz file.
+        :return: the index.
+        """
+        index = cls()
+        if not path.exists():
+            return index
+        try:
+            with np.load(path) as data:
+                if tuple(data["features"]) != FEATURES:
+                    logger.warning(f"Track index {path} has other features, ignored")
+                    return index
+                genres = list(data["genres"])
+                uris = list(data["uris"])
+                tags = data["tags"]
+                vectors = data["vectors"]
+        except (OSError, KeyError, ValueError) as e:
+            logger.warning(f"Can't load the track index {path}: {e}")
+            return index
+        for genre in genres:
+            index._genre_column(str(genre))
+        while index.vectors.shape[0] < len(uris):
+            index._grow()
+        index.vectors[: len(uris)] = vectors
+        index.tags[: len(uris), : len(genres)] = tags
+        index.uris = [str(uri) for uri in uris]
+        index.rows = {uri: row for row, uri in enumerate(index.uris)}
+        logger.info(f"Loaded {len(index)} tracks from {path}")
+        return index
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "tracks": len(self),
+                "genres": len(self.genres),
+                "queries": self.queries,
+                # Queries that couldn't fill the requested number of tracks.
+                "short_queries": self.short_queries,
+            }
+
+
+@lru_cache(maxsize=1)
+def get_track_index() -> TrackIndex:
+    """Load the index of this process from the settings."""
+    index = TrackIndex.load(settings.track_index_path)
+    register_metrics("track_index", index.snapshot)
+    return index
+
+
+def save_track_index() -> None:
+    """Persist the index, if it was used."""
+    if get_track_index.cache_info().currsize:
+        index = get_track_index()
+        index.save(settings.track_index_path)
+        logger.info(f"Saved {len(index)} tracks to {settings.track_index_path}")
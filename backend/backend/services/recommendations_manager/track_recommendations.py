@@ -0,0 +1,278 @@
+"""
+Recommend stage shared by the models.
+
+Picks the tracks of a playlist from target audio features and seed genres,
+with Spotify's recommendations endpoint or the local track index, as set
+by ``settings.recommendation_engine``.
+
+Spotify returns at most 100 tracks for at most 5 seed genres per call, so
+larger requests are split into concurrent calls over subsets of the
+genres and slightly jittered targets, merged into one ranking.
+"""
+import asyncio
+import math
+from typing import Dict, List, Sequence, Set, Tuple
+
+from loguru import logger
+
+from backend.services.recommendations_manager.recommendation_cache import (
+    get_recommendation_cache,
+)
+from backend.services.recommendations_manager.track_index import (
+    FEATURE_RANGES,
+    get_track_index,
+)
+from backend.services.resilience import ServiceUnavailableError
+from backend.services.spotify_manager.spotify_client import (
+    BACKGROUND,
+    AsyncSpotify,
+    spotify_lane,
+)
+from backend.services.taste_profile import blend_params
+from backend.settings import RecommendationEngine, settings
+
+# Limits of one call to Spotify's recommendations endpoint.
+MAX_SEED_GENRES = 5
+MAX_RECOMMENDATIONS = 100
+
+# Tasks indexing the tracks of recent recommendations, kept referenced.
+_learning_tasks: Set["asyncio.Future[None]"] = set()
+
+
+async def _learn_tracks(
+    sp: AsyncSpotify, track_uris: List[str], genres: Sequence[str]
+) -> None:
+    try:
+        with spotify_lane(BACKGROUND):
+            features = await sp.audio_features(tracks=track_uris)
+    except Exception as e:
+        logger.debug(f"Tracks not indexed: {e}")
+        return
+    get_track_index().add(features, genres)
+
+
+def _learn_in_background(
+    sp: AsyncSpotify, track_uris: List[str], genres: Sequence[str]
+) -> None:
+    """Add recommended tracks to the local index without delaying the playlist."""
+    if not settings.track_index_learn or not track_uris:
+        return
+    task = asyncio.ensure_future(_learn_tracks(sp, track_uris, list(genres)))
+    _learning_tasks.add(task)
+    task.add_done_callback(_learning_tasks.discard)
+
+
+async def _spotify_recommend(
+    sp: AsyncSpotify,
+    param_dict: dict,
+    genre_list: Sequence[str],
+    limit: int,
+    model: str,
+) -> List[str]:
+    cache = (
+        get_recommendation_cache() if settings.recommendation_cache_enabled else None
+    )
+    fetch = limit
+    if cache is not None:
+        key = cache.key(param_dict, genre_list)
+        cached = cache.get(key, limit, model)
+        if cached is not None:
+            return cached
+        # A full page, so requests for fewer tracks are served from it.
+        fetch = max(limit, settings.recommendation_cache_candidates)
+
+    result = await sp.recommendations(seed_genres=genre_list, limit=fetch, **param_dict)
+    if not result or not result.get("tracks"):
+        return []
+    track_uris = [track["uri"] for track in result["tracks"]]
+    _learn_in_background(sp, track_uris, genre_list)
+    if cache is not None:
+        cache.put(key, track_uris)
+    return track_uris[:limit]
+
+
+def _jitter_params(param_dict: dict, variant: int) -> dict:
+    """
+    Shift the numeric targets of a call, so calls over the same genres
+    return different tracks.
+
+    Variant 0 keeps the targets. The next ones move each feature by
+    ``recommendation_fanout_jitter`` of its range, alternately up and down,
+    further for every pair of variants. Only ``target_`` attributes move,
+    the bare names of Moodika are renamed by ``spotify_params`` first. Variants are deterministic, so
+    they are cached like any other request.
+    """
+    if not variant:
+        return param_dict
+    step = settings.recommendation_fanout_jitter * ((variant + 1) // 2)
+    sign = 1 if variant % 2 else -1
+    jittered = dict(param_dict)
+    for column, (feature, (low, high)) in enumerate(FEATURE_RANGES.items()):
+        name = f"target_{feature}"
+        value = param_dict.get(name)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            # Neighbouring features move in opposite directions.
+            offset = sign * (-1) ** column * step * (high - low)
+            jittered[name] = round(min(max(value + offset, low), high), 4)
+    return jittered
+
+
+def spotify_params(param_dict: dict) -> dict:
+    """
+    Name the audio features of a model the way Spotify expects them.
+
+    Moodika gives bare feature names, which the client doesn't send, so
+    they are renamed to their ``target_`` attribute unless it's already
+    given. Other parameters are kept as is.
+    """
+    params = dict(param_dict)
+    for feature in FEATURE_RANGES:
+        if feature in params:
+            value = params.pop(feature)
+            params.setdefault(f"target_{feature}", value)
+    return params
+
+
+def plan_recommendation_calls(
+    param_dict: dict,
+    genre_list: Sequence[str],
+    limit: int,
+) -> List[Tuple[dict, List[str], int]]:
+    """
+    Split a recommendation request into calls Spotify accepts.
+
+    The genres are split into groups of at most 5, in order, so the best
+    predicted genres stay together. Groups are then repeated with jittered
+    targets until the calls can return ``recommendation_fanout_overfetch``
+    times the tracks wanted, since the calls return some common tracks.
+
+    :param param_dict: target audio features.
+    :param genre_list: seed genres.
+    :param limit: number of tracks wanted.
+    :return: parameters, seed genres and limit of every call.
+    """
+    genres = list(genre_list)
+    groups = [
+        genres[start : start + MAX_SEED_GENRES]
+        for start in range(0, len(genres), MAX_SEED_GENRES)
+    ] or [[]]
+    if len(groups) == 1 and limit <= MAX_RECOMMENDATIONS:
+        return [(param_dict, groups[0], limit)]
+
+    wanted = math.ceil(
+        limit * settings.recommendation_fanout_overfetch / MAX_RECOMMENDATIONS
+    )
+    calls = min(max(len(groups), wanted), settings.recommendation_fanout_max_calls)
+    return [
+        (
+            _jitter_params(param_dict, call // len(groups)),
+            groups[call % len(groups)],
+            MAX_RECOMMENDATIONS,
+        )
+        for call in range(calls)
+    ]
+
+
+def merge_recommendations(results: Sequence[List[str]], limit: int) -> List[str]:
+    """
+    Merge the tracks of several calls, without duplicates.
+
+    Tracks are taken by rank, the first of every call, then the second of
+    every call, and so on, so every genre group gets its share of the
+    playlist and the order doesn't depend on which call finished first.
+
+    :param results: tracks of each call, in the planned order.
+    :param limit: number of tracks wanted.
+    :return: up to limit tracks.
+    """
+    merged: Dict[str, None] = {}
+    for rank in range(max((len(tracks) for tracks in results), default=0)):
+        for tracks in results:
+            if rank < len(tracks):
+                merged.setdefault(tracks[rank])
+    return list(merged)[:limit]
+
+
+async def _spotify_fanout(
+    sp: AsyncSpotify,
+    param_dict: dict,
+    genre_list: Sequence[str],
+    limit: int,
+    model: str,
+) -> List[str]:
+    calls = plan_recommendation_calls(spotify_params(param_dict), genre_list, limit)
+    if len(calls) == 1:
+        params, genres, call_limit = calls[0]
+        return await _spotify_recommend(sp, params, genres, call_limit, model)
+
+    results = await asyncio.gather(
+        *[
+            _spotify_recommend(sp, params, genres, call_limit, model)
+            for params, genres, call_limit in calls
+        ],
+        return_exceptions=True,
+    )
+    failures = [result for result in results if isinstance(result, BaseException)]
+    succeeded = [result for result in results if not isinstance(result, BaseException)]
+    if not succeeded:
+        raise failures[0]
+    if failures:
+        logger.warning(
+            f"{len(failures)}/{len(calls)} recommendation calls failed: {failures[0]}"
+        )
+    track_uris = merge_recommendations(succeeded, limit)
+    logger.info(
+        f"Merged {len(track_uris)} tracks from {len(succeeded)} recommendation calls"
+    )
+    return track_uris
+
+
+def _local_recommend(
+    param_dict: dict, genre_list: Sequence[str], limit: int
+) -> List[str]:
+    return get_track_index().query(param_dict, genre_list, limit)
+
+
+async def recommend_tracks(
+    sp: AsyncSpotify,
+    param_dict: dict,
+    genre_list: Sequence[str],
+    limit: int,
+    model: str = "default",
+) -> List[str]:
+    """
+    Recommend tracks for target audio features and genres.
+
+    With the Spotify engine, the local index answers when Spotify is
+    unavailable. With the local engine, Spotify is only called when the
+    index can't fill the playlist. The targets are blended with the
+    user's taste profile when the generation asked for it (see
+    ``taste_profile.taste_blend``).
+
+    :param sp: Spotify client of the user.
+    :param param_dict: target audio features.
+    :param genre_list: seed genres.
+    :param limit: number of tracks.
+    :param model: name of the model asking, for the cache metrics.
+    :raises Exception: if no engine returned any track.
+    :return: track uris.
+    """
+    param_dict = blend_params(param_dict)
+    if settings.recommendation_engine == RecommendationEngine.LOCAL:
+        track_uris = _local_recommend(param_dict, genre_list, limit)
+        if len(track_uris) < limit:
+            track_uris = await _spotify_fanout(sp, param_dict, genre_list, limit, model)
+    else:
+        try:
+            track_uris = await _spotify_fanout(sp, param_dict, genre_list, limit, model)
+        except ServiceUnavailableError:
+            track_uris = _local_recommend(param_dict, genre_list, limit)
+            if len(track_uris) < limit:
+                raise
+            logger.warning(
+                "Spotify unavailable, tracks recommended from the local index"
+            )
+    if not track_uris:
+        logger.warning(f"Nothing was returned from Spotify for url {param_dict}.")
+        raise Exception("Nothing returned from Spotify.")
+    return track_uris
@@ -0,0 +1,32 @@
+"""Fault isolation helpers for calls to external services and models."""
+from backend.services.resilience.admission import AdmissionController
+from backend.services.resilience.circuit_breaker import (
+    CircuitBreaker,
+    CircuitOpenError,
+    CircuitState,
+)
+from backend.services.resilience.errors import (
+    ServiceUnavailableError,
+    TooManyRequestsError,
+)
+from backend.services.resilience.guard import Failure, ServiceGuard, parse_retry_after
+from backend.services.resilience.rate_limit import (
+    RateLimitedError,
+    RateLimiter,
+    make_bucket_store,
+)
+
+__all__ = [
+    "AdmissionController",
+    "CircuitBreaker",
+    "CircuitOpenError",
+    "CircuitState",
+    "Failure",
+    "RateLimitedError",
+    "RateLimiter",
+    "ServiceGuard",
+    "ServiceUnavailableError",
+    "TooManyRequestsError",
+    "make_bucket_store",
+    "parse_retry_after",
+]
@@ -0,0 +1,205 @@
+import asyncio
+import time
+from collections import Counter, OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from loguru import logger
+
+from backend.services.metrics import percentile
+from backend.services.resilience.errors import TooManyRequestsError
+
+# Number of recent run durations kept to estimate Retry-After.
+DURATION_WINDOW = 200
+# Retry-After of the concurrency rejections before any run finished.
+DEFAULT_RETRY_AFTER = 5.0
+
+
+class AdmissionController:
+    """
+    Decides which expensive requests start, per client and overall.
+
+    A request is rejected with ``TooManyRequestsError`` when ``max_in_flight``
+    requests already run, when its client already runs
+    ``client_max_in_flight`` of them, or when the client's token bucket
+    (``client_rate`` requests per second, bursts of ``client_burst``) is
+    empty. Requests carrying the idempotency key of one still running
+    attach to it instead, whatever the limits.
+
+    Runs are shielded from the cancellation of their request: a client
+    retrying after a dropped connection finds its run still going.
+    The state is per process.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_in_flight: int,
+        client_max_in_flight: int,
+        client_rate: float,
+        client_burst: int,
+        retention: float = 0.0,
+        max_clients: int = 10000,
+    ):
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.client_max_in_flight = client_max_in_flight
+        self.client_rate = client_rate
+        self.client_burst = client_burst
+        self.retention = retention
+        self.max_clients = max_clients
+        self.in_flight = 0
+        self.client_in_flight: Counter = Counter()
+        # Token bucket of each client, (tokens, updated_at), least recent first.
+        self.buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self.runs: Dict[Tuple[str, str], "asyncio.Future[Any]"] = {}
+        # Results of the finished runs, (result, expires_at), oldest first.
+        self.results: "OrderedDict[Tuple[str, str], Tuple[Any, float]]" = OrderedDict()
+        self.admitted = 0
+        self.attached = 0
+        self.replayed = 0
+        self.rejected: Counter = Counter()
+        self.durations: Deque[float] = deque(maxlen=DURATION_WINDOW)
+
+    def _retry_after(self) -> float:
+        return percentile(sorted(self.durations), 0.5) or DEFAULT_RETRY_AFTER
+
+    def _reject(self, reason: str, message: str, retry_after: float) -> None:
+        self.rejected[reason] += 1
+        raise TooManyRequestsError(message, retry_after=retry_after)
+
+    def _take_token(self, client: str) -> float:
+        """
+        Take a token from the bucket of a client.
+
+        :return: 0 if a token was taken, else the seconds until one is free.
+        """
+        now = time.monotonic()
+        tokens, updated_at = self.buckets.pop(client, (float(self.client_burst), now))
+        tokens = min(
+            float(self.client_burst), tokens + (now - updated_at) * self.client_rate
+        )
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / self.client_rate
+        self.buckets[client] = (tokens, now)
+        # Forgetting a client only refills its bucket early.
+        while len(self.buckets) > self.max_clients:
+            self.buckets.popitem(last=False)
+        return wait
+
+    def _admit(self, client: str) -> None:
+        if self.in_flight >= self.max_in_flight:
+            self._reject(
+                "in_flight",
+                f"Too many {self.name} requests in progress, try again later",
+                self._retry_after(),
+            )
+        if self.client_in_flight[client] >= self.client_max_in_flight:
+            self._reject(
+                "client_in_flight",
+                f"You already have {self.client_in_flight[client]} {self.name} "
+                "requests in progress, wait for them to finish",
+                self._retry_after(),
+            )
+        wait = self._take_token(client)
+        if wait > 0:
+            self._reject(
+                "client_rate",
+                f"Too many {self.name} requests, try again in {wait:.0f}s",
+                wait,
+            )
+
+    def _retained(self, client: str, key: str) -> Tuple[bool, Any]:
+        now = time.monotonic()
+        while self.results:
+            oldest_key, (_, expires_at) = next(iter(self.results.items()))
+            if expires_at > now:
+                break
+            del self.results[oldest_key]
+        if (client, key) in self.results:
+            return True, self.results[(client, key)][0]
+        return False, None
+
+    def _finished(
+        self,
+        client: str,
+        key: Optional[str],
+        start: float,
+        run: "asyncio.Future[Any]",
+        retain: bool,
+    ) -> None:
+        # Also marks the error as retrieved when every waiter gave up on it.
+        failed = run.cancelled() or run.exception() is not None
+        if key is not None and retain and not failed and self.retention > 0:
+            self.results[(client, key)] = (
+                run.result(),
+                time.monotonic() + self.retention,
+            )
+            while len(self.results) > self.max_clients:
+                self.results.popitem(last=False)
+        self.in_flight -= 1
+        self.client_in_flight[client] -= 1
+        if not self.client_in_flight[client]:
+            del self.client_in_flight[client]
+        if key is not None:
+            self.runs.pop((client, key), None)
+        self.durations.append(time.monotonic() - start)
+
+    async def run(
+        self,
+        client: str,
+        key: Optional[str],
+        func: Callable[[], Awaitable[Any]],
+        retain: bool = True,
+    ) -> Any:
+        """
+        Run a request if it is admitted.
+
+        :param client: ID of the client the limits apply to.
+        :param key: idempotency key of the request, None if it has none.
+        :param func: starts the work of the request.
+        :param retain: whether a successful result may be replayed.
+        :raises TooManyRequestsError: if the request isn't admitted.
+        :return: result of the run, or of the run it attached to.
+        """
+        run = None
+        if key is not None:
+            found, result = self._retained(client, key)
+            if found:
+                self.replayed += 1
+                logger.info(f"{self.name} request {key} of {client} replayed")
+                return result
+            run = self.runs.get((client, key))
+        if run is not None:
+            self.attached += 1
+            logger.info(
+                f"{self.name} request {key} of {client} attached to its running twin"
+            )
+            return await asyncio.shield(run)
+
+        self._admit(client)
+        self.admitted += 1
+        self.in_flight += 1
+        self.client_in_flight[client] += 1
+        start = time.monotonic()
+        run = asyncio.ensure_future(func())
+        if key is not None:
+            self.runs[(client, key)] = run
+        run.add_done_callback(
+            lambda done: self._finished(client, key, start, done, retain)
+        )
+        return await asyncio.shield(run)
+
+    def snapshot(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "clients_in_flight": len(self.client_in_flight),
+            "admitted": self.admitted,
+            "attached": self.attached,
+            "replayed": self.replayed,
+            "retained": len(self.results),
+            "rejected": dict(self.rejected),
+            "duration_p50": percentile(sorted(self.durations), 0.5),
+        }
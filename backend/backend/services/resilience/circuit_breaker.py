@@ -0,0 +1,137 @@
+import enum
+import threading
+import time
+from typing import Optional
+
+from loguru import logger
+
+from backend.services.resilience.errors import ServiceUnavailableError
+
+
+class CircuitState(str, enum.Enum):  # noqa: WPS600
+    """Possible states of a circuit breaker."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(ServiceUnavailableError):
+    """Raised when a call is rejected because its circuit is open."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(
+            f"Circuit '{name}' is open, retry in {retry_after:.0f}s",
+            retry_after=retry_after,
+        )
+        self.name = name
+
+
+class CircuitBreaker:
+    """
+    Thread-safe circuit breaker.
+
+    After ``failure_threshold`` consecutive failures the circuit opens and
+    calls fail fast for ``recovery_timeout`` seconds. Then a limited number
+    of trial calls is let through (half-open): a success closes the circuit
+    again, a failure opens it for another ``recovery_timeout``.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        recovery_timeout: float = 30.0,
+        half_open_max_calls: int = 1,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._state = CircuitState.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self._times_opened = 0
+        self._rejected_calls = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> CircuitState:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> CircuitState:
+        if self._state == CircuitState.OPEN and self._retry_after() <= 0:
+            self._state = CircuitState.HALF_OPEN
+            self._half_open_calls = 0
+        return self._state
+
+    def _retry_after(self) -> float:
+        return self._opened_at + self.recovery_timeout - time.monotonic()
+
+    def before_call(self) -> None:
+        """
+        Reserve a call through the circuit.
+
+        :raises CircuitOpenError: if the circuit doesn't accept calls right now.
+        """
+        with self._lock:
+            state = self._current_state()
+            if state == CircuitState.CLOSED:
+                return
+            if (
+                state == CircuitState.HALF_OPEN
+                and self._half_open_calls < self.half_open_max_calls
+            ):
+                self._half_open_calls += 1
+                return
+            self._rejected_calls += 1
+            raise CircuitOpenError(self.name, max(self._retry_after(), 1.0))
+
+    def record_success(self) -> None:
+        """Report a successful call."""
+        with self._lock:
+            if self._state != CircuitState.CLOSED:
+                logger.info(f"Circuit '{self.name}' closed")
+            self._state = CircuitState.CLOSED
+            self._consecutive_failures = 0
+
+    def record_failure(self) -> None:
+        """Report a failed call."""
+        with self._lock:
+            self._consecutive_failures += 1
+            if (
+                self._state == CircuitState.HALF_OPEN
+                or self._consecutive_failures >= self.failure_threshold
+            ):
+                self._open()
+
+    def _open(self) -> None:
+        if self._state != CircuitState.OPEN:
+            self._times_opened += 1
+            logger.warning(
+                f"Circuit '{self.name}' opened after "
+                f"{self._consecutive_failures} consecutive failures",
+            )
+        self._state = CircuitState.OPEN
+        self._opened_at = time.monotonic()
+
+    def snapshot(self) -> dict:
+        """
+        Get the current state of the breaker for monitoring.
+
+        :return: dictionary with the breaker state and counters.
+        """
+        with self._lock:
+            state = self._current_state()
+            retry_after: Optional[float] = None
+            if state == CircuitState.OPEN:
+                retry_after = round(self._retry_after(), 1)
+            return {
+                "state": state.value,
+                "consecutive_failures": self._consecutive_failures,
+                "times_opened": self._times_opened,
+                "rejected_calls": self._rejected_calls,
+                "retry_after": retry_after,
+            }
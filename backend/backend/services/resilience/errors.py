@@ -0,0 +1,25 @@
+from typing import Optional
+
+
+class ServiceUnavailableError(Exception):
+    """
+    Raised when a dependency can't serve a request right now.
+
+    The web layer answers these with a 503 and a Retry-After header.
+    """
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TooManyRequestsError(Exception):
+    """
+    Raised when a client exceeds its share of a limited resource.
+
+    The web layer answers these with a 429 and a Retry-After header.
+    """
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
@@ -0,0 +1,225 @@
+import asyncio
+import random
+import threading
+from typing import Awaitable, Callable, Dict, NamedTuple, Optional, TypeVar
+
+from loguru import logger
+
+from backend.services.resilience.circuit_breaker import CircuitBreaker
+from backend.services.resilience.errors import ServiceUnavailableError
+
+T = TypeVar("T")
+
+
+class Failure(NamedTuple):
+    """How a guard should treat an exception raised by a call."""
+
+    # Whether trying again may succeed (rate limits, 5xx, network errors).
+    retryable: bool
+    # Delay requested by the service (Retry-After header), in seconds.
+    retry_after: Optional[float] = None
+    # Whether the service may have processed the request. Only failures
+    # raised before that (connection errors, rate limits) are safe to retry for
+    # requests that aren't idempotent.
+    sent: bool = True
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parse the value of a Retry-After header given in seconds.
+
+    :param value: header value.
+    :return: delay in seconds or None if missing or not in seconds.
+    """
+    try:
+        return max(float(value), 0.0) if value is not None else None
+    except ValueError:
+        return None
+
+
+class EndpointCounters:
+    """Counters of the calls made to one endpoint."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def snapshot(self) -> dict:
+        return dict(vars(self))
+
+
+class ServiceGuard:
+    """
+    Protects the calls made to an external service.
+
+    Every endpoint of the service gets its own circuit breaker, so a
+    failing endpoint doesn't take the others down. Retryable failures are
+    retried a bounded number of times with jittered exponential backoff,
+    honoring the delay the service asks for when it's small enough.
+    Calls that aren't idempotent are only retried when the failed attempt
+    can't have been processed, and never hedged. Idempotent reads can be
+    hedged: if the first attempt is slower than ``hedge_delay``, a second
+    identical request is sent and the first response wins, the other one
+    is cancelled.
+    """
+
+    def __init__(
+        self,
+        service: str,
+        classify: Callable[[Exception], Failure],
+        max_attempts: int = 3,
+        base_delay: float = 0.25,
+        max_delay: float = 8.0,
+        hedge_delay: float = 0.0,
+        failure_threshold: int = 5,
+        recovery_timeout: float = 30.0,
+    ):
+        self.service = service
+        self.classify = classify
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge_delay = hedge_delay
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._counters: Dict[str, EndpointCounters] = {}
+        self._lock = threading.Lock()
+
+    def _endpoint(self, endpoint: str):
+        with self._lock:
+            if endpoint not in self._breakers:
+                self._breakers[endpoint] = CircuitBreaker(
+                    name=f"{self.service}.{endpoint}",
+                    failure_threshold=self.failure_threshold,
+                    recovery_timeout=self.recovery_timeout,
+                )
+                self._counters[endpoint] = EndpointCounters()
+            return self._breakers[endpoint], self._counters[endpoint]
+
+    async def acall(
+        self,
+        endpoint: str,
+        func: Callable[..., Awaitable[T]],
+        *args,
+        hedge: bool = False,
+        idempotent: bool = True,
+        **kwargs,
+    ) -> T:
+        """
+        Call an endpoint of the service without blocking the event loop.
+
+        :param endpoint: name of the endpoint, used for its circuit breaker.
+        :param func: coroutine function performing the request.
+        :param args: arguments of the coroutine function.
+        :param hedge: whether the request is idempotent and may be hedged.
+        :param idempotent: whether the request may be sent again after a
+            failure the service may have processed.
+        :param kwargs: keyword arguments of the coroutine function.
+        :raises ServiceUnavailableError: if the circuit is open or retries ran out.
+        :return: result of the coroutine.
+        """
+        breaker, counters = self._endpoint(endpoint)
+        counters.calls += 1
+        for attempt in range(1, self.max_attempts + 1):
+            breaker.before_call()
+            try:
+                if hedge and idempotent and self.hedge_delay > 0:
+                    result = await self._ahedged(counters, func, *args, **kwargs)
+                else:
+                    result = await func(*args, **kwargs)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                failure = self.classify(e)
+                if not failure.retryable:
+                    breaker.record_success()
+                    raise
+                breaker.record_failure()
+                counters.failures += 1
+                delay = self._backoff(attempt, failure.retry_after)
+                # A write that may have been applied isn't sent twice.
+                applied = failure.sent and not idempotent
+                if attempt == self.max_attempts or delay is None or applied:
+                    raise ServiceUnavailableError(
+                        f"{self.service} {endpoint} failed: {e}",
+                        retry_after=failure.retry_after,
+                    ) from e
+                counters.retries += 1
+                logger.warning(
+                    f"{self.service} {endpoint} failed ({e}), "
+                    f"retrying in {delay:.2f}s",
+                )
+                await asyncio.sleep(delay)
+            else:
+                breaker.record_success()
+                return result
+        raise AssertionError("unreachable")  # pragma: no cover
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> Optional[float]:
+        """
+        Get the delay before the next attempt.
+
+        :param attempt: number of the attempt that just failed.
+        :param retry_after: delay requested by the service.
+        :return: delay in seconds or None if it's not worth waiting.
+        """
+        if retry_after is not None:
+            if retry_after > self.max_delay:
+                return None
+            return retry_after + random.uniform(0, self.base_delay)  # noqa: S311
+        ceiling = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return random.uniform(0, ceiling)  # noqa: S311
+
+    async def _ahedged(
+        self,
+        counters: EndpointCounters,
+        func: Callable[..., Awaitable[T]],
+        *args,
+        **kwargs,
+    ) -> T:
+        primary = asyncio.ensure_future(func(*args, **kwargs))
+        done, _ = await asyncio.wait([primary], timeout=self.hedge_delay)
+        if done:
+            return primary.result()
+
+        counters.hedged += 1
+        backup = asyncio.ensure_future(func(*args, **kwargs))
+        pending = {primary, backup}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                for task in done:
+                    error = task.exception()
+                    if error is None:
+                        if task is backup:
+                            counters.hedge_wins += 1
+                        return task.result()
+        finally:
+            # The slower request is dropped.
+            for task in pending:
+                task.cancel()
+        raise error  # type: ignore
+
+    def snapshot(self) -> dict:
+        """
+        Get the breaker states and counters of every endpoint.
+
+        :return: dictionary keyed by endpoint.
+        """
+        with self._lock:
+            endpoints = list(self._breakers)
+        return {
+            endpoint: {
+                "circuit": self._breakers[endpoint].snapshot(),
+                **self._counters[endpoint].snapshot(),
+            }
+            for endpoint in endpoints
+        }
@@ -0,0 +1,318 @@
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Deque, Dict, Iterator, NamedTuple, Optional, Tuple, TypeVar
+
+from loguru import logger
+
+from backend.services.metrics import percentile
+from backend.services.resilience.errors import ServiceUnavailableError
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover  # Windows
+    fcntl = None  # type: ignore
+
+T = TypeVar("T")
+
+# Longest sleep between two attempts to take a token, so waiters notice
+# tokens freed by a rate change or another worker.
+MAX_POLL_INTERVAL = 0.25
+# Number of recent queue waits kept per lane to compute percentiles.
+WAIT_WINDOW = 500
+
+
+class RateLimitedError(ServiceUnavailableError):
+    """Raised when a call would wait longer than allowed for a token."""
+
+
+class BucketState(NamedTuple):
+    """State of a token bucket, shared by every process using it."""
+
+    tokens: float
+    # Current refill rate, in tokens per second.
+    rate: float
+    # Wall clock time of the last update (shared across processes).
+    updated_at: float
+    # No token is handed out before this time (Retry-After).
+    paused_until: float
+
+
+class MemoryBucketStore:
+    """Keeps the bucket state in memory, for a single process."""
+
+    def __init__(self) -> None:
+        self._state: Optional[BucketState] = None
+        self._lock = threading.Lock()
+
+    def update(
+        self,
+        func: Callable[[Optional[BucketState]], Tuple[BucketState, T]],
+    ) -> T:
+        with self._lock:
+            self._state, result = func(self._state)
+        return result
+
+    async def aupdate(
+        self,
+        func: Callable[[Optional[BucketState]], Tuple[BucketState, T]],
+    ) -> T:
+        return self.update(func)
+
+
+class FileBucketStore:
+    """
+    Keeps the bucket state in a local file, shared by all the workers.
+
+    Every update happens under an exclusive ``flock``, held only for the
+    time it takes to read and rewrite a few bytes. Waiting for it may still
+    block while another worker holds it, so ``aupdate`` waits in a thread.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        # The updates of a process are serialized by _lock anyway.
+        self._executor = ThreadPoolExecutor(
+            max_workers=1,
+            thread_name_prefix="rate-limit",
+        )
+
+    @contextmanager
+    def _locked(self) -> Iterator[int]:
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield fd
+        finally:
+            os.close(fd)  # Releases the lock.
+
+    def update(
+        self,
+        func: Callable[[Optional[BucketState]], Tuple[BucketState, T]],
+    ) -> T:
+        with self._lock, self._locked() as fd:
+            state = None
+            raw = os.pread(fd, 4096, 0)
+            if raw:
+                try:
+                    state = BucketState(**json.loads(raw))
+                except (ValueError, TypeError):
+                    logger.warning(f"Resetting corrupted rate limit state {self.path}")
+            state, result = func(state)
+            data = json.dumps(state._asdict()).encode()
+            os.ftruncate(fd, 0)
+            os.pwrite(fd, data, 0)
+        return result
+
+    async def aupdate(
+        self,
+        func: Callable[[Optional[BucketState]], Tuple[BucketState, T]],
+    ) -> T:
+        """
+        Update the state without blocking the event loop.
+
+        A cancelled caller doesn't cancel the update, its token is just lost.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.update, func)
+
+
+def make_bucket_store(path: Optional[Path]):
+    """
+    Create the store of a bucket.
+
+    :param path: file shared by the workers, None to keep the state in memory.
+    :return: bucket store.
+    """
+    if path is None or fcntl is None:
+        return MemoryBucketStore()
+    return FileBucketStore(path)
+
+
+class LaneStats:
+    """Queue wait times of a priority lane."""
+
+    def __init__(self) -> None:
+        self.acquired = 0
+        self.rejected = 0
+        self.waiting = 0
+        self.waits: Deque[float] = deque(maxlen=WAIT_WINDOW)
+
+    def snapshot(self) -> dict:
+        waits = sorted(self.waits)
+        return {
+            "acquired": self.acquired,
+            "rejected": self.rejected,
+            "waiting": self.waiting,
+            "wait_p50": percentile(waits, 0.5),
+            "wait_p95": percentile(waits, 0.95),
+            "wait_max": round(waits[-1], 3) if waits else None,
+        }
+
+
+class RateLimiter:
+    """
+    Token bucket scheduling the calls made to a rate limited service.
+
+    Calls are made in priority lanes. Each lane has a reserve, the share
+    of the bucket it may not dip into: with few tokens left only the lanes
+    with a lower reserve get them, so interactive calls keep flowing while
+    bulk work waits. The state lives in a store that several processes
+    can share, so the limit holds for the whole application.
+
+    When the service answers with a rate limit, ``penalize`` stops handing
+    out tokens for the requested delay and halves the rate, which then
+    recovers linearly to ``rate`` over ``recovery_time`` seconds.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rate: float,
+        burst: int,
+        lanes: Dict[str, float],
+        store=None,
+        min_rate: float = 1.0,
+        recovery_time: float = 60.0,
+        max_wait: float = 10.0,
+    ):
+        self.name = name
+        self.max_rate = rate
+        self.burst = burst
+        self.lanes = lanes
+        self.store = store or MemoryBucketStore()
+        self.min_rate = min(min_rate, rate)
+        self.recovery_time = recovery_time
+        self.max_wait = max_wait
+        self.stats: Dict[str, LaneStats] = {lane: LaneStats() for lane in lanes}
+        self._last_state: Optional[BucketState] = None
+
+    def _refill(self, state: Optional[BucketState], now: float) -> BucketState:
+        if state is None:
+            return BucketState(self.burst, self.max_rate, now, 0.0)
+        elapsed = max(now - state.updated_at, 0.0)
+        rate = min(
+            self.max_rate,
+            state.rate + elapsed * self.max_rate / self.recovery_time,
+        )
+        # No tokens accumulate while paused.
+        refill_time = max(now - max(state.updated_at, state.paused_until), 0.0)
+        tokens = min(float(self.burst), state.tokens + refill_time * state.rate)
+        return BucketState(tokens, rate, now, state.paused_until)
+
+    async def _take(self, lane: str) -> float:
+        """
+        Take a token for a lane if its reserve allows it.
+
+        :param lane: priority lane of the call.
+        :return: 0 if a token was taken, else the expected wait in seconds.
+        """
+        floor = self.lanes[lane] * self.burst
+
+        def _update(state: Optional[BucketState]) -> Tuple[BucketState, float]:
+            now = time.time()
+            state = self._refill(state, now)
+            if now < state.paused_until:
+                return state, state.paused_until - now
+            if state.tokens - 1 >= floor:
+                return state._replace(tokens=state.tokens - 1), 0.0
+            return state, (floor + 1 - state.tokens) / state.rate
+
+        return await self._update(_update)
+
+    async def _update(
+        self,
+        func: Callable[[Optional[BucketState]], Tuple[BucketState, T]],
+    ) -> T:
+        def _apply(
+            state: Optional[BucketState],
+        ) -> Tuple[BucketState, T]:  # noqa: WPS430
+            new_state, result = func(state)
+            # Kept for the metrics, which shouldn't need the shared lock.
+            self._last_state = new_state
+            return new_state, result
+
+        return await self.store.aupdate(_apply)
+
+    async def acquire(self, lane: str) -> float:
+        """
+        Wait for a token.
+
+        :param lane: priority lane of the call.
+        :raises RateLimitedError: if the wait would exceed ``max_wait``.
+        :return: seconds spent waiting.
+        """
+        stats = self.stats[lane]
+        start = time.monotonic()
+        deadline = start + self.max_wait
+        stats.waiting += 1
+        try:
+            while True:
+                wait = await self._take(lane)
+                if wait <= 0:
+                    break
+                if time.monotonic() + wait > deadline:
+                    stats.rejected += 1
+                    raise RateLimitedError(
+                        f"{self.name} rate limit reached for {lane} calls",
+                        retry_after=wait,
+                    )
+                # Jitter so the waiters of all the workers don't wake up together.
+                await asyncio.sleep(
+                    min(wait, MAX_POLL_INTERVAL) * random.uniform(1, 1.2),  # noqa: S311
+                )
+        finally:
+            stats.waiting -= 1
+        waited = time.monotonic() - start
+        stats.acquired += 1
+        stats.waits.append(waited)
+        return waited
+
+    async def penalize(self, retry_after: float) -> None:
+        """
+        Slow down after the service rejected a call for going too fast.
+
+        :param retry_after: delay requested by the service, in seconds.
+        """
+
+        def _update(state: Optional[BucketState]) -> Tuple[BucketState, BucketState]:
+            now = time.time()
+            state = self._refill(state, now)
+            penalized = BucketState(
+                tokens=0.0,
+                rate=max(self.min_rate, state.rate / 2),
+                updated_at=now,
+                paused_until=max(state.paused_until, now + retry_after),
+            )
+            return penalized, penalized
+
+        state = await self._update(_update)
+        logger.warning(
+            f"{self.name} rate limited, pausing for {retry_after:.1f}s "
+            f"and slowing down to {state.rate:.1f} calls/s",
+        )
+
+    def snapshot(self) -> dict:
+        """
+        Get the bucket state and the queue waits of every lane.
+
+        :return: dictionary with the rate and per-lane stats.
+        """
+        state = self._last_state
+        return {
+            "max_rate": self.max_rate,
+            "rate": round(state.rate, 3) if state else self.max_rate,
+            "tokens": round(state.tokens, 3) if state else self.burst,
+            "paused_for": (
+                round(max(state.paused_until - time.time(), 0.0), 3) if state else 0.0
+            ),
+            "lanes": {lane: stats.snapshot() for lane, stats in self.stats.items()},
+        }
@@ -0,0 +1,197 @@
+"""
+CPU thread budget of a process.
+
+Torch, onnxruntime and the tokenizers each default to one thread per core
+they can see, and every uvicorn worker loads its own copy, so several
+workers oversubscribe the CPU. The planner splits a single CPU budget
+between the processes of the application and sizes every thread pool of
+a process from its share.
+"""
+import dataclasses
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Tuple
+
+from loguru import logger
+
+from backend.settings import Settings, settings
+
+CGROUP_V2_CPU_MAX = Path("/sys/fs/cgroup/cpu.max")
+CGROUP_V1_QUOTA = Path("/sys/fs/cgroup/cpu/cpu.cfs_quota_us")
+CGROUP_V1_PERIOD = Path("/sys/fs/cgroup/cpu/cpu.cfs_period_us")
+
+WEB = "web"
+MODEL_SERVER = "model_server"
+WORKER = "worker"
+
+
+def _cgroup_cpus() -> Optional[float]:
+    """
+    Read the CPU quota of the container.
+
+    :return: number of CPUs allowed by the cgroup or None if unlimited.
+    """
+    try:
+        if CGROUP_V2_CPU_MAX.exists():
+            quota, period = CGROUP_V2_CPU_MAX.read_text().split()
+            if quota == "max":
+                return None
+            return int(quota) / int(period)
+        if CGROUP_V1_QUOTA.exists():
+            quota_us = int(CGROUP_V1_QUOTA.read_text())
+            if quota_us <= 0:
+                return None
+            return quota_us / int(CGROUP_V1_PERIOD.read_text())
+    except (OSError, ValueError) as e:
+        logger.warning(f"Can't read the cgroup CPU quota: {e}")
+    return None
+
+
+def available_cpus() -> Tuple[float, str]:
+    """
+    Get the number of CPUs this process can actually use.
+
+    Takes the smallest of the cgroup quota, the CPU affinity and the
+    number of cores of the machine.
+
+    :return: number of CPUs and where the limit comes from.
+    """
+    limits = [(float(os.cpu_count() or 1), "cpu_count")]
+    if hasattr(os, "sched_getaffinity"):
+        limits.append((float(len(os.sched_getaffinity(0))), "affinity"))
+    cgroup = _cgroup_cpus()
+    if cgroup is not None:
+        limits.append((cgroup, "cgroup"))
+    return min(limits)
+
+
+@dataclass(frozen=True)
+class ResourcePlan:
+    """Threads allotted to one process of the application."""
+
+    role: str
+    cpus_detected: float
+    cpus_source: str
+    # CPUs shared by all the processes of this role.
+    cpu_budget: float
+    processes: int
+    cpus_per_process: float
+    # Inferences running at the same time (inference executor threads).
+    inference_workers: int
+    # Threads used by one inference (torch/onnxruntime intra-op).
+    intra_op_threads: int
+    inter_op_threads: int
+    tokenizers_parallelism: bool
+    # Threads of the event loop's default executor (blocking I/O, loading).
+    default_executor_workers: int
+
+    def to_dict(self) -> dict:
+        return dataclasses.asdict(self)
+
+
+def plan_resources(config: Settings, role: str = WEB) -> ResourcePlan:
+    """
+    Split the CPU budget between the processes of a role.
+
+    Web and generation workers that delegate inference to the model server
+    keep a single inference thread for the cheap local work, the rest of
+    their share goes to the event loop.
+
+    :param config: application settings.
+    :param role: WEB, MODEL_SERVER or WORKER.
+    :return: the plan of one process.
+    """
+    cpus, source = available_cpus()
+    budget = min(config.cpu_budget or cpus, cpus)
+    processes = config.workers_count if role == WEB else 1
+    per_process = max(budget / processes, 1.0)
+
+    remote_inference = role in (WEB, WORKER) and config.model_server_socket is not None
+    inference_workers = config.inference_workers or (
+        1 if remote_inference else max(1, math.floor(per_process) // 2)
+    )
+    intra_op_threads = config.inference_threads or max(
+        1,
+        math.floor(per_process / inference_workers),
+    )
+    return ResourcePlan(
+        role=role,
+        cpus_detected=cpus,
+        cpus_source=source,
+        cpu_budget=budget,
+        processes=processes,
+        cpus_per_process=round(per_process, 2),
+        inference_workers=inference_workers,
+        intra_op_threads=intra_op_threads,
+        inter_op_threads=1,
+        # Batches are tokenized by the inference threads themselves.
+        tokenizers_parallelism=intra_op_threads > 1 and inference_workers == 1,
+        default_executor_workers=config.default_executor_workers
+        or min(32, math.ceil(per_process) + 4),
+    )
+
+
+# Environment read by the native thread pools when their library is loaded,
+# so it's set before torch, onnxruntime or tokenizers are imported.
+def _thread_env(plan: ResourcePlan) -> dict:
+    threads = str(plan.intra_op_threads)
+    return {
+        "OMP_NUM_THREADS": threads,
+        "MKL_NUM_THREADS": threads,
+        "OPENBLAS_NUM_THREADS": threads,
+        "RAYON_RS_NUM_CPUS": threads,
+        "TOKENIZERS_PARALLELISM": str(plan.tokenizers_parallelism).lower(),
+    }
+
+
+_plan: Optional[ResourcePlan] = None
+
+
+def apply_resource_plan(role: str = WEB) -> ResourcePlan:
+    """
+    Compute the plan of this process and configure the thread pools.
+
+    Called once on startup, before any model is loaded. Libraries imported
+    later pick up the limits from the environment; torch is configured
+    when the genre model loads it (see ``configure_torch``).
+
+    :param role: WEB, MODEL_SERVER or WORKER.
+    :return: the applied plan.
+    """
+    global _plan  # noqa: WPS420
+    _plan = plan_resources(settings, role)
+    for name, value in _thread_env(_plan).items():
+        os.environ.setdefault(name, value)
+    logger.info(f"Resource plan: {_plan.to_dict()}")
+    return _plan
+
+
+def get_resource_plan() -> ResourcePlan:
+    """
+    Get the plan of this process, computing it if it wasn't applied.
+
+    :return: resource plan.
+    """
+    return _plan or apply_resource_plan()
+
+
+def create_default_executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(
+        max_workers=get_resource_plan().default_executor_workers,
+        thread_name_prefix="default",
+    )
+
+
+def configure_torch() -> None:
+    """Apply the thread plan to torch, right after it's imported."""
+    import torch  # noqa: WPS433
+
+    plan = get_resource_plan()
+    torch.set_num_threads(plan.intra_op_threads)
+    try:
+        torch.set_num_interop_threads(plan.inter_op_threads)
+    except RuntimeError:
+        pass  # noqa: WPS420  # Only allowed before torch's first parallel work.
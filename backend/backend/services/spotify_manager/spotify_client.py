@@ -0,0 +1,536 @@
+import base64
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterable, Iterator, List, Optional
+
+import httpx
+from loguru import logger
+
+from backend.services.metrics import register_metrics
+from backend.services.resilience import (
+    Failure,
+    RateLimiter,
+    ServiceGuard,
+    make_bucket_store,
+    parse_retry_after,
+)
+from backend.settings import settings
+
+API_URL = "https://api.spotify.com/v1/"
+TOKEN_URL = "https://accounts.spotify.com/api/token"
+
+# Idempotent reads that may be hedged when Spotify is slow.
+HEDGEABLE_ENDPOINTS = frozenset(("search", "audio_features", "playlist_items"))
+
+# Priority lanes of the calls, with the share of the rate limit bucket each
+# lane leaves to the ones before it: user facing calls (login, playlist
+# creation) get the last tokens, generation fan-out comes next, background
+# warmers only run while most of the bucket is free.
+INTERACTIVE = "interactive"
+GENERATION = "generation"
+BACKGROUND = "background"
+LANE_RESERVES = {INTERACTIVE: 0.0, GENERATION: 0.2, BACKGROUND: 0.5}
+
+INTERACTIVE_ENDPOINTS = frozenset(
+    ("token", "me", "user_playlist_create", "playlist_add_items"),
+)
+
+# Delay applied when Spotify rate limits a call without a Retry-After header.
+DEFAULT_RETRY_AFTER = 1.0
+
+# Maximum number of items added to a playlist per call.
+PLAYLIST_ITEMS_CHUNK = 100
+
+# Audio attributes the recommendations endpoint can be tuned with.
+TUNABLE_PREFIXES = ("min_", "max_", "target_")
+
+
+class SpotifyError(Exception):
+    """Raised when the Spotify API answers with an error status."""
+
+    def __init__(self, http_status: int, message: str, headers: Optional[dict] = None):
+        super().__init__(f"http status: {http_status}, {message}")
+        self.http_status = http_status
+        self.message = message
+        self.headers = headers or {}
+
+
+def classify_spotify_error(error: Exception) -> Failure:
+    """
+    Tell whether a failed Spotify call is worth retrying.
+
+    :param error: exception raised by the Spotify client.
+    :return: how to handle the failure.
+    """
+    if isinstance(error, SpotifyError):
+        retry_after = parse_retry_after(error.headers.get("retry-after"))
+        # Rate limited requests are rejected before they are processed.
+        if error.http_status == 429:
+            return Failure(retryable=True, retry_after=retry_after, sent=False)
+        return Failure(error.http_status >= 500, retry_after)
+    # The request never left when the connection couldn't be made.
+    if isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)):
+        return Failure(retryable=True, sent=False)
+    if isinstance(error, httpx.TransportError):
+        return Failure(retryable=True)
+    return Failure(retryable=False)
+
+
+spotify_guard = ServiceGuard(
+    service="spotify",
+    classify=classify_spotify_error,
+    max_attempts=settings.spotify_max_attempts,
+    base_delay=settings.retry_base_delay,
+    max_delay=settings.retry_max_delay,
+    hedge_delay=settings.spotify_hedge_delay,
+    failure_threshold=settings.breaker_failure_threshold,
+    recovery_timeout=settings.breaker_recovery_timeout,
+)
+register_metrics("spotify", spotify_guard.snapshot)
+
+spotify_rate_limiter = RateLimiter(
+    name="spotify",
+    rate=settings.spotify_rate_limit,
+    burst=settings.spotify_rate_burst,
+    lanes=LANE_RESERVES,
+    store=make_bucket_store(settings.spotify_rate_state_file),
+    min_rate=settings.spotify_rate_min,
+    recovery_time=settings.spotify_rate_recovery,
+    max_wait=settings.spotify_rate_max_wait,
+)
+register_metrics("spotify_rate_limit", spotify_rate_limiter.snapshot)
+
+_lane_override: ContextVar[Optional[str]] = ContextVar(
+    "spotify_lane_override",
+    default=None,
+)
+
+
+@contextmanager
+def spotify_lane(lane: str) -> Iterator[None]:
+    """
+    Run the Spotify calls made in this context in the given priority lane.
+
+    Used by background jobs, whose calls must yield to the users' ones.
+
+    :param lane: priority lane.
+    :yields: nothing.
+    """
+    token = _lane_override.set(lane)
+    try:
+        yield
+    finally:
+        _lane_override.reset(token)
+
+
+def _lane_of(endpoint: str) -> str:
+    lane = _lane_override.get()
+    if lane is not None:
+        return lane
+    return INTERACTIVE if endpoint in INTERACTIVE_ENDPOINTS else GENERATION
+
+
+class PlaylistRecord:
+    """
+    Playlist created by a generation that may run again.
+
+    A run given the playlist of an earlier one fills it again instead of
+    creating another one: ``user_playlist_create`` returns it, and the
+    first ``playlist_add_items`` call replaces the tracks it already has.
+    """
+
+    def __init__(
+        self,
+        playlist_id: Optional[str],
+        on_created: Callable[[str], Awaitable[Any]],
+    ):
+        self.playlist_id = playlist_id
+        self.on_created = on_created
+        self.reused = playlist_id is not None
+
+
+_playlist_record: ContextVar[Optional[PlaylistRecord]] = ContextVar(
+    "spotify_playlist_record",
+    default=None,
+)
+
+
+@contextmanager
+def playlist_record(record: PlaylistRecord) -> Iterator[PlaylistRecord]:
+    """
+    Record the playlist created by the Spotify calls made in this context.
+
+    :param record: playlist of an earlier run, and the callback saving a
+        new one.
+    :yield: the record.
+    """
+    token = _playlist_record.set(record)
+    try:
+        yield record
+    finally:
+        _playlist_record.reset(token)
+
+
+class PoolCounters:
+    """
+    Connection reuse counters of the shared HTTP pool, per host.
+
+    Fed by httpcore trace events: a request that didn't trigger a TCP
+    connect reused a kept-alive connection.
+    """
+
+    def __init__(self) -> None:
+        self.requests: Dict[str, int] = defaultdict(int)
+        self.connections: Dict[str, int] = defaultdict(int)
+
+    def tracer(self, host: str):
+        async def _trace(event_name: str, info: dict) -> None:  # noqa: WPS430
+            if event_name == "connection.connect_tcp.complete":
+                self.connections[host] += 1
+            elif event_name == "http11.send_request_headers.started":
+                self.requests[host] += 1
+            elif event_name == "http2.send_request_headers.started":
+                self.requests[host] += 1
+
+        return _trace
+
+    def snapshot(self) -> dict:
+        stats = {}
+        for host, requests_count in list(self.requests.items()):
+            connections = self.connections[host]
+            stats[host] = {
+                "requests": requests_count,
+                "connections_opened": connections,
+                "connections_reused": max(requests_count - connections, 0),
+                "reuse_ratio": (
+                    round(1 - connections / requests_count, 3)
+                    if requests_count
+                    else None
+                ),
+            }
+        return stats
+
+
+pool_counters = PoolCounters()
+register_metrics("spotify_pool", pool_counters.snapshot)
+
+_http: Optional[httpx.AsyncClient] = None
+
+
+def get_spotify_http() -> httpx.AsyncClient:
+    """
+    Get the process-wide HTTP client used for every Spotify call.
+
+    Per-user clients only borrow it and send their bearer token with each
+    request, so connections to Spotify are kept alive and reused across
+    users and requests, and a single worker can keep hundreds of calls in
+    flight without blocking its event loop.
+
+    :return: pooled async HTTP client.
+    """
+    global _http  # noqa: WPS420
+    if _http is None or _http.is_closed:
+        _http = httpx.AsyncClient(
+            timeout=settings.spotify_timeout,
+            limits=httpx.Limits(
+                max_connections=settings.spotify_pool_max_connections,
+                max_keepalive_connections=settings.spotify_pool_maxsize,
+                keepalive_expiry=settings.spotify_pool_keepalive_expiry,
+            ),
+        )
+    return _http
+
+
+async def close_spotify_http() -> None:
+    """Close the pooled connections, on application shutdown."""
+    global _http  # noqa: WPS420
+    if _http is not None:
+        await _http.aclose()
+        _http = None
+
+
+async def _send(
+    lane: str,
+    method: str,
+    url: str,
+    headers: Dict[str, str],
+    params: Optional[dict] = None,
+    json: Optional[Any] = None,
+    data: Optional[dict] = None,
+) -> Any:
+    # Every attempt (retries and hedges included) takes a token.
+    await spotify_rate_limiter.acquire(lane)
+    response = await get_spotify_http().request(
+        method,
+        url,
+        headers=headers,
+        params=params,
+        json=json,
+        data=data,
+        extensions={"trace": pool_counters.tracer(httpx.URL(url).host)},
+    )
+    if response.status_code == 429:
+        retry_after = parse_retry_after(response.headers.get("retry-after"))
+        await spotify_rate_limiter.penalize(retry_after or DEFAULT_RETRY_AFTER)
+    if response.status_code >= 400:
+        try:
+            message = response.json()["error"]
+            if isinstance(message, dict):
+                message = message.get("message", "")
+        except Exception:
+            message = response.text
+        raise SpotifyError(response.status_code, message, dict(response.headers))
+    if not response.content:
+        return None
+    return response.json()
+
+
+class AsyncSpotify:
+    """
+    Asyncio Spotify Web API client of a user.
+
+    Covers the endpoints the backend uses, with the same signatures and
+    return values as their spotipy counterparts. Every call goes through
+    the Spotify guard: it has its own circuit breaker and is retried on
+    rate limits and server errors, writes only if they weren't processed.
+    Each attempt first waits for a token of the application-wide rate
+    limiter, in the lane of the endpoint.
+    """
+
+    def __init__(self, access_token: str):
+        self._headers = {"Authorization": f"Bearer {access_token}"}
+
+    async def _call(
+        self,
+        endpoint: str,
+        method: str,
+        path: str,
+        params: Optional[dict] = None,
+        json: Optional[Any] = None,
+    ) -> Any:
+        return await spotify_guard.acall(
+            endpoint,
+            _send,
+            _lane_of(endpoint),
+            method,
+            API_URL + path,
+            self._headers,
+            params=params,
+            json=json,
+            hedge=endpoint in HEDGEABLE_ENDPOINTS,
+            # Creating a playlist or adding tracks twice duplicates them.
+            idempotent=method != "POST",
+        )
+
+    async def me(self) -> dict:
+        return await self._call("me", "GET", "me/")
+
+    async def search(
+        self,
+        q: str,
+        limit: int = 10,
+        offset: int = 0,
+        type: str = "track",  # noqa: WPS125
+    ) -> dict:
+        params = {"q": q, "limit": limit, "offset": offset, "type": type}
+        return await self._call("search", "GET", "search", params=params)
+
+    async def playlist_items(
+        self,
+        playlist_id: str,
+        limit: int = 100,
+        offset: int = 0,
+    ) -> dict:
+        params = {"limit": limit, "offset": offset, "additional_types": "track"}
+        return await self._call(
+            "playlist_items",
+            "GET",
+            f"playlists/{playlist_id}/tracks",
+            params=params,
+        )
+
+    async def audio_features(self, tracks: Iterable[str]) -> List[Optional[dict]]:
+        ids = [track.split(":")[-1] for track in tracks]
+        if not ids:
+            return []
+        results = await self._call(
+            "audio_features",
+            "GET",
+            "audio-features/",
+            params={"ids": ",".join(ids)},
+        )
+        return results.get("audio_features", results)
+
+    async def recommendations(
+        self,
+        seed_genres: Optional[List[str]] = None,
+        limit: int = 20,
+        **kwargs,
+    ) -> dict:
+        params: Dict[str, Any] = {"limit": limit}
+        if seed_genres:
+            params["seed_genres"] = ",".join(seed_genres)
+        # Like spotipy, only min_/max_/target_ attributes are sent.
+        params.update(
+            {
+                key: value
+                for key, value in kwargs.items()
+                if key.startswith(TUNABLE_PREFIXES) and value is not None
+            },
+        )
+        return await self._call(
+            "recommendations", "GET", "recommendations", params=params
+        )
+
+    async def user_playlists(self, user: str, limit: int = 50, offset: int = 0) -> dict:
+        return await self._call(
+            "user_playlists",
+            "GET",
+            f"users/{user}/playlists",
+            params={"limit": limit, "offset": offset},
+        )
+
+    async def user_playlist_create(
+        self,
+        user: str,
+        name: str,
+        public: bool = True,
+        collaborative: bool = False,
+        description: str = "",
+    ) -> dict:
+        record = _playlist_record.get()
+        if record is not None and record.playlist_id is not None:
+            logger.info(f"Reusing playlist {record.playlist_id} of an earlier run")
+            return {"id": record.playlist_id}
+        data = {
+            "name": name,
+            "public": public,
+            "collaborative": collaborative,
+            "description": description,
+        }
+        playlist = await self._call(
+            "user_playlist_create",
+            "POST",
+            f"users/{user}/playlists",
+            json=data,
+        )
+        if record is not None:
+            record.playlist_id = playlist["id"]
+            await record.on_created(playlist["id"])
+        return playlist
+
+    async def playlist_add_items(
+        self,
+        playlist_id: str,
+        items: List[str],
+        position: Optional[int] = None,
+    ) -> dict:
+        # Spotify takes at most 100 items per call. The chunks are sent in
+        # order, so the playlist keeps the order of the items.
+        items = list(items)
+        result: dict = {}
+        record = _playlist_record.get()
+        # A playlist reused from an earlier run may have some of the items
+        # already, the first chunk replaces them.
+        method = "POST"
+        if record is not None and record.reused and record.playlist_id == playlist_id:
+            record.reused = False
+            method = "PUT"
+        for start in range(0, len(items), PLAYLIST_ITEMS_CHUNK):
+            data: Dict[str, Any] = {"uris": items[start : start + PLAYLIST_ITEMS_CHUNK]}
+            if position is not None and method == "POST":
+                data["position"] = position + start
+            result = await self._call(
+                "playlist_add_items",
+                method,
+                f"playlists/{playlist_id}/tracks",
+                json=data,
+            )
+            method = "POST"
+        return result
+
+    async def current_user_top_tracks(
+        self,
+        limit: int = 20,
+        offset: int = 0,
+        time_range: str = "medium_term",
+    ) -> dict:
+        params = {"limit": limit, "offset": offset, "time_range": time_range}
+        return await self._call("top_tracks", "GET", "me/top/tracks", params=params)
+
+    async def current_user_top_artists(
+        self,
+        limit: int = 20,
+        offset: int = 0,
+        time_range: str = "medium_term",
+    ) -> dict:
+        params = {"limit": limit, "offset": offset, "time_range": time_range}
+        return await self._call("top_artists", "GET", "me/top/artists", params=params)
+
+
+async def refresh_access_token(
+    client_id: str,
+    client_secret: str,
+    refresh_token: str,
+) -> dict:
+    """
+    Exchange a refresh token for a new access token.
+
+    :param client_id: Spotify client id of the application.
+    :param client_secret: Spotify client secret of the application.
+    :param refresh_token: refresh token of the user.
+    :return: token info, with the old refresh token if Spotify didn't rotate it.
+    """
+    credentials = base64.b64encode(f"{client_id}:{client_secret}".encode()).decode()
+    token_info = await spotify_guard.acall(
+        "token",
+        _send,
+        _lane_of("token"),
+        "POST",
+        TOKEN_URL,
+        {"Authorization": f"Basic {credentials}"},
+        data={"grant_type": "refresh_token", "refresh_token": refresh_token},
+    )
+    if not token_info.get("refresh_token"):
+        token_info["refresh_token"] = refresh_token
+    logger.debug("Spotify access token refreshed")
+    return token_info
+
+
+async def client_credentials_token(client_id: str, client_secret: str) -> dict:
+    """
+    Get an access token of the application itself, not bound to any user.
+
+    It can read the public catalog (search, playlists, audio features) but
+    not any user data.
+
+    :param client_id: Spotify client id of the application.
+    :param client_secret: Spotify client secret of the application.
+    :return: token info.
+    """
+    credentials = base64.b64encode(f"{client_id}:{client_secret}".encode()).decode()
+    token_info = await spotify_guard.acall(
+        "token",
+        _send,
+        _lane_of("token"),
+        "POST",
+        TOKEN_URL,
+        {"Authorization": f"Basic {credentials}"},
+        data={"grant_type": "client_credentials"},
+    )
+    logger.debug("Spotify application token issued")
+    return token_info
+
+
+def get_spotify_client(access_token: str) -> AsyncSpotify:
+    """
+    Create a Spotify client for a user.
+
+    The client is cheap: it borrows the pooled HTTP client and only holds
+    the user's token.
+
+    :param access_token: Spotify access token of the user.
+    :return: Spotify client.
+    """
+    return AsyncSpotify(access_token)
@@ -1,10 +1,19 @@
+import asyncio
 import os
-from typing import Any, Dict, List
+import time
+from typing import Any, Dict, List, Optional
 
-import spotipy
 from fastapi_sso import SpotifySSO
 from loguru import logger
-from spotipy.oauth2 import SpotifyOAuth
+
+from backend.services.spotify_manager.spotify_client import (
+    client_credentials_token,
+    get_spotify_client,
+    refresh_access_token,
+)
+
+# Seconds before its expiry the application token is renewed.
+APP_TOKEN_MARGIN = 60
 
 
 def singleton(cls, *args, **kw):
@@ -35,16 +44,17 @@ class SpotifyManager:
         self.client_secret = client_secret
         self.redirect_uri = redirect_uri
         self.scope = scope
-        self.sp_oauth = SpotifyOAuth(
-            client_id=self.client_id,
-            client_secret=self.client_secret,
-            redirect_uri=self.redirect_uri,
-            scope=self.scope,
-        )
+        self._app_token: Optional[str] = None
+        self._app_token_expires_at = 0.0
+        self._app_token_lock: Optional[asyncio.Lock] = None
 
     async def refresh_access_token(self, refresh_token: str):
         try:
-            token_info = self.sp_oauth.refresh_access_token(refresh_token)
+            token_info = await refresh_access_token(
+                self.client_id,
+                self.client_secret,
+                refresh_token,
+            )
             return {
                 "new_access_token": token_info["access_token"],
                 "new_refresh_token": token_info["refresh_token"],
@@ -53,29 +63,60 @@ class SpotifyManager:
             logger.error(f"Error refreshing access token: {e}")
             raise
 
-    def get_most_listened_tracks(
+    async def get_app_access_token(self) -> str:
+        """
+        Get the access token of the application, for background jobs
+        reading the public catalog without any user.
+
+        The token is shared and renewed shortly before it expires.
+
+        :return: access token.
+        """
+        if self._app_token_lock is None:
+            self._app_token_lock = asyncio.Lock()
+        async with self._app_token_lock:
+            if (
+                self._app_token is None
+                or time.monotonic() >= self._app_token_expires_at
+            ):
+                token_info = await client_credentials_token(
+                    self.client_id, self.client_secret
+                )
+                self._app_token = token_info["access_token"]
+                self._app_token_expires_at = (
+                    time.monotonic()
+                    + token_info.get("expires_in", 3600)
+                    - APP_TOKEN_MARGIN
+                )
+            return self._app_token
+
+    async def get_most_listened_tracks(
         self,
         access_token: str,
         limit: int = 20,
         time_range: str = "medium_term",
     ) -> List[Dict[str, Any]]:
         try:
-            sp = spotipy.Spotify(auth=access_token)
-            results = sp.current_user_top_tracks(limit=limit, time_range=time_range)
+            sp = get_spotify_client(access_token)
+            results = await sp.current_user_top_tracks(
+                limit=limit, time_range=time_range
+            )
             return results["items"]
         except Exception as e:
             logger.error(f"Error fetching most listened tracks: {e}")
             raise
 
-    def get_most_listened_artists(
+    async def get_most_listened_artists(
         self,
         access_token: str,
         limit: int = 20,
         time_range: str = "medium_term",
     ) -> List[Dict[str, Any]]:
         try:
-            sp = spotipy.Spotify(auth=access_token)
-            results = sp.current_user_top_artists(limit=limit, time_range=time_range)
+            sp = get_spotify_client(access_token)
+            results = await sp.current_user_top_artists(
+                limit=limit, time_range=time_range
+            )
             return results["items"]
         except Exception as e:
             logger.error(f"Error fetching most listened artists: {e}")
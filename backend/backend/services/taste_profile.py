@@ -0,0 +1,228 @@
+"""
+Taste profiles of the users.
+
+A profile summarizes the top tracks and artists of a user over a Spotify
+time range: the average audio features of the tracks, the main genres of
+the artists and a few seed tracks and artists. Profiles are computed in
+the background after login, at most once per ``taste_profile_ttls`` of
+their time range, and stored in the ``taste_profile`` table.
+
+Generations can blend the profile into the target audio features of the
+model (``Config.taste_blend``). The profile is only read from the
+database then, the request never calls Spotify for it.
+"""
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional
+
+from loguru import logger
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from backend.db.dao.taste_profile_dao import TasteProfileDAO
+from backend.services.metrics import register_metrics
+from backend.services.recommendations_manager.track_index import FEATURE_RANGES
+from backend.services.spotify_manager.spotify_client import (
+    BACKGROUND,
+    get_spotify_client,
+    spotify_lane,
+)
+from backend.services.spotify_manager.spotify_manager import spotify_manager
+from backend.settings import settings
+
+# Top items read from Spotify, the most a single call returns.
+TOP_ITEMS = 50
+# Seeds kept per kind, the most a recommendation call accepts.
+SEEDS = 5
+# Genres kept in a profile.
+PROFILE_GENRES = 10
+
+
+class TasteProfileStats:
+    def __init__(self) -> None:
+        self.refreshed = 0
+        self.failures = 0
+        self.blended = 0
+        self.missing = 0
+
+    def snapshot(self) -> dict:
+        return {
+            "refreshed": self.refreshed,
+            "failures": self.failures,
+            # Generations asking for a blend, with and without a profile.
+            "blended": self.blended,
+            "missing": self.missing,
+        }
+
+
+stats = TasteProfileStats()
+register_metrics("taste_profiles", stats.snapshot)
+
+
+def _average_features(audio_features: List[Optional[dict]]) -> Dict[str, float]:
+    tracks = [track for track in audio_features if track]
+    averages = {}
+    for feature in FEATURE_RANGES:
+        values = [track[feature] for track in tracks if track.get(feature) is not None]
+        if values:
+            averages[feature] = round(sum(values) / len(values), 4)
+    return averages
+
+
+def _top_genres(artists: List[dict]) -> List[str]:
+    """Genres of the artists, weighted by the rank of the artist."""
+    weights: Counter = Counter()
+    for rank, artist in enumerate(artists):
+        for genre in artist.get("genres", ()):
+            weights[genre] += len(artists) - rank
+    return [genre for genre, _ in weights.most_common(PROFILE_GENRES)]
+
+
+async def build_taste_profile(access_token: str, time_range: str) -> dict:
+    """
+    Compute the profile of a user from Spotify.
+
+    :param access_token: Spotify access token of the user.
+    :param time_range: Spotify time range of the top items.
+    :return: values of the profile, without its owner.
+    """
+    tracks = await spotify_manager.get_most_listened_tracks(
+        access_token,
+        limit=TOP_ITEMS,
+        time_range=time_range,
+    )
+    artists = await spotify_manager.get_most_listened_artists(
+        access_token,
+        limit=TOP_ITEMS,
+        time_range=time_range,
+    )
+    track_ids = [track["id"] for track in tracks if track and track.get("id")]
+    audio_features = []
+    if track_ids:
+        audio_features = await get_spotify_client(access_token).audio_features(
+            tracks=track_ids
+        )
+    now = datetime.now(timezone.utc)
+    return {
+        "time_range": time_range,
+        "features": _average_features(audio_features),
+        "genres": _top_genres(artists),
+        "seed_tracks": track_ids[:SEEDS],
+        "seed_artists": [artist["id"] for artist in artists[:SEEDS]],
+        "tracks": len(track_ids),
+        "refreshed_at": now,
+        "expires_at": now + timedelta(seconds=settings.taste_profile_ttls[time_range]),
+    }
+
+
+async def refresh_taste_profiles(
+    session_factory: async_sessionmaker,
+    owner_id: str,
+    access_token: str,
+) -> None:
+    """
+    Compute the missing or expired profiles of a user.
+
+    Meant to run in the background: failures are only logged, and the
+    Spotify calls go through the background lane.
+
+    :param session_factory: sessions of the database.
+    :param owner_id: Spotify ID of the user.
+    :param access_token: Spotify access token of the user.
+    """
+    try:
+        async with session_factory() as session:
+            time_ranges = await TasteProfileDAO(session).get_expired_ranges(
+                owner_id,
+                list(settings.taste_profile_ttls),
+            )
+        for time_range in time_ranges:
+            with spotify_lane(BACKGROUND):
+                profile = await build_taste_profile(access_token, time_range)
+            async with session_factory() as session:
+                await TasteProfileDAO(session).upsert({"owner_id": owner_id, **profile})
+            stats.refreshed += 1
+            logger.info(f"Refreshed the {time_range} taste profile of {owner_id}")
+    except Exception as e:
+        stats.failures += 1
+        logger.warning(f"Taste profile of {owner_id} not refreshed: {e}")
+
+
+@dataclass
+class TasteBlend:
+    """Audio features of a profile and the weight they get in a generation."""
+
+    features: Dict[str, float]
+    weight: float
+
+
+_taste_blend: ContextVar[Optional[TasteBlend]] = ContextVar("taste_blend", default=None)
+
+
+async def load_taste_blend(
+    session: AsyncSession,
+    owner_id: str,
+    weight: Optional[float],
+) -> Optional[TasteBlend]:
+    """
+    Read the profile to blend into a generation.
+
+    :param session: session of the database.
+    :param owner_id: Spotify ID of the user.
+    :param weight: weight of the profile from the request, the default if None.
+    :return: the blend, None if disabled or the user has no profile yet.
+    """
+    if weight is None:
+        weight = settings.taste_profile_blend
+    weight = min(max(weight, 0.0), 1.0)
+    if not weight:
+        return None
+    profile = await TasteProfileDAO(session).get(
+        owner_id, settings.taste_profile_time_range
+    )
+    if profile is None or not profile.features:
+        stats.missing += 1
+        return None
+    stats.blended += 1
+    return TasteBlend(features=dict(profile.features), weight=weight)
+
+
+@contextmanager
+def taste_blend(blend: Optional[TasteBlend]) -> Iterator[None]:
+    """
+    Blend a profile into the recommendations made in this context.
+
+    :param blend: profile and weight, None to blend nothing.
+    :yields: nothing.
+    """
+    token = _taste_blend.set(blend)
+    try:
+        yield
+    finally:
+        _taste_blend.reset(token)
+
+
+def blend_params(param_dict: dict) -> dict:
+    """
+    Move the target audio features toward the profile of the current context.
+
+    Only the features the model targets are moved, with or without the
+    ``target_`` prefix of the Spotify API.
+
+    :param param_dict: target audio features of the model.
+    :return: blended targets.
+    """
+    blend = _taste_blend.get()
+    if blend is None:
+        return param_dict
+    blended = dict(param_dict)
+    for feature, value in blend.features.items():
+        for name in (f"target_{feature}", feature):
+            target = param_dict.get(name)
+            if isinstance(target, (int, float)) and not isinstance(target, bool):
+                blended[name] = round(
+                    (1 - blend.weight) * target + blend.weight * value, 4
+                )
+    return blended
@@ -1,6 +1,7 @@
 import enum
 from pathlib import Path
 from tempfile import gettempdir
+from typing import Any, Dict, Optional
 
 from pydantic import BaseSettings
 from yarl import URL
@@ -19,6 +20,35 @@ class LogLevel(str, enum.Enum):  # noqa: WPS600
     FATAL = "FATAL"
 
 
+class SchemaStartupMode(str, enum.Enum):  # noqa: WPS600
+    """What the workers do with the database schema on startup."""
+
+    # Only check that the database is at the latest migration.
+    VERIFY = "verify"
+    # Create missing tables from the models (local development only).
+    CREATE = "create"
+    # Don't touch the schema at all.
+    SKIP = "skip"
+
+
+class RecommendationEngine(str, enum.Enum):  # noqa: WPS600
+    """Where the tracks of a playlist are recommended from."""
+
+    # Spotify's recommendations endpoint, the local index when it's down.
+    SPOTIFY = "spotify"
+    # The local track index, Spotify when it can't fill the playlist.
+    LOCAL = "local"
+
+
+class GenreModelBackend(str, enum.Enum):  # noqa: WPS600
+    """Inference backends of the Moodika genre model."""
+
+    TORCH = "torch"
+    ONNX = "onnx"
+    # ONNX graph with dynamically quantized int8 weights.
+    ONNX_INT8 = "onnx_int8"
+
+
 class Settings(BaseSettings):
     """
     Application settings.
@@ -34,6 +64,193 @@ class Settings(BaseSettings):
     # Enable uvicorn reloading
     reload: bool = False
 
+    # Preload recommendation models in the background after startup.
+    # When disabled, each model is loaded on its first request.
+    models_warmup: bool = True
+    # CPUs the application may use on this host, split between the uvicorn
+    # workers. Defaults to what the container actually gets (cgroup quota,
+    # CPU affinity). The thread counts below are derived from each worker's
+    # share unless set (see backend/services/resources.py):
+    # inference_workers - inferences running at the same time,
+    # inference_threads - threads one inference may use (torch, onnxruntime),
+    # default_executor_workers - threads of the event loop's default executor.
+    cpu_budget: Optional[float] = None
+    inference_workers: Optional[int] = None
+    inference_threads: Optional[int] = None
+    default_executor_workers: Optional[int] = None
+    # Backend of the Moodika genre model. The ONNX ones need the "onnx" extra
+    # and a model exported to genre_model_dir with
+    # python -m backend.services.recommendations_manager.recommendation_models.moodika.model_a.genre_onnx export
+    genre_model_backend: GenreModelBackend = GenreModelBackend.TORCH
+    genre_model_dir: Path = TEMP_DIR / "moodika-genre-onnx"
+    # Prompts naming their genres ("jazz for rainy days") skip the genre model
+    # when the matched genres explain at least genre_lexicon_min_coverage of
+    # the meaningful words of the prompt.
+    genre_lexicon_enabled: bool = True
+    genre_lexicon_min_coverage: float = 0.5
+    recommendation_engine: RecommendationEngine = RecommendationEngine.SPOTIFY
+    # Audio features of the recommended tracks are fetched in the background
+    # and added to the local track index, saved to track_index_path on
+    # shutdown.
+    track_index_learn: bool = True
+    track_index_path: Path = TEMP_DIR / "backend-track-index.npz"
+    # Spotify recommendations are cached by seed genres and parameters rounded
+    # to recommendation_cache_buckets (width per audio feature, 0.1 for the
+    # ones not listed). Each entry keeps recommendation_cache_candidates
+    # tracks so smaller playlists are served from it.
+    recommendation_cache_enabled: bool = True
+    recommendation_cache_size: int = 2048
+    recommendation_cache_ttl: float = 60 * 60
+    recommendation_cache_candidates: int = 100
+    recommendation_cache_buckets: Dict[str, float] = {
+        "acousticness": 0.1,
+        "danceability": 0.1,
+        "energy": 0.1,
+        "instrumentalness": 0.1,
+        "liveness": 0.1,
+        "loudness": 3.0,
+        "speechiness": 0.1,
+        "tempo": 10.0,
+        "valence": 0.1,
+        "popularity": 10.0,
+    }
+    # Playlists over 100 tracks or 5 genres are recommended by several
+    # concurrent calls, over groups of genres and targets jittered by
+    # recommendation_fanout_jitter of each feature's range, asking for
+    # recommendation_fanout_overfetch times the tracks to make up for
+    # duplicates, and at most recommendation_fanout_max_calls calls.
+    recommendation_fanout_max_calls: int = 10
+    recommendation_fanout_overfetch: float = 1.5
+    recommendation_fanout_jitter: float = 0.05
+    # Prompts similar to a recent one (cosine similarity of their hashed word
+    # embeddings above prompt_cache_similarity) reuse its genres and audio
+    # features instead of searching Spotify again. Entries expire after
+    # prompt_cache_ttl seconds.
+    prompt_cache_enabled: bool = True
+    prompt_cache_size: int = 1024
+    prompt_cache_similarity: float = 0.9
+    prompt_cache_ttl: float = 6 * 60 * 60
+    # The prompt_warmup_size most frequent prompts of the last
+    # prompt_warmup_window_days days (used at least prompt_warmup_min_uses
+    # times) are precomputed with the application's Spotify token every
+    # prompt_warmup_interval seconds, by one process at a time. The processes
+    # generating playlists reload them every prompt_warmup_reload_interval.
+    prompt_warmup_enabled: bool = True
+    prompt_warmup_size: int = 50
+    prompt_warmup_window_days: int = 30
+    prompt_warmup_min_uses: int = 3
+    prompt_warmup_interval: float = 6 * 60 * 60
+    prompt_warmup_reload_interval: float = 5 * 60
+    # Taste profiles of the users (average audio features of their top
+    # tracks, top genres and seeds) are computed after login for each time
+    # range of taste_profile_ttls, once per TTL in seconds. Generations move
+    # their targets toward the taste_profile_time_range profile by
+    # taste_profile_blend (0 to 1), unless their config sets taste_blend.
+    # Needs the user-top-read scope.
+    taste_profile_enabled: bool = True
+    taste_profile_ttls: Dict[str, float] = {
+        "short_term": 24 * 60 * 60,
+        "medium_term": 7 * 24 * 60 * 60,
+        "long_term": 30 * 24 * 60 * 60,
+    }
+    taste_profile_time_range: str = "medium_term"
+    taste_profile_blend: float = 0.0
+    # Unix socket of the model server (python -m backend.model_server). When
+    # set, workers score genres through it instead of loading the model.
+    model_server_socket: Optional[Path] = None
+    model_server_timeout: float = 10.0
+    # The server scores up to model_server_max_batch (text, genre) pairs at
+    # once, waiting up to model_server_batch_wait seconds to fill a batch.
+    model_server_max_batch: int = 512
+    model_server_batch_wait: float = 0.005
+    # With the generation queue, the web workers queue the generations in
+    # the database and standalone workers (python -m backend.worker) run
+    # them, worker_concurrency at a time each. Requests wait up to
+    # generation_queue_wait seconds for their job. A running job is run
+    # again elsewhere if its worker stops renewing it for
+    # generation_job_visibility_timeout seconds, up to
+    # generation_job_max_attempts runs; failed runs are retried after
+    # generation_job_retry_delay seconds (times the attempts). Waiting
+    # sides are woken up by LISTEN/NOTIFY and poll the queue every
+    # generation_queue_poll_interval seconds in case they miss one.
+    generation_queue_enabled: bool = False
+    generation_queue_wait: float = 120.0
+    generation_queue_poll_interval: float = 5.0
+    generation_job_visibility_timeout: float = 60.0
+    generation_job_max_attempts: int = 3
+    generation_job_retry_delay: float = 5.0
+    worker_concurrency: int = 8
+    # Seconds a stopping worker lets its running jobs finish.
+    worker_shutdown_timeout: float = 30.0
+    # Admission control of /playlists/generate, per web worker: at most
+    # generation_max_in_flight generations run at once, and
+    # generation_user_max_in_flight per user. Users get
+    # generation_user_rate generations per minute, with bursts of
+    # generation_user_burst. Rejected requests get a 429 with Retry-After.
+    generation_admission_enabled: bool = True
+    generation_max_in_flight: int = 64
+    generation_user_max_in_flight: int = 2
+    generation_user_rate: float = 6.0
+    generation_user_burst: int = 3
+    # Retries of a generation (same Idempotency-Key header) wait for the
+    # running one, and get its playlist for generation_idempotency_ttl
+    # seconds after it finished. With generation_derive_idempotency_key,
+    # requests without the header get a key from their prompt and config,
+    # so identical requests of a user within the ttl make one playlist.
+    generation_idempotency_ttl: float = 60.0
+    generation_derive_idempotency_key: bool = False
+    # The catalog endpoints (genres, models) are encoded once per worker
+    # and cached by clients for catalog_max_age seconds, then revalidated
+    # with their ETag. Their callers are looked up like on the other
+    # endpoints; without catalog_verify_user, only the signature of the
+    # session token is checked, saving a database query per request.
+    catalog_max_age: int = 60 * 60
+    catalog_verify_user: bool = True
+    # Per-model configuration, as JSON keyed by model name. Overrides the limits
+    # of a model (max_concurrency, queue_timeout, timeout, failure_threshold,
+    # recovery_timeout), disables it ({"enabled": false}) or declares a new one.
+    # Models can also be declared by plugins through the
+    # "backend.recommender_models" entry point group.
+    recommender_models: Dict[str, Dict[str, Any]] = {}
+
+    # Calls to external services (Spotify, OpenAI) are retried with jittered
+    # exponential backoff starting at retry_base_delay seconds. Retry-After
+    # delays longer than retry_max_delay make the call fail fast instead.
+    retry_base_delay: float = 0.25
+    retry_max_delay: float = 8.0
+    # Consecutive failures that open the circuit of an external endpoint,
+    # and seconds it stays open.
+    breaker_failure_threshold: int = 5
+    breaker_recovery_timeout: float = 30.0
+
+    spotify_timeout: float = 5.0
+    spotify_max_attempts: int = 3
+    # Idempotent Spotify reads slower than this (in seconds) are hedged
+    # with a second identical request. 0 disables hedging.
+    spotify_hedge_delay: float = 0.75
+    # All the users share one Spotify app, so outbound calls of every worker
+    # go through a token bucket: spotify_rate_limit calls per second with
+    # bursts of spotify_rate_burst. The rate is halved on 429 responses and
+    # recovers over spotify_rate_recovery seconds. Calls that would wait more
+    # than spotify_rate_max_wait seconds for a token fail fast. The bucket is
+    # shared by the workers through spotify_rate_state_file (in memory if unset).
+    spotify_rate_limit: float = 10.0
+    spotify_rate_burst: int = 20
+    spotify_rate_min: float = 1.0
+    spotify_rate_recovery: float = 60.0
+    spotify_rate_max_wait: float = 10.0
+    spotify_rate_state_file: Optional[Path] = TEMP_DIR / "backend-spotify-rate.json"
+    # Keep-alive connection pool shared by all the Spotify clients of a worker.
+    # Requests beyond spotify_pool_max_connections wait for a free connection,
+    # spotify_pool_maxsize idle connections are kept alive for
+    # spotify_pool_keepalive_expiry seconds.
+    spotify_pool_max_connections: int = 200
+    spotify_pool_maxsize: int = 32
+    spotify_pool_keepalive_expiry: float = 60.0
+
+    openai_timeout: float = 30.0
+    openai_max_attempts: int = 2
+
     # Current environment
     environment: str = "dev"
 
@@ -45,6 +262,9 @@ class Settings(BaseSettings):
     db_pass: str = "backend"
     db_base: str = "backend"
     db_echo: bool = False
+    # Schema handling on worker startup.
+    # Migrations are applied with `python -m backend.db.migrate`.
+    db_startup_mode: SchemaStartupMode = SchemaStartupMode.VERIFY
 
     @property
     def db_url(self) -> URL:
@@ -0,0 +1,128 @@
+import asyncio
+from typing import Optional
+
+import pytest
+
+from backend.services.resilience import AdmissionController, TooManyRequestsError
+
+
+class Work:
+    """Run function blocking until released, counting its starts."""
+
+    def __init__(self) -> None:
+        self.started = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self) -> int:
+        self.started += 1
+        number = self.started
+        await self.release.wait()
+        return number
+
+
+def _controller(
+    max_in_flight: int = 10,
+    client_max_in_flight: int = 10,
+    client_burst: int = 10,
+    retention: float = 60,
+) -> AdmissionController:
+    return AdmissionController(
+        "test",
+        max_in_flight=max_in_flight,
+        client_max_in_flight=client_max_in_flight,
+        client_rate=0.001,
+        client_burst=client_burst,
+        retention=retention,
+    )
+
+
+async def _start(
+    controller: AdmissionController,
+    client: str,
+    work: Work,
+    key: Optional[str] = None,
+) -> "asyncio.Task[int]":
+    task = asyncio.ensure_future(controller.run(client, key, work))
+    await asyncio.sleep(0)
+    return task
+
+
+@pytest.mark.anyio
+async def test_limits_reject_with_retry_after() -> None:
+    """Requests beyond the overall or per client limits get a 429."""
+    controller = _controller(max_in_flight=3, client_max_in_flight=1)
+    work = Work()
+    running = [await _start(controller, client, work) for client in ("a", "b")]
+
+    with pytest.raises(TooManyRequestsError) as error:
+        await controller.run("a", None, work)
+    assert error.value.retry_after > 0
+    running.append(await _start(controller, "c", work))
+    with pytest.raises(TooManyRequestsError):
+        await controller.run("d", None, work)
+
+    work.release.set()
+    assert await asyncio.gather(*running) == [1, 2, 3]
+    assert controller.snapshot()["rejected"] == {"client_in_flight": 1, "in_flight": 1}
+    assert await controller.run("a", None, work) == 4
+
+
+@pytest.mark.anyio
+async def test_client_rate_is_limited() -> None:
+    """A client can't start more than its burst of requests at once."""
+    controller = _controller(client_burst=2)
+    work = Work()
+    work.release.set()
+
+    assert await controller.run("a", None, work) == 1
+    assert await controller.run("a", None, work) == 2
+    with pytest.raises(TooManyRequestsError):
+        await controller.run("a", None, work)
+    assert await controller.run("b", None, work) == 3
+    assert controller.snapshot()["rejected"] == {"client_rate": 1}
+
+
+@pytest.mark.anyio
+async def test_retries_attach_to_their_running_twin() -> None:
+    """A request with the key of a running one waits for it, whatever the limits."""
+    controller = _controller(client_max_in_flight=1)
+    work = Work()
+    first = await _start(controller, "a", work, key="key")
+    retry = await _start(controller, "a", work, key="key")
+
+    work.release.set()
+
+    assert await asyncio.gather(first, retry) == [1, 1]
+    assert work.started == 1
+    assert controller.snapshot()["attached"] == 1
+
+
+@pytest.mark.anyio
+async def test_finished_runs_are_replayed() -> None:
+    """Retries within the retention get the result, unless it isn't retained."""
+    controller = _controller()
+    work = Work()
+    work.release.set()
+
+    assert await controller.run("a", "key", work) == 1
+    assert await controller.run("a", "key", work) == 1
+    assert await controller.run("b", "key", work) == 2
+    assert await controller.run("a", "other", work, retain=False) == 3
+    assert await controller.run("a", "other", work, retain=False) == 4
+    assert controller.snapshot()["replayed"] == 1
+
+
+@pytest.mark.anyio
+async def test_runs_survive_their_request() -> None:
+    """A cancelled request leaves its run going, for the retry to attach to."""
+    controller = _controller()
+    work = Work()
+    request = await _start(controller, "a", work, key="key")
+
+    request.cancel()
+    await asyncio.sleep(0)
+    retry = await _start(controller, "a", work, key="key")
+    work.release.set()
+
+    assert await retry == 1
+    assert work.started == 1
@@ -0,0 +1,53 @@
+from typing import Optional
+
+from starlette.requests import Request
+
+from backend.web.cached_response import CachedJSON
+
+GENRES = ["jazz", "k-pop", "rainy-day"]
+
+
+def _request(if_none_match: Optional[str] = None) -> Request:
+    headers = []
+    if if_none_match is not None:
+        headers.append((b"if-none-match", if_none_match.encode()))
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+
+def test_body_is_encoded_once_with_a_strong_etag() -> None:
+    """The body is the JSON of the content, the ETag its hash."""
+    cached = CachedJSON(GENRES, max_age=60)
+
+    response = cached.response(_request())
+
+    assert response.status_code == 200
+    assert response.body == b'["jazz","k-pop","rainy-day"]'
+    assert response.headers["etag"] == cached.etag
+    assert response.headers["cache-control"] == "private, max-age=60, must-revalidate"
+    assert CachedJSON(list(GENRES), max_age=60).etag == cached.etag
+    assert CachedJSON(GENRES[:2], max_age=60).etag != cached.etag
+
+
+def test_matching_etags_get_an_empty_304() -> None:
+    """Clients sending the ETag back, even weak or in a list, get a 304."""
+    cached = CachedJSON(GENRES, max_age=60)
+
+    for if_none_match in (
+        cached.etag,
+        f"W/{cached.etag}",
+        f'"other", {cached.etag}',
+        "*",
+    ):
+        response = cached.response(_request(if_none_match))
+        assert response.status_code == 304, if_none_match
+        assert response.body == b""
+        assert response.headers["etag"] == cached.etag
+
+
+def test_other_etags_get_the_body() -> None:
+    """Stale or missing ETags get the full response."""
+    cached = CachedJSON(GENRES, max_age=60)
+
+    assert not cached.matches(_request())
+    assert not cached.matches(_request('"stale"'))
+    assert cached.response(_request('"stale"')).status_code == 200
@@ -0,0 +1,86 @@
+import uuid
+from datetime import datetime, timezone
+from typing import AsyncGenerator, Dict, Tuple
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from backend.db.dao.playlist_dao import PlaylistDAO
+from backend.db.dao.roundtrip_benchmark import PATHS, WRITES, StatementCounter
+from backend.db.dao.user_dao import UserDAO
+from backend.db.models.playlist import Playlist
+
+
+@pytest.fixture
+async def counter(_engine: AsyncEngine) -> AsyncGenerator[StatementCounter, None]:
+    """
+    Count the statements sent during a test.
+
+    :param _engine: current engine.
+    :yield: statement counter.
+    """
+    counter = StatementCounter(_engine)
+    try:
+        yield counter
+    finally:
+        counter.remove()
+
+
+@pytest.mark.anyio
+async def test_dao_writes_take_a_single_statement(
+    dbsession: AsyncSession,
+    counter: StatementCounter,
+) -> None:
+    """Each DAO write is one statement, where the ORM calls it replaced took more."""
+    statements: Dict[Tuple[str, str], int] = {}
+    for path in PATHS:
+        spotify_id = f"test-{path}-{uuid.uuid4().hex[:8]}"
+        for name, before, dao_write in WRITES:
+            write = before if path == "before" else dao_write
+            counter.take()
+            await write(dbsession, spotify_id)
+            # Committed like the session of a request.
+            await dbsession.commit()
+            statements[(name, path)] = counter.take()[0]
+
+    for name, _, _ in WRITES:
+        assert statements[(name, "dao")] == 1, name
+        assert statements[(name, "before")] > 1, name
+
+
+@pytest.mark.anyio
+async def test_delete_by_id_deletes_a_single_playlist(dbsession: AsyncSession) -> None:
+    """Playlist IDs aren't unique, delete_by_id only deletes the first match."""
+    now = datetime.now(timezone.utc)
+    owner_id = f"test-{uuid.uuid4().hex[:8]}"
+    await UserDAO(dbsession).create(
+        id=uuid.uuid4().hex[:20],
+        spotify_id=owner_id,
+        spotify_token="token",
+        spotify_refresh_token="refresh-token",
+        spotify_token_created_at=now,
+        email="test@example.com",
+        username="test",
+        register_date=now,
+    )
+    dao = PlaylistDAO(dbsession)
+    for index in range(2):
+        await dao.create(
+            prompt="jazz for rainy days",
+            id="shared-id",
+            spotify_id=f"{owner_id}-{index}",
+            model="Moodika-Model-A",
+            genres=str(["jazz"]),
+            num_songs=20,
+            popularity=50,
+            owner_id=owner_id,
+            created_at=now,
+        )
+
+    assert await dao.delete_by_id("shared-id")
+
+    remaining = await dbsession.scalars(
+        select(Playlist.spotify_id).where(Playlist.id == "shared-id"),
+    )
+    assert len(remaining.all()) == 1
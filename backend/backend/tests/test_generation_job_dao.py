@@ -0,0 +1,67 @@
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.db.dao.generation_job_dao import GenerationJobDAO
+from backend.db.dao.user_dao import UserDAO
+
+
+async def _create_user(dbsession: AsyncSession) -> str:
+    now = datetime.now(timezone.utc)
+    spotify_id = f"test-{uuid.uuid4().hex[:8]}"
+    await UserDAO(dbsession).create(
+        id=uuid.uuid4().hex[:20],
+        spotify_id=spotify_id,
+        spotify_token="token",
+        spotify_refresh_token="refresh-token",
+        spotify_token_created_at=now,
+        email="test@example.com",
+        username="test",
+        register_date=now,
+    )
+    return spotify_id
+
+
+async def _enqueue(dao: GenerationJobDAO, owner_id: str) -> str:
+    job_id = str(uuid.uuid4())
+    await dao.enqueue(
+        id=job_id,
+        prompt="jazz for rainy days",
+        config={"num_songs": 20},
+        context={},
+        owner_id=owner_id,
+        max_attempts=3,
+    )
+    return job_id
+
+
+@pytest.mark.anyio
+async def test_retries_keep_the_recorded_playlist(dbsession: AsyncSession) -> None:
+    """The playlist of an attempt is kept on the job for the next ones."""
+    dao = GenerationJobDAO(dbsession)
+    job_id = await _enqueue(dao, await _create_user(dbsession))
+    job = await dao.claim("worker-1", visibility_timeout=60)
+    assert job is not None and job.id == job_id
+
+    assert not await dao.record_playlist(job_id, "worker-2", "other")
+    assert await dao.record_playlist(job_id, "worker-1", "playlist")
+    await dao.fail(job_id, "worker-1", "Spotify unavailable", retry_in=0)
+
+    # Workers claim the jobs in sessions of their own.
+    dbsession.expunge_all()
+    retried = await dao.claim("worker-2", visibility_timeout=60)
+    assert retried is not None
+    assert (retried.attempts, retried.playlist_id) == (2, "playlist")
+
+
+@pytest.mark.anyio
+async def test_deleting_a_user_deletes_their_jobs(dbsession: AsyncSession) -> None:
+    """Jobs don't keep their owner from being deleted."""
+    owner_id = await _create_user(dbsession)
+    dao = GenerationJobDAO(dbsession)
+    job_id = await _enqueue(dao, owner_id)
+
+    assert await UserDAO(dbsession).delete(owner_id)
+    assert await dao.get(job_id) is None
@@ -0,0 +1,61 @@
+from backend.services.recommendations_manager.recommendation_models.moodika.model_a.genre_lexicon import (
+    ALIASES,
+    MAX_GENRES,
+    GenreLexicon,
+    lexicon_stats,
+    match_genres,
+    tokenize,
+)
+
+GENRES = ("chill", "jazz", "k-pop", "pop", "rainy-day", "rock", "rock-n-roll", "sad")
+
+
+def test_tokenize_splits_hyphens_and_stems() -> None:
+    """Genre names and prompts are split and stemmed the same way."""
+    assert tokenize("Rainy-Days") == ["rainy", "day"]
+    assert tokenize("Studying, ballads & R&B") == ["study", "ballad", "&", "r&b"]
+
+
+def test_match_names_genres_in_order() -> None:
+    """Genres come in their order in the prompt, with the meaningful words covered."""
+    lexicon = GenreLexicon(GENRES, ALIASES)
+
+    assert lexicon.match("jazz for rainy days") == (["jazz", "rainy-day"], 1.0)
+    assert lexicon.match("k-pop and chillout") == (["k-pop", "chill"], 1.0)
+
+
+def test_match_prefers_the_longest_phrase() -> None:
+    """A phrase wins over the genres named by its first words."""
+    lexicon = GenreLexicon(GENRES, ALIASES)
+
+    genres, coverage = lexicon.match("rock and roll classics")
+
+    assert genres == ["rock-n-roll"]
+    assert coverage == 2 / 3
+
+
+def test_match_keeps_the_first_genres() -> None:
+    """At most MAX_GENRES genres are returned, each once."""
+    lexicon = GenreLexicon(GENRES, ALIASES)
+
+    genres, _ = lexicon.match("sad jazz, pop, rock, chill jazz and rainy")
+
+    assert genres == ["sad", "jazz", "pop", "rock", "chill"]
+    assert len(genres) == MAX_GENRES
+
+
+def test_match_genres_falls_back_below_coverage() -> None:
+    """Prompts the genres don't explain well enough go to the model."""
+    before = lexicon_stats.snapshot()
+
+    assert match_genres("jazz for rainy days", GENRES, min_coverage=0.6) == [
+        "jazz",
+        "rainy-day",
+    ]
+    assert match_genres("sad songs about my ex", GENRES, min_coverage=0.6) is None
+    assert match_genres("a mellow evening", GENRES, min_coverage=0.6) is None
+
+    after = lexicon_stats.snapshot()
+    assert after["hits"] - before["hits"] == 1
+    assert after["partial"] - before["partial"] == 1
+    assert after["misses"] - before["misses"] == 1
@@ -0,0 +1,146 @@
+import json
+from pathlib import Path
+from typing import List
+
+import numpy as np
+import pytest
+
+from backend.services.recommendations_manager.recommendation_models.moodika.model_a.genre_scorer import (
+    ONNX_INT8_MODEL_FILE,
+    ONNX_MODEL_FILE,
+    SCORER_CONFIG_FILE,
+    TOKENIZER_FILE,
+    GenrePairEncoder,
+    OnnxGenreScorer,
+    create_genre_scorer,
+    encode_pairs,
+    load_tokenizer,
+    score_genres,
+)
+from backend.settings import GenreModelBackend
+
+VOCAB = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "jazz", "rock", "for", "rainy", "days"]
+GENRES = ["jazz", "rock", "drum-and-bass"]
+PROMPT = "jazz for rainy days"
+
+
+def _write_tokenizer(path: Path) -> None:
+    tokenizers = pytest.importorskip("tokenizers")
+
+    tokenizer = tokenizers.Tokenizer(
+        tokenizers.models.WordPiece(
+            {token: index for index, token in enumerate(VOCAB)},
+            unk_token="[UNK]",
+        ),
+    )
+    tokenizer.pre_tokenizer = tokenizers.pre_tokenizers.BertPreTokenizer()
+    tokenizer.post_processor = tokenizers.processors.TemplateProcessing(
+        single="[CLS] $A [SEP]",
+        pair="[CLS] $A [SEP] $B:1 [SEP]:1",
+        special_tokens=[("[CLS]", 2), ("[SEP]", 3)],
+    )
+    tokenizer.save(str(path))
+
+
+def _write_model(path: Path, scale: float) -> None:
+    """Write a graph scoring a pair with the scaled sum of its token ids."""
+    onnx = pytest.importorskip("onnx")
+    pytest.importorskip("onnxruntime")
+    helper = onnx.helper
+
+    inputs = [
+        helper.make_tensor_value_info(name, onnx.TensorProto.INT64, ["batch", "seq"])
+        for name in ("input_ids", "attention_mask")
+    ]
+    nodes = [
+        helper.make_node("Mul", ["input_ids", "attention_mask"], ["masked"]),
+        helper.make_node("Cast", ["masked"], ["ids"], to=onnx.TensorProto.FLOAT),
+        helper.make_node("ReduceSum", ["ids", "axes"], ["total"], keepdims=1),
+        helper.make_node("Mul", ["total", "scale"], ["logits"]),
+    ]
+    initializers = [
+        helper.make_tensor("axes", onnx.TensorProto.INT64, [1], [1]),
+        helper.make_tensor("scale", onnx.TensorProto.FLOAT, [], [scale]),
+    ]
+    output = helper.make_tensor_value_info(
+        "logits",
+        onnx.TensorProto.FLOAT,
+        ["batch", 1],
+    )
+    graph = helper.make_graph(nodes, "genre-scorer", inputs, [output], initializers)
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8
+    onnx.save(model, str(path))
+
+
+def _export(model_dir: Path, activation: str, max_length: int = 32) -> Path:
+    _write_tokenizer(model_dir / TOKENIZER_FILE)
+    _write_model(model_dir / ONNX_MODEL_FILE, scale=0.01)
+    _write_model(model_dir / ONNX_INT8_MODEL_FILE, scale=0.02)
+    scorer_config = {"activation": activation, "max_length": max_length}
+    (model_dir / SCORER_CONFIG_FILE).write_text(json.dumps(scorer_config))
+    return model_dir
+
+
+def _token_sums(model_dir: Path, genres: List[str]) -> np.ndarray:
+    from tokenizers import Tokenizer  # noqa: WPS433
+
+    tokenizer = Tokenizer.from_file(str(model_dir / TOKENIZER_FILE))
+    encodings = tokenizer.encode_batch([(PROMPT, genre) for genre in genres])
+    return np.array([sum(enc.ids) for enc in encodings], dtype=np.float32)
+
+
+def test_onnx_scores_tokenized_pairs(tmp_path: Path) -> None:
+    """Pairs are tokenized like the torch model and the activation applied."""
+    model_dir = _export(tmp_path, activation="sigmoid")
+
+    scores = score_genres(OnnxGenreScorer(model_dir), PROMPT, GENRES)
+
+    expected = 1 / (1 + np.exp(-0.01 * _token_sums(model_dir, GENRES)))
+    np.testing.assert_allclose(scores, expected, rtol=1e-5)
+
+
+def test_int8_backend_runs_the_quantized_graph(tmp_path: Path) -> None:
+    """The int8 backend loads its own graph, and the logits are kept as is."""
+    model_dir = _export(tmp_path, activation="identity")
+
+    scorer = create_genre_scorer(GenreModelBackend.ONNX_INT8, model_dir)
+    scores = score_genres(scorer, PROMPT, GENRES)
+
+    expected = 0.02 * _token_sums(model_dir, GENRES)
+    np.testing.assert_allclose(scores, expected, rtol=1e-5)
+
+
+def test_missing_export_is_reported(tmp_path: Path) -> None:
+    """Selecting an ONNX backend before the export fails with the command to run."""
+    pytest.importorskip("onnxruntime")
+
+    with pytest.raises(FileNotFoundError, match="genre_onnx export"):
+        OnnxGenreScorer(tmp_path)
+
+
+def test_pair_encoder_matches_the_tokenizer(tmp_path: Path) -> None:
+    """Inputs built from the cached genre tokens are the tokenizer's ones."""
+    tokenizer, _ = load_tokenizer(_export(tmp_path, activation="sigmoid"))
+    encoder = GenrePairEncoder(tokenizer, max_length=32)
+    pairs = [[PROMPT, genre] for genre in GENRES] + [["rock", "jazz"]]
+
+    assert encoder.enabled
+    for _ in range(2):  # The second call reuses the cached tokens and buffers.
+        inputs = encoder.encode(pairs)
+        expected = encode_pairs(tokenizer, pairs)
+        assert inputs.keys() == expected.keys()
+        for name, value in expected.items():
+            np.testing.assert_array_equal(inputs[name], value)
+
+
+def test_pair_encoder_leaves_truncation_to_the_tokenizer(tmp_path: Path) -> None:
+    """Pairs longer than max_length aren't built by the encoder."""
+    model_dir = _export(tmp_path, activation="sigmoid", max_length=8)
+    tokenizer, _ = load_tokenizer(model_dir)
+    encoder = GenrePairEncoder(tokenizer, max_length=8)
+    pairs = [[f"{PROMPT} {PROMPT}", genre] for genre in GENRES]
+
+    assert encoder.encode(pairs) is None
+    scores = score_genres(OnnxGenreScorer(model_dir), pairs[0][0], GENRES)
+    assert scores.shape == (len(GENRES),)
@@ -0,0 +1,75 @@
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.db.dao.generation_job_dao import GenerationJobDAO
+from backend.db.dao.user_dao import UserDAO
+from backend.db.models.generation_job import QUEUED
+from backend.settings import settings
+from backend.web.api.playlists.schema import Config, PlaylistGenerationRequest
+from backend.web.api.playlists.views import _idempotency_key
+
+
+def _request(prompt: str) -> PlaylistGenerationRequest:
+    return PlaylistGenerationRequest(
+        prompt=prompt,
+        config=Config(model="Moodika-Model-A", num_songs=20),
+    )
+
+
+def test_only_the_header_is_a_key_by_default() -> None:
+    """Requests without the header are never deduplicated by default."""
+    assert _idempotency_key(_request("jazz"), "retry-1") == "retry-1"
+    assert _idempotency_key(_request("jazz"), None) is None
+
+
+def test_derived_keys_normalize_the_prompt(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Derived keys ignore case and spacing, not the config."""
+    monkeypatch.setattr(settings, "generation_derive_idempotency_key", True)
+
+    key = _idempotency_key(_request("Jazz for  rainy days"), None)
+
+    assert key is not None and key.startswith("derived-")
+    assert _idempotency_key(_request("jazz for rainy days"), None) == key
+    other_config = _request("jazz for rainy days")
+    other_config.config.num_songs = 30
+    assert _idempotency_key(other_config, None) != key
+    assert _idempotency_key(_request("jazz"), "retry-1") == "retry-1"
+
+
+@pytest.mark.anyio
+async def test_enqueue_keeps_the_existing_job(dbsession: AsyncSession) -> None:
+    """A retry finds the job of its key, until it failed."""
+    now = datetime.now(timezone.utc)
+    owner_id = f"test-{uuid.uuid4().hex[:8]}"
+    await UserDAO(dbsession).create(
+        id=uuid.uuid4().hex[:20],
+        spotify_id=owner_id,
+        spotify_token="token",
+        spotify_refresh_token="refresh-token",
+        spotify_token_created_at=now,
+        email="test@example.com",
+        username="test",
+        register_date=now,
+    )
+    dao = GenerationJobDAO(dbsession)
+    job = {
+        "id": str(uuid.uuid4()),
+        "prompt": "jazz for rainy days",
+        "config": {"num_songs": 20},
+        "context": {},
+        "owner_id": owner_id,
+        "max_attempts": 1,
+        "retention": 60,
+    }
+
+    assert await dao.enqueue(**job) is not None
+    assert await dao.enqueue(**job) is None
+
+    claimed = await dao.claim("worker", visibility_timeout=60)
+    assert claimed is not None and claimed.id == job["id"]
+    await dao.fail(job["id"], "worker", "Spotify unavailable")
+    queued = await dao.enqueue(**job)
+    assert queued is not None and queued.status == QUEUED
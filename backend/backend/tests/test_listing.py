@@ -0,0 +1,79 @@
+import json
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.db.dao.playlist_dao import LISTING_COLUMNS, PlaylistDAO
+from backend.db.dao.user_dao import UserDAO
+from backend.web.api.playlists.listing import (
+    listing_content,
+    listing_response,
+    parse_genres,
+)
+from backend.web.api.playlists.listing_benchmark import pydantic_response, sample_rows
+from backend.web.api.playlists.schema import ListPlaylistResponse
+
+PROMPTS = ("jazz for rainy days", "k-pop workout", "rainy sunday")
+
+
+def test_parsed_genres_are_shared() -> None:
+    """Each distinct genre list is parsed once."""
+    genres = parse_genres("['jazz', 'soul']")
+
+    assert genres == ("jazz", "soul")
+    assert parse_genres("['jazz', 'soul']") is genres
+
+
+@pytest.mark.anyio
+async def test_listing_matches_the_pydantic_response() -> None:
+    """The listing sends the JSON the pydantic models did."""
+    rows = sample_rows(25)
+
+    fast = json.loads(listing_response(rows).body)
+    slow = json.loads((await pydantic_response(rows)).body)
+
+    assert fast == slow
+
+
+@pytest.mark.anyio
+async def test_listing_of_the_dao_rows(dbsession: AsyncSession) -> None:
+    """The DAO selects LISTING_COLUMNS, enough for a valid listing."""
+    now = datetime.now(timezone.utc)
+    owner_id = f"test-{uuid.uuid4().hex[:8]}"
+    await UserDAO(dbsession).create(
+        id=uuid.uuid4().hex[:20],
+        spotify_id=owner_id,
+        spotify_token="token",
+        spotify_refresh_token="refresh-token",
+        spotify_token_created_at=now,
+        email="test@example.com",
+        username="test",
+        register_date=now,
+    )
+    dao = PlaylistDAO(dbsession)
+    for prompt in PROMPTS:
+        await dao.create(
+            prompt=prompt,
+            id=uuid.uuid4().hex[:20],
+            spotify_id=uuid.uuid4().hex,
+            model="Moodika-Model-A",
+            genres=str(["jazz", "rainy-day"]),
+            num_songs=20,
+            popularity=50,
+            owner_id=owner_id,
+            created_at=now,
+        )
+
+    page = await dao.get_page(owner_id=owner_id, max_results=2, page=1)
+    found = await dao.search(owner_id=owner_id, prompt="rainy")
+
+    assert list(page[0]._fields) == [column.key for column in LISTING_COLUMNS]
+    assert len(page) == 2
+    listing = ListPlaylistResponse.parse_obj(listing_content(found))
+    assert sorted(playlist.prompt for playlist in listing.playlists) == [
+        "jazz for rainy days",
+        "rainy sunday",
+    ]
+    assert list(listing.playlists[0].config.genres) == ["jazz", "rainy-day"]
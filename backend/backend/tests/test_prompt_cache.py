@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from backend.services.recommendations_manager.recommendation_models.moodika.model_a.prompt_cache import (
+    PromptCache,
+    embed_prompt,
+)
+
+GENRES = ["sad", "acoustic"]
+PARAMS = {"energy": 0.3, "valence": 0.2}
+
+
+def _cache(size: int = 4) -> PromptCache:
+    return PromptCache(size=size, threshold=0.8, ttl=60)
+
+
+def test_embedding_ignores_word_order_and_fillers() -> None:
+    """Prompts worded differently get the same embedding."""
+    embedding = embed_prompt("sad songs for a breakup")
+
+    np.testing.assert_allclose(embedding, embed_prompt("Breakup, sad music"))
+    assert np.linalg.norm(embedding) == pytest.approx(1.0)
+    assert embed_prompt("songs for the night") is None
+
+
+def test_embedding_keeps_typos_close() -> None:
+    """Character trigrams keep a misspelled word closer than another word."""
+    embedding = embed_prompt("breakup")
+
+    assert embedding @ embed_prompt("brekaup") > embedding @ embed_prompt("workout")
+
+
+def test_lookup_reuses_similar_prompts() -> None:
+    """A similar prompt with the same popularity reuses the parameters."""
+    cache = _cache()
+    cache.store("sad songs for a breakup", "50", GENRES, PARAMS, cost=2.0)
+
+    found = cache.lookup("breakup sad music", "50")
+
+    assert found is not None
+    assert (found.genres, found.params) == (GENRES, PARAMS)
+    assert cache.lookup("breakup sad music", "80") is None
+    assert cache.lookup("summer road trip", "50") is None
+    snapshot = cache.snapshot()
+    assert (snapshot["hits"], snapshot["misses"]) == (1, 2)
+    assert snapshot["saved_seconds"] == 2.0
+
+
+def test_expired_entries_are_not_reused() -> None:
+    """Entries older than the ttl are ignored and their slot reused."""
+    cache = _cache()
+    cache.store("sad songs for a breakup", "50", GENRES, PARAMS, cost=2.0)
+    cache.entries[0].created_at -= 120
+
+    assert cache.lookup("sad songs for a breakup", "50") is None
+    assert cache.snapshot()["entries"] == 0
+
+
+def test_least_recently_used_entry_is_evicted() -> None:
+    """A full cache evicts the entry used the longest time ago."""
+    cache = _cache(size=2)
+    cache.store("sad songs for a breakup", "50", GENRES, PARAMS, cost=1.0)
+    cache.store("summer road trip", "50", ["road-trip"], PARAMS, cost=1.0)
+    assert cache.lookup("sad breakup", "50") is not None
+
+    cache.store("jazz for rainy days", "50", ["jazz"], PARAMS, cost=1.0)
+
+    assert cache.lookup("summer road trip", "50") is None
+    assert cache.lookup("sad breakup", "50") is not None
+    assert cache.lookup("rainy day jazz", "50") is not None
+    assert cache.snapshot()["evictions"] == 1
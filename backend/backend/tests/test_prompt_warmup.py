@@ -0,0 +1,109 @@
+import time
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import AsyncIterator
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.db.dao.playlist_dao import PlaylistDAO
+from backend.db.dao.user_dao import UserDAO
+from backend.services.prompt_warmup import _popular_prompts, _valid_params
+from backend.services.recommendations_manager.recommendation_models.moodika.model_a.prompt_cache import (
+    CachedParams,
+    WarmPrompts,
+    normalize_prompt,
+)
+from backend.services.recommendations_manager.registry import MOODIKA_MODEL_A
+from backend.settings import settings
+
+# Wordings of the playlists mined, with their number of uses.
+PROMPTS = {
+    "Music for a workout": 2,
+    "workout   music": 2,
+    "jazz for rainy days": 1,
+}
+
+
+def _entry(prompt: str, popularity: int) -> CachedParams:
+    now = time.monotonic()
+    return CachedParams(
+        prompt=prompt,
+        genres=["work-out"],
+        params={"energy": 0.9},
+        popularity=popularity,
+        cost=1.0,
+        created_at=now,
+        used_at=now,
+    )
+
+
+def test_normalize_prompt_merges_wordings() -> None:
+    """Case, fillers and word order don't change the normalized prompt."""
+    assert normalize_prompt("Rainy  day jazz") == "jazz rainy"
+    assert normalize_prompt("jazz for rainy days") == "jazz rainy"
+    assert normalize_prompt("music for the") == ""
+
+
+def test_warm_prompts_lookup() -> None:
+    """Lookups match the normalized prompt and the popularity."""
+    warm_prompts = WarmPrompts()
+    warm_prompts.replace([_entry("workout music", 50)])
+
+    found = warm_prompts.lookup("Music for my workout", 50)
+
+    assert found is not None and found.params == {"energy": 0.9}
+    assert warm_prompts.lookup("workout music", 80) is None
+    snapshot = warm_prompts.snapshot()
+    assert (snapshot["entries"], snapshot["hits"], snapshot["misses"]) == (1, 1, 1)
+
+
+def test_only_finite_params_are_stored() -> None:
+    """Parameters averaged from nothing aren't kept."""
+    assert _valid_params({"energy": 0.9, "popularity": "50"})
+    assert not _valid_params({"energy": float("nan")})
+    assert not _valid_params({})
+    assert not _valid_params(None)
+
+
+@pytest.mark.anyio
+async def test_popular_prompts_merge_wordings(
+    dbsession: AsyncSession,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    """Wordings of a prompt are counted together, under the most used one."""
+    now = datetime.now(timezone.utc)
+    owner_id = f"test-{uuid.uuid4().hex[:8]}"
+    await UserDAO(dbsession).create(
+        id=uuid.uuid4().hex[:20],
+        spotify_id=owner_id,
+        spotify_token="token",
+        spotify_refresh_token="refresh-token",
+        spotify_token_created_at=now,
+        email="test@example.com",
+        username="test",
+        register_date=now,
+    )
+    dao = PlaylistDAO(dbsession)
+    for prompt, uses in PROMPTS.items():
+        for _ in range(uses):
+            await dao.create(
+                prompt=prompt,
+                id=uuid.uuid4().hex[:20],
+                spotify_id=uuid.uuid4().hex,
+                model=MOODIKA_MODEL_A.name,
+                genres=str(["work-out"]),
+                num_songs=20,
+                popularity=50,
+                owner_id=owner_id,
+                created_at=now,
+            )
+
+    @asynccontextmanager
+    async def _session() -> AsyncIterator[AsyncSession]:  # noqa: WPS430
+        yield dbsession
+
+    monkeypatch.setattr(settings, "prompt_warmup_min_uses", 2)
+
+    assert await _popular_prompts(_session) == [("music for a workout", 50, 4)]
@@ -0,0 +1,85 @@
+from backend.services.recommendations_manager.recommendation_cache import (
+    RecommendationCache,
+    quantize_params,
+)
+
+BUCKETS = {"energy": 0.2, "tempo": 10.0}
+TRACKS = ["a", "b", "c", "d"]
+
+
+def _cache(size: int = 2, ttl: float = 60) -> RecommendationCache:
+    return RecommendationCache(size=size, ttl=ttl, buckets=BUCKETS)
+
+
+def test_quantize_rounds_to_the_feature_bucket() -> None:
+    """Targets round to their feature's bucket, other values are kept."""
+    params = {
+        "target_energy": 0.83,
+        "max_tempo": 124.0,
+        "target_valence": 0.44,
+        "target_mode": True,
+        "market": "FR",
+        "min_popularity": None,
+    }
+
+    assert quantize_params(params, BUCKETS) == (
+        ("market", "FR"),
+        ("max_tempo", 120.0),
+        ("target_energy", 0.8),
+        ("target_mode", True),
+        ("target_valence", 0.4),
+    )
+
+
+def test_close_requests_share_a_key() -> None:
+    """Parameters in the same buckets and genres in any order share a key."""
+    cache = _cache()
+    key = cache.key({"target_energy": 0.81, "target_tempo": 118}, ["rock", "pop"])
+
+    assert (
+        cache.key({"target_tempo": 121, "target_energy": 0.79}, ["pop", "rock"]) == key
+    )
+    assert (
+        cache.key({"target_energy": 0.61, "target_tempo": 118}, ["pop", "rock"]) != key
+    )
+
+
+def test_get_slices_the_cached_tracks() -> None:
+    """Requests for up to the cached number of tracks are served from the cache."""
+    cache = _cache()
+    key = cache.key({"target_energy": 0.5}, ["jazz"])
+    cache.put(key, TRACKS)
+
+    assert cache.get(key, 2, "moodika") == ["a", "b"]
+    assert cache.get(key, 4, "moodika") == TRACKS
+    assert cache.get(key, 5, "moodika") is None
+    assert cache.snapshot()["models"]["moodika"] == {
+        "hits": 2,
+        "misses": 1,
+        "hit_ratio": 0.667,
+    }
+
+
+def test_expired_entries_are_dropped() -> None:
+    """Entries aren't served past their ttl."""
+    cache = _cache(ttl=-1)
+    key = cache.key({"target_energy": 0.5}, ["jazz"])
+    cache.put(key, TRACKS)
+
+    assert cache.get(key, 1, "moodika") is None
+    assert cache.snapshot()["entries"] == 0
+
+
+def test_least_recently_used_entry_is_evicted() -> None:
+    """A full cache evicts the entry used the longest time ago."""
+    cache = _cache(size=2)
+    keys = [cache.key({"target_energy": energy}, ["jazz"]) for energy in (0, 0.4, 0.8)]
+    cache.put(keys[0], TRACKS)
+    cache.put(keys[1], TRACKS)
+    assert cache.get(keys[0], 1, "moodika") == ["a"]
+
+    cache.put(keys[2], TRACKS)
+
+    assert cache.get(keys[1], 1, "moodika") is None
+    assert cache.get(keys[0], 1, "moodika") == ["a"]
+    assert cache.snapshot()["evictions"] == 1
@@ -0,0 +1,73 @@
+from typing import List
+
+import httpx
+import pytest
+
+from backend.services.resilience import ServiceGuard, ServiceUnavailableError
+from backend.services.spotify_manager.spotify_client import (
+    SpotifyError,
+    classify_spotify_error,
+)
+
+
+class FlakyCall:
+    """Coroutine function raising the given errors before succeeding."""
+
+    def __init__(self, *errors: Exception) -> None:
+        self.errors: List[Exception] = list(errors)
+        self.calls = 0
+
+    async def __call__(self) -> str:
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+@pytest.fixture
+def guard() -> ServiceGuard:
+    """
+    Guard retrying Spotify failures without waiting.
+
+    :return: service guard.
+    """
+    return ServiceGuard("spotify", classify_spotify_error, base_delay=0.0)
+
+
+@pytest.mark.anyio
+async def test_reads_are_retried_after_server_errors(guard: ServiceGuard) -> None:
+    """Idempotent calls are retried after any retryable failure."""
+    call = FlakyCall(SpotifyError(502, "Bad gateway"), httpx.ReadTimeout("slow"))
+
+    assert await guard.acall("search", call) == "ok"
+    assert call.calls == 3
+
+
+@pytest.mark.anyio
+async def test_writes_are_not_sent_twice(guard: ServiceGuard) -> None:
+    """Writes aren't retried once the request may have been processed."""
+    for error in (SpotifyError(502, "Bad gateway"), httpx.ReadTimeout("slow")):
+        call = FlakyCall(error)
+
+        with pytest.raises(ServiceUnavailableError):
+            await guard.acall("user_playlist_create", call, idempotent=False)
+        assert call.calls == 1
+
+
+@pytest.mark.anyio
+async def test_writes_are_retried_when_not_processed(guard: ServiceGuard) -> None:
+    """Writes are retried after connection errors and rate limits."""
+    call = FlakyCall(httpx.ConnectError("refused"), SpotifyError(429, "Slow down"))
+
+    assert await guard.acall("user_playlist_create", call, idempotent=False) == "ok"
+    assert call.calls == 3
+
+
+@pytest.mark.anyio
+async def test_client_errors_are_raised_as_is(guard: ServiceGuard) -> None:
+    """Client errors aren't retried nor wrapped."""
+    call = FlakyCall(SpotifyError(404, "Not found"))
+
+    with pytest.raises(SpotifyError):
+        await guard.acall("playlist_items", call)
+    assert call.calls == 1
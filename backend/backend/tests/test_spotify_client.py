@@ -0,0 +1,67 @@
+from typing import Any, List, Tuple
+
+import pytest
+
+from backend.services.spotify_manager.spotify_client import (
+    AsyncSpotify,
+    PlaylistRecord,
+    playlist_record,
+)
+
+TRACKS = [f"spotify:track:{index}" for index in range(150)]
+
+
+class RecordingSpotify(AsyncSpotify):
+    """Client answering every call itself, keeping what would be sent."""
+
+    def __init__(self) -> None:
+        super().__init__("token")
+        self.calls: List[Tuple[str, str, int]] = []
+
+    async def _call(self, endpoint: str, method: str, path: str, **kwargs) -> Any:
+        self.calls.append((method, path, len(kwargs["json"].get("uris", []))))
+        return {"id": "new"}
+
+
+async def _generate(sp: AsyncSpotify) -> str:
+    playlist = await sp.user_playlist_create("user", "jazz - Meloturle generated")
+    await sp.playlist_add_items(playlist["id"], TRACKS)
+    return playlist["id"]
+
+
+@pytest.mark.anyio
+async def test_created_playlist_is_recorded() -> None:
+    """The first run creates the playlist and saves its ID."""
+    sp = RecordingSpotify()
+    saved: List[str] = []
+
+    async def _save(playlist_id: str) -> None:  # noqa: WPS430
+        saved.append(playlist_id)
+
+    with playlist_record(PlaylistRecord(None, _save)) as record:
+        assert await _generate(sp) == "new"
+
+    assert record.playlist_id == "new"
+    assert saved == ["new"]
+    assert sp.calls == [
+        ("POST", "users/user/playlists", 0),
+        ("POST", "playlists/new/tracks", 100),
+        ("POST", "playlists/new/tracks", 50),
+    ]
+
+
+@pytest.mark.anyio
+async def test_retries_fill_the_recorded_playlist() -> None:
+    """A run given a playlist replaces its tracks instead of creating one."""
+    sp = RecordingSpotify()
+
+    async def _save(playlist_id: str) -> None:  # noqa: WPS430
+        raise AssertionError("No playlist should be created")
+
+    with playlist_record(PlaylistRecord("old", _save)):
+        assert await _generate(sp) == "old"
+
+    assert sp.calls == [
+        ("PUT", "playlists/old/tracks", 100),
+        ("POST", "playlists/old/tracks", 50),
+    ]
@@ -0,0 +1,93 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from backend.db.dao.taste_profile_dao import TasteProfileDAO
+from backend.db.dao.user_dao import UserDAO
+from backend.services.taste_profile import (
+    TasteBlend,
+    _average_features,
+    _top_genres,
+    blend_params,
+    load_taste_blend,
+    taste_blend,
+)
+from backend.settings import settings
+
+
+def test_average_features_skip_missing_tracks() -> None:
+    """Tracks without features don't count in the averages."""
+    audio_features = [
+        {"energy": 0.2, "tempo": 100.0, "key": 5},
+        None,
+        {"energy": 0.5, "tempo": None},
+    ]
+
+    assert _average_features(audio_features) == {"energy": 0.35, "tempo": 100.0}
+
+
+def test_top_genres_are_weighted_by_artist_rank() -> None:
+    """Genres of the first artists outweigh genres shared by later ones."""
+    artists = [
+        {"genres": ["jazz"]},
+        {"genres": ["rock", "blues"]},
+        {"genres": ["rock"]},
+        {},
+    ]
+
+    assert _top_genres(artists) == ["rock", "jazz", "blues"]
+
+
+def test_blend_params_moves_the_targets() -> None:
+    """Only the features the model targets move toward the profile."""
+    params = {"target_energy": 0.2, "valence": 0.8, "market": "FR"}
+    blend = TasteBlend(
+        features={"energy": 0.6, "valence": 0.4, "tempo": 90}, weight=0.5
+    )
+
+    with taste_blend(blend):
+        blended = blend_params(params)
+
+    assert blended == {"target_energy": 0.4, "valence": 0.6, "market": "FR"}
+    assert blend_params(params) is params
+
+
+@pytest.mark.anyio
+async def test_load_taste_blend(dbsession: AsyncSession) -> None:
+    """The profile is blended when the generation asks for it and it exists."""
+    now = datetime.now(timezone.utc)
+    owner_id = f"test-{uuid.uuid4().hex[:8]}"
+    await UserDAO(dbsession).create(
+        id=uuid.uuid4().hex[:20],
+        spotify_id=owner_id,
+        spotify_token="token",
+        spotify_refresh_token="refresh-token",
+        spotify_token_created_at=now,
+        email="test@example.com",
+        username="test",
+        register_date=now,
+    )
+    assert await load_taste_blend(dbsession, owner_id, 0.5) is None
+
+    await TasteProfileDAO(dbsession).upsert(
+        {
+            "owner_id": owner_id,
+            "time_range": settings.taste_profile_time_range,
+            "features": {"energy": 0.6},
+            "genres": ["jazz"],
+            "seed_tracks": [],
+            "seed_artists": [],
+            "tracks": 1,
+            "refreshed_at": now,
+            "expires_at": now + timedelta(days=1),
+        },
+    )
+
+    assert await load_taste_blend(dbsession, owner_id, 2.0) == TasteBlend(
+        features={"energy": 0.6},
+        weight=1.0,
+    )
+    assert await load_taste_blend(dbsession, owner_id, 0.0) is None
+    assert await load_taste_blend(dbsession, owner_id, None) is None
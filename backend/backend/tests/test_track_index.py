@@ -0,0 +1,95 @@
+from pathlib import Path
+from typing import Dict
+
+import numpy as np
+
+from backend.services.recommendations_manager.track_index import (
+    FEATURES,
+    INITIAL_CAPACITY,
+    INITIAL_GENRES,
+    TrackIndex,
+)
+
+
+def _track(uri: str, energy: float, **features: float) -> Dict[str, object]:
+    track: Dict[str, object] = {name: 0.5 for name in FEATURES}
+    track.update(uri=uri, energy=energy, loudness=-30.0, tempo=120.0, **features)
+    return track
+
+
+def _index() -> TrackIndex:
+    index = TrackIndex()
+    index.add(
+        [_track("calm", 0.1), _track("mid", 0.5), _track("loud", 0.9)],
+        genres=["rock"],
+    )
+    index.add([_track("jazzy", 0.2)], genres=["jazz"])
+    return index
+
+
+def test_add_skips_incomplete_tracks_and_merges_genres() -> None:
+    """Tracks without features are skipped, known tracks only gain genres."""
+    index = _index()
+    incomplete = _track("incomplete", 0.3)
+    incomplete["valence"] = None
+
+    added = index.add([None, {"energy": 0.2}, incomplete, _track("mid", 0.5)], ["pop"])
+
+    assert added == 0
+    assert len(index) == 4
+    assert index.query({"energy": 0.5}, ["pop"], k=5) == ["mid"]
+
+
+def test_query_returns_the_nearest_tracks_of_the_genres() -> None:
+    """Tracks come closest first, among the ones tagged with the genres."""
+    index = _index()
+
+    assert index.query({"target_energy": 0.8}, ["rock"], k=2) == ["loud", "mid"]
+    assert index.query({"energy": 0.12}, [], k=2) == ["calm", "jazzy"]
+    assert index.query({"energy": 0.12}, ["jazz", "rock"], k=10) == [
+        "calm",
+        "jazzy",
+        "mid",
+        "loud",
+    ]
+    assert index.query({"energy": 0.12}, ["metal"], k=2) == []
+    assert index.snapshot()["short_queries"] == 2
+
+
+def test_index_grows_past_its_initial_capacity() -> None:
+    """Rows and genre columns double when they run out."""
+    index = TrackIndex()
+    count = INITIAL_CAPACITY + 1
+    tracks = [_track(f"track-{row}", row / count) for row in range(count)]
+    genres = [f"genre-{column}" for column in range(INITIAL_GENRES + 1)]
+
+    assert index.add(tracks, genres) == count
+    assert len(index) == count
+    assert index.query({"energy": 1.0}, [genres[-1]], k=1) == [f"track-{count - 1}"]
+
+
+def test_save_and_load_round_trip(tmp_path: Path) -> None:
+    """A saved index loads with the same tracks, features and genres."""
+    index = _index()
+    path = tmp_path / "index" / "tracks.npz"
+
+    index.save(path)
+    loaded = TrackIndex.load(path)
+
+    assert loaded.uris == index.uris
+    np.testing.assert_array_equal(
+        loaded.vectors[: len(index)], index.vectors[: len(index)]
+    )
+    assert loaded.query({"energy": 0.12}, ["jazz"], k=2) == ["jazzy"]
+    assert list(tmp_path.glob("index/*.tmp")) == []
+
+
+def test_load_starts_empty_without_a_usable_file(tmp_path: Path) -> None:
+    """Missing, corrupted or outdated files give an empty index."""
+    corrupted = tmp_path / "corrupted.npz"
+    corrupted.write_bytes(b"not an npz file")
+    outdated = tmp_path / "outdated.npz"
+    np.savez(outdated, features=np.array(["energy"]), uris=np.array(["a"]))
+
+    for path in (tmp_path / "missing.npz", corrupted, outdated):
+        assert len(TrackIndex.load(path)) == 0
@@ -0,0 +1,70 @@
+from backend.services.recommendations_manager.track_recommendations import (
+    MAX_RECOMMENDATIONS,
+    merge_recommendations,
+    plan_recommendation_calls,
+    spotify_params,
+)
+from backend.settings import settings
+
+PARAMS = {"target_danceability": 0.5, "target_energy": 1.0, "market": "FR"}
+GENRES = [f"genre-{index}" for index in range(12)]
+
+
+def test_spotify_params_prefix_bare_features() -> None:
+    """Bare feature names become targets, without overriding given ones."""
+    params = {"energy": 0.4, "valence": 0.2, "target_valence": 0.3, "popularity": "50"}
+
+    assert spotify_params(params) == {
+        "target_energy": 0.4,
+        "target_valence": 0.3,
+        "popularity": "50",
+    }
+
+
+def test_small_requests_take_a_single_call() -> None:
+    """Up to 5 genres and 100 tracks, the request is sent as is."""
+    assert plan_recommendation_calls(PARAMS, GENRES[:5], 100) == [
+        (PARAMS, GENRES[:5], 100),
+    ]
+
+
+def test_genres_are_split_in_order() -> None:
+    """Genres are sent 5 at a time, keeping their order."""
+    calls = plan_recommendation_calls(PARAMS, GENRES, 100)
+
+    assert [genres for _, genres, _ in calls] == [
+        GENRES[:5],
+        GENRES[5:10],
+        GENRES[10:],
+    ]
+    assert all(params == PARAMS for params, _, _ in calls)
+    assert all(limit == MAX_RECOMMENDATIONS for _, _, limit in calls)
+
+
+def test_large_playlists_jitter_the_targets() -> None:
+    """Repeated calls over the same genres send different targets."""
+    calls = plan_recommendation_calls(PARAMS, GENRES[:1], 300)
+    targets = [
+        (params["target_danceability"], params["target_energy"])
+        for params, _, _ in calls
+    ]
+
+    assert len(calls) == 5
+    assert targets[:3] == [(0.5, 1.0), (0.45, 1.0), (0.55, 0.95)]
+    assert len(set(targets)) == len(targets)
+    assert all(params["market"] == "FR" for params, _, _ in calls)
+
+
+def test_calls_are_capped() -> None:
+    """No more than recommendation_fanout_max_calls calls are planned."""
+    calls = plan_recommendation_calls(PARAMS, GENRES, 10_000)
+
+    assert len(calls) == settings.recommendation_fanout_max_calls
+
+
+def test_merge_takes_tracks_by_rank() -> None:
+    """Tracks alternate between calls, once each, up to the limit."""
+    results = [["a", "b", "c"], ["d", "a"], [], ["e", "f", "g", "h"]]
+
+    assert merge_recommendations(results, 6) == ["a", "d", "e", "b", "f", "c"]
+    assert merge_recommendations([], 6) == []
@@ -2,7 +2,7 @@ import base64
 import os
 import uuid
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Optional, Union
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import APIKeyHeader
@@ -13,7 +13,9 @@ from loguru import logger
 
 from backend.db.dao.user_dao import UserDAO
 from backend.db.models.user import User
+from backend.services.resilience import ServiceUnavailableError
 from backend.services.spotify_manager.spotify_manager import spotify_manager
+from backend.settings import settings
 
 SECRET_KEY = os.getenv(
     "BACKEND_SECRET_KEY",
@@ -68,6 +70,26 @@ async def get_token_payload(session_token: str = Depends(COOKIE)) -> dict:
         raise credentials_exception
 
 
+async def verify_session_token(session_token: str = Depends(COOKIE)) -> dict:
+    """
+    Check the signature of the session token, without reading the user.
+
+    For endpoints answering the same data to every user, where a database
+    query per request would cost more than the response.
+
+    :param session_token: Session token used for authentication.
+    :return: payload of the token.
+    """
+    try:
+        return await get_token_payload(session_token)
+    except BearAuthException:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate bearer token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+
 async def get_current_user(
     user_dao: UserDAO = Depends(),
     session_token: str = Depends(COOKIE),
@@ -161,6 +183,8 @@ async def get_current_user_sp(
             )
             logger.info(f"User with id {user_id} has a new Spotify access token")
 
+        except ServiceUnavailableError:
+            raise
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -170,6 +194,14 @@ async def get_current_user_sp(
     return user
 
 
+# Authentication of the catalog endpoints (genres, models): the user, or
+# only the payload of their session token without catalog_verify_user.
+CatalogUser = Union[User, dict]
+get_catalog_user = (
+    get_current_user if settings.catalog_verify_user else verify_session_token
+)
+
+
 def spotify_access_token_valid(since_time: datetime) -> bool:
     """
     Check if an hour has passed since the given time.
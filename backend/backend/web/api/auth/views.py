@@ -3,13 +3,16 @@ from datetime import datetime, timezone
 from pathlib import Path
 
 from dotenv import load_dotenv
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
 from fastapi.responses import RedirectResponse
 from loguru import logger
 from starlette.requests import Request
 
 from backend.db.dao.user_dao import DatabaseError, UserDAO
+from backend.services.resilience import ServiceUnavailableError
 from backend.services.spotify_manager.spotify_manager import spotify_sso
+from backend.services.taste_profile import refresh_taste_profiles
+from backend.settings import settings
 from backend.web.api.auth.auth_utils import (
     SESSION_COOKIE_NAME,
     create_access_token,
@@ -40,8 +43,17 @@ async def spotify_login():
 
 
 @router.get("/callback")
-async def spotify_callback(request: Request, user_dao: UserDAO = Depends()):
-    """Process login response from Spotify and return user info"""
+async def spotify_callback(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    user_dao: UserDAO = Depends(),
+):
+    """
+    Process login response from Spotify and return user info.
+
+    The taste profiles of the user are refreshed after the response, if
+    they expired.
+    """
 
     try:
         spotify_token_created_at = datetime.now(timezone.utc)
@@ -101,9 +113,19 @@ async def spotify_callback(request: Request, user_dao: UserDAO = Depends()):
             status_code=status.HTTP_302_FOUND,
         )
         response.set_cookie(SESSION_COOKIE_NAME, access_token)
+        if settings.taste_profile_enabled:
+            # With its own session, the request's one is closed by then.
+            background_tasks.add_task(
+                refresh_taste_profiles,
+                request.app.state.db_session_factory,
+                user_stored.spotify_id,
+                user_stored.spotify_token,
+            )
 
         return response
 
+    except ServiceUnavailableError:
+        raise
     except DatabaseError as e:
         logger.error(f"An unexpected error occurred: {e}")
         raise HTTPException(
@@ -1,26 +1,31 @@
-from fastapi import APIRouter, Depends, HTTPException
-from loguru import logger
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import Response
 
-from backend.db.models.user import User
 from backend.services.recommendations_manager.recommendation_models.moodika.model_a.config import (
     genres,
 )
-from backend.web.api.auth.auth_utils import get_current_user
+from backend.settings import settings
+from backend.web.api.auth.auth_utils import CatalogUser, get_catalog_user
+from backend.web.cached_response import CachedJSON
 
 router = APIRouter()
 
+# The genres only change on deploy, encoded once when the worker starts.
+genres_response = CachedJSON(genres, max_age=settings.catalog_max_age)
+
 
 @router.get("/")
-async def get_genres(user: User = Depends(get_current_user)):
+async def get_genres(
+    request: Request,
+    user: CatalogUser = Depends(get_catalog_user),
+) -> Response:
     """
     Endpoint to get all genres used for recommendations.
+
+    Cacheable: answers 304 when ``If-None-Match`` has the ETag.
     """
-    try:
-        # Ensure user is authenticated
-        if not user:
-            raise HTTPException(status_code=401, detail="Unauthorized request")
+    # Ensure user is authenticated
+    if not user:
+        raise HTTPException(status_code=401, detail="Unauthorized request")
 
-        return genres
-    except Exception as e:
-        logger.error(f"Failed to fetch gneres: {e}")
-        raise HTTPException(status_code=500, detail="Failed to fetch genres")
+    return genres_response.response(request)
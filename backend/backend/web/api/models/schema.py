@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic import BaseModel
 
 
@@ -7,3 +9,37 @@ class RecommendationModel(BaseModel):
     name: str
     description: str
     version: str
+
+
+class CircuitStatus(BaseModel):
+    """Model for returning the circuit breaker state of a recommendation model."""
+
+    state: str
+    consecutive_failures: int
+    times_opened: int
+    rejected_calls: int
+    retry_after: Optional[float] = None
+
+
+class RecommendationModelStats(BaseModel):
+    """Model for returning the health and latency stats of a recommendation model."""
+
+    loaded: bool
+    load_error: Optional[str] = None
+    max_concurrency: int
+    timeout: float
+    circuit: CircuitStatus
+    calls: int
+    successes: int
+    failures: int
+    timeouts: int
+    rejected: int
+    in_flight: int
+    latency_p50: Optional[float] = None
+    latency_p95: Optional[float] = None
+
+
+class RecommendationModelStatus(RecommendationModel):
+    """Model for returning recommendation models along with their stats."""
+
+    stats: RecommendationModelStats
@@ -1,80 +1,115 @@
-from fastapi import APIRouter, Depends, HTTPException
+from functools import lru_cache
+from typing import Dict, List
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import Response
 from loguru import logger
 
 from backend.db.models.user import User
 from backend.services.recommendations_manager.recommender_manager import (
-    RecommenderManager,
+    recommender_manager,
+)
+from backend.settings import settings
+from backend.web.api.auth.auth_utils import (
+    CatalogUser,
+    get_catalog_user,
+    get_current_user,
 )
-from backend.web.api.auth.auth_utils import get_current_user
-from backend.web.api.models.schema import RecommendationModel
+from backend.web.api.models.schema import RecommendationModel, RecommendationModelStatus
+from backend.web.cached_response import CachedJSON
 
 router = APIRouter()
 
-recommender_manager = RecommenderManager()
+
+class ModelCatalog:
+    """Encoded descriptions of the registered models."""
+
+    def __init__(self) -> None:
+        specs = recommender_manager.get_model_specs()
+        max_age = settings.catalog_max_age
+        self.names = CachedJSON([{"name": spec.name} for spec in specs], max_age)
+        self.by_name: Dict[str, CachedJSON] = {
+            spec.name: CachedJSON(spec.get_model_info(), max_age) for spec in specs
+        }
+
+
+@lru_cache(maxsize=1)
+def _model_catalog(version: int) -> ModelCatalog:
+    return ModelCatalog()
 
 
-@router.get("/")
+def get_model_catalog() -> ModelCatalog:
+    """Get the catalog, encoded again only when a model was added."""
+    return _model_catalog(recommender_manager.version)
+
+
+# Encoded when the worker starts.
+get_model_catalog()
+
+
+@router.get("/", response_model=List[RecommendationModelStatus])
 async def get_models(user: User = Depends(get_current_user)):
     """
-    Endpoint to get all recommendation models.
+    Endpoint to get all recommendation models, with their health and latency stats.
+
+    Not cached, the stats are live. The descriptions alone are cacheable at
+    ``/models/names`` and ``/models/{model_name}``.
     """
     try:
         # Ensure user is authenticated
         if not user:
             raise HTTPException(status_code=401, detail="Unauthorized request")
 
-        models = recommender_manager.get_all_models()
+        models = recommender_manager.get_model_specs()
         models_list = [
             {
-                "name": model.name,
-                "description": model.description,
-                "version": model.version,
+                **model.get_model_info(),
+                "stats": recommender_manager.get_model_stats(model.name),
             }
             for model in models
         ]
         logger.info("Models fetched successfully" + str(models_list))
         return models_list
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Failed to fetch models: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch models")
 
 
 @router.get("/names")
-async def get_model_names(user: User = Depends(get_current_user)):
+async def get_model_names(
+    request: Request,
+    user: CatalogUser = Depends(get_catalog_user),
+) -> Response:
     """
     Endpoint to get all recommendation model names.
-    """
-    try:
-        # Ensure user is authenticated
-        if not user:
-            raise HTTPException(status_code=401, detail="Unauthorized request")
 
-        models = recommender_manager.get_all_models()
+    Cacheable: answers 304 when ``If-None-Match`` has the ETag.
+    """
+    # Ensure user is authenticated
+    if not user:
+        raise HTTPException(status_code=401, detail="Unauthorized request")
 
-        model_names = [{"name": model.get_model_info()["name"]} for model in models]
-        logger.info("Model names fetched successfully")
-        return model_names
-    except Exception as e:
-        logger.error(f"Failed to fetch model names: {e}")
-        raise HTTPException(status_code=500, detail="Failed to fetch model names")
+    return get_model_catalog().names.response(request)
 
 
 @router.get("/{model_name}", response_model=RecommendationModel)
-async def get_model_info(model_name: str, user: User = Depends(get_current_user)):
+async def get_model_info(
+    model_name: str,
+    request: Request,
+    user: CatalogUser = Depends(get_catalog_user),
+) -> Response:
     """
     Endpoint to get information about a specific recommendation model.
+
+    Cacheable: answers 304 when ``If-None-Match`` has the ETag.
     """
-    try:
-        # Ensure user is authenticated
-        if not user:
-            raise HTTPException(status_code=401, detail="Unauthorized request")
+    # Ensure user is authenticated
+    if not user:
+        raise HTTPException(status_code=401, detail="Unauthorized request")
 
-        model = recommender_manager.get_model_by_name(model_name)
-        if model:
-            logger.info(f"Model {model_name} fetched successfully")
-            return model.get_model_info()
-        else:
-            raise HTTPException(status_code=404, detail="Model not found")
-    except Exception as e:
-        logger.error(f"Failed to fetch model {model_name}: {e}")
-        raise HTTPException(status_code=500, detail="Failed to fetch model")
+    model = get_model_catalog().by_name.get(model_name)
+    if model is None:
+        raise HTTPException(status_code=404, detail="Model not found")
+    return model.response(request)
@@ -1,5 +1,8 @@
 from fastapi import APIRouter
 
+from backend.services.metrics import collect_metrics
+from backend.services.resources import available_cpus, get_resource_plan
+
 router = APIRouter()
 
 
@@ -10,3 +13,29 @@ def health_check() -> None:
 
     It returns 200 if the project is healthy.
     """
+
+
+@router.get("/metrics")
+def get_metrics() -> dict:
+    """
+    Returns the metrics of the services of this worker.
+
+    Includes the circuit breakers of external services and models.
+    """
+    return collect_metrics()
+
+
+@router.get("/diagnostics/resources")
+def get_resources() -> dict:
+    """
+    Returns the CPU thread plan of this worker.
+
+    Shows the CPUs detected (and whether the cgroup quota limits them) and
+    how they were split between workers, inference and executor threads.
+    """
+    cpus, source = available_cpus()
+    return {
+        "plan": get_resource_plan().to_dict(),
+        "cpus_now": cpus,
+        "cpus_now_source": source,
+    }
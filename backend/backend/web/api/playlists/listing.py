@@ -0,0 +1,66 @@
+"""
+Playlist listings built straight from database rows.
+
+The rows are turned into the JSON shape of ``ListPlaylistResponse`` without
+building and validating a pydantic model per playlist (and again in
+FastAPI's response validation), then encoded with orjson.
+"""
+import ast
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Tuple
+
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import Row
+
+# Genre lists repeat a lot across playlists.
+GENRES_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=GENRES_CACHE_SIZE)
+def parse_genres(genres: str) -> Tuple[str, ...]:
+    """
+    Parse the genres of a playlist, stored as the repr of a list.
+
+    :param genres: genres column of the playlist.
+    :return: the genres, shared between calls so a tuple.
+    """
+    return tuple(ast.literal_eval(genres))
+
+
+def listing_content(rows: Iterable[Row]) -> Dict[str, Any]:
+    """
+    Build the content of a ``ListPlaylistResponse``.
+
+    :param rows: ``LISTING_COLUMNS`` of the playlists.
+    :return: the same JSON content as the model.
+    """
+    return {
+        "playlists": [
+            {
+                "prompt": row.prompt,
+                "config": {
+                    "model": row.model,
+                    "num_songs": row.num_songs,
+                    "genres": parse_genres(row.genres),
+                    "popularity": row.popularity,
+                    "generate_genres": None,
+                    "taste_blend": None,
+                },
+                "context": {
+                    "spotify_id": row.spotify_id,
+                    "created_at": row.created_at,
+                },
+            }
+            for row in rows
+        ],
+    }
+
+
+def listing_response(rows: Iterable[Row]) -> ORJSONResponse:
+    """
+    Answer with a playlist listing.
+
+    :param rows: ``LISTING_COLUMNS`` of the playlists.
+    :return: the JSON response.
+    """
+    return ORJSONResponse(listing_content(rows))
@@ -0,0 +1,181 @@
+"""
+Benchmark the serialization of the playlist listings.
+
+Usage::
+
+    python -m backend.web.api.playlists.listing_benchmark --rows 1000 5000 10000
+
+Compares, on sample rows, the pydantic path the listings used to take (a
+``PlaylistGenerationResponse`` per row, FastAPI's response validation, then
+``UJSONResponse``) with ``listing_response``: time and peak memory allocated
+per response, and checks that both send the same JSON.
+"""
+import argparse
+import ast
+import asyncio
+import json
+import sys
+import time
+import tracemalloc
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from fastapi.responses import Response, UJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_cloned_field, create_response_field
+
+from backend.db.dao.playlist_dao import LISTING_COLUMNS
+from backend.services.metrics import percentile
+from backend.web.api.playlists.listing import listing_response, parse_genres
+from backend.web.api.playlists.schema import (
+    Config,
+    Context,
+    ListPlaylistResponse,
+    PlaylistGenerationResponse,
+)
+
+# Same attributes as the rows of the DAO.
+ListingRow = namedtuple("ListingRow", [column.key for column in LISTING_COLUMNS])
+
+SAMPLE_GENRES = (
+    ["jazz", "soul", "blues"],
+    ["k-pop", "work-out", "dance", "edm"],
+    ["acoustic", "rainy-day", "sad"],
+    ["rock", "hard-rock", "grunge", "punk", "metal"],
+    ["chill", "study", "ambient", "piano"],
+)
+
+# The response field of the routes, cloned the way FastAPI does it.
+RESPONSE_FIELD = create_cloned_field(
+    create_response_field(
+        name="Response_get_playlists", type_=Optional[ListPlaylistResponse]
+    ),
+)
+
+
+def sample_rows(count: int) -> List[ListingRow]:
+    """
+    Build playlist rows like the ones of the DAO.
+
+    :param count: number of rows.
+    :return: the rows.
+    """
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    return [
+        ListingRow(
+            prompt=f"sample prompt number {index} for a rainy afternoon",
+            model="Moodika-Model-A",
+            genres=str(SAMPLE_GENRES[index % len(SAMPLE_GENRES)]),
+            num_songs=20,
+            popularity=50 + index % 50,
+            spotify_id=f"{index:022d}",
+            created_at=start + timedelta(seconds=index * 37, microseconds=index),
+        )
+        for index in range(count)
+    ]
+
+
+async def pydantic_response(rows: List[ListingRow]) -> Response:
+    """
+    Build a listing response the way the routes did before ``listing``.
+
+    :param rows: playlist rows.
+    :return: the response.
+    """
+    playlists = ListPlaylistResponse(
+        playlists=[
+            PlaylistGenerationResponse(
+                prompt=row.prompt,
+                config=Config(
+                    model=row.model,
+                    num_songs=row.num_songs,
+                    genres=ast.literal_eval(row.genres),
+                    popularity=row.popularity,
+                ),
+                context=Context(
+                    spotify_id=row.spotify_id,
+                    created_at=row.created_at,
+                ),
+            )
+            for row in rows
+        ],
+    )
+    content = await serialize_response(
+        field=RESPONSE_FIELD,
+        response_content=playlists,
+        is_coroutine=True,
+    )
+    return UJSONResponse(content)
+
+
+async def fast_response(rows: List[ListingRow]) -> Response:
+    """
+    Build a listing response with ``listing_response``, genres not cached yet.
+
+    :param rows: playlist rows.
+    :return: the response.
+    """
+    parse_genres.cache_clear()
+    return listing_response(rows)
+
+
+async def _measure(
+    build: Callable[[List[ListingRow]], Awaitable[Response]],
+    rows: List[ListingRow],
+    runs: int,
+) -> Tuple[float, float, int]:
+    """
+    Time a way to build the response, then trace its allocations once.
+
+    :return: p50 milliseconds, peak allocated MB and body size.
+    """
+    await build(rows)  # Warm up.
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        await build(rows)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+
+    tracemalloc.start()
+    response = await build(rows)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return percentile(latencies, 0.5) * 1000, peak / 2**20, len(response.body)
+
+
+async def benchmark(row_counts: List[int], runs: int) -> bool:
+    """
+    Compare both ways to build listings of each size.
+
+    :param row_counts: numbers of playlists per listing.
+    :param runs: responses timed per size and way.
+    :return: whether both ways sent the same JSON.
+    """
+    paths = (("pydantic", pydantic_response), ("fast", fast_response))
+    same = True
+    print(f"{'rows':>6} {'path':<9} {'p50 ms':>8} {'peak MB':>8} {'body KB':>8}")
+    for count in row_counts:
+        rows = sample_rows(count)
+        old, new = await pydantic_response(rows), await fast_response(rows)
+        if json.loads(old.body) != json.loads(new.body):
+            print(f"{count:>6} the responses differ")
+            same = False
+        for name, build in paths:
+            p50, peak, size = await _measure(build, rows, runs)
+            print(f"{count:>6} {name:<9} {p50:>8.1f} {peak:>8.1f} {size / 1024:>8.0f}")
+    return same
+
+
+def main() -> None:
+    """Run the benchmark with the sizes given on the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 5000, 10000])
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+    sys.exit(0 if asyncio.run(benchmark(args.rows, args.runs)) else 1)
+
+
+if __name__ == "__main__":
+    main()
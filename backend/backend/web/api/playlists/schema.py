@@ -12,6 +12,9 @@ class Config(BaseModel):
     genres: Optional[Sequence[str]] = None
     popularity: Optional[int] = 50
     generate_genres: Optional[str] = None
+    # Weight (0 to 1) of the user's taste profile in the target audio
+    # features, the server default if unset.
+    taste_blend: Optional[float] = None
 
 
 class Context(BaseModel):
@@ -39,6 +42,15 @@ class PlaylistGenerationResponse(PlaylistBase):
     context: Optional[Context] = None
 
 
+class GenerationJobResponse(BaseModel):
+    """Model for returning the state of a queued playlist generation."""
+
+    job_id: str
+    status: str
+    error: Optional[str] = None
+    playlist: Optional[PlaylistGenerationResponse] = None
+
+
 class ListPlaylistResponse(BaseModel):
     """Model for returning a list of PlaylistsResponse to the client."""
 
@@ -1,21 +1,38 @@
 import ast
-import time
+import asyncio
+import hashlib
+import json
+import uuid
 from datetime import datetime, timezone
 from typing import Optional
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Header, HTTPException, Request
 from fastapi.param_functions import Depends
+from fastapi.responses import JSONResponse
 from loguru import logger
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from backend.db.dao.generation_job_dao import GenerationJobDAO
 from backend.db.dao.playlist_dao import PlaylistDAO
+from backend.db.models.generation_job import DONE, FAILED, GenerationJob
 from backend.db.models.user import User
+from backend.services.metrics import register_metrics
 from backend.services.recommendations_manager.recommender_manager import (
-    RecommenderManager,
+    recommender_manager,
 )
+from backend.services.resilience import (
+    AdmissionController,
+    ServiceUnavailableError,
+    TooManyRequestsError,
+)
+from backend.services.taste_profile import load_taste_blend, taste_blend
+from backend.settings import settings
 from backend.web.api.auth.auth_utils import generate_short_uuid, get_current_user_sp
+from backend.web.api.playlists.listing import listing_response
 from backend.web.api.playlists.schema import (
     Config,
     Context,
+    GenerationJobResponse,
     ListPlaylistResponse,
     Playlist,
     PlaylistGenerationRequest,
@@ -23,7 +40,19 @@ from backend.web.api.playlists.schema import (
 )
 
 router = APIRouter()
-recommender_manager = RecommenderManager()
+
+# Namespace of the job IDs derived from idempotency keys.
+JOB_ID_NAMESPACE = uuid.UUID("3f5d1c2e-8a47-4b6e-9c1d-2a7e5b9f0c64")
+
+generation_admission = AdmissionController(
+    "generation",
+    max_in_flight=settings.generation_max_in_flight,
+    client_max_in_flight=settings.generation_user_max_in_flight,
+    client_rate=settings.generation_user_rate / 60,
+    client_burst=settings.generation_user_burst,
+    retention=settings.generation_idempotency_ttl,
+)
+register_metrics("generation_admission", generation_admission.snapshot)
 
 
 @router.get("/", response_model=Optional[ListPlaylistResponse])
@@ -35,6 +64,9 @@ async def get_playlists(
 ):
     """
     Retrieve a number of playlists from user.
+
+    The response_model only documents the response, it is built from the
+    rows directly (see ``listing``).
     """
     try:
         # Ensure user is authenticated
@@ -47,25 +79,8 @@ async def get_playlists(
             page=page,
         )
 
-        logger.info("this is what is inside of the plyalists results" + str(playlists))
-        playlist_responses = [
-            PlaylistGenerationResponse(
-                prompt=playlist.prompt,
-                config=Config(
-                    model=playlist.model,
-                    num_songs=playlist.num_songs,
-                    genres=ast.literal_eval(playlist.genres),
-                    popularity=playlist.popularity,
-                ),  # Populate with actual config data if available
-                context=Context(
-                    spotify_id=playlist.spotify_id,
-                    created_at=playlist.created_at,
-                ),  # Populate with actual context data if available
-            )
-            for playlist in playlists
-        ]
-
-        return ListPlaylistResponse(playlists=playlist_responses)
+        logger.info(f"Listing {len(playlists)} playlists of {user.spotify_id}")
+        return listing_response(playlists)
     except Exception as e:
         logger.error(f"Error retrieving playlists for user {user.spotify_id}: {e}")
         logger.info("exception cause" + str(e))
@@ -105,6 +120,9 @@ async def get_playlists(
 ):
     """
     Retrieve a search of playlists from user.
+
+    The response_model only documents the response, it is built from the
+    rows directly (see ``listing``).
     """
     try:
         # Ensure user is authenticated
@@ -116,25 +134,8 @@ async def get_playlists(
             prompt=searchTerm,
         )
 
-        logger.info("this is what is inside of the plyalists results" + str(playlists))
-        playlist_responses = [
-            PlaylistGenerationResponse(
-                prompt=playlist.prompt,
-                config=Config(
-                    model=playlist.model,
-                    num_songs=playlist.num_songs,
-                    genres=ast.literal_eval(playlist.genres),
-                    popularity=playlist.popularity,
-                ),  # Populate with actual config data if available
-                context=Context(
-                    spotify_id=playlist.spotify_id,
-                    created_at=playlist.created_at,
-                ),  # Populate with actual context data if available
-            )
-            for playlist in playlists
-        ]
-
-        return ListPlaylistResponse(playlists=playlist_responses)
+        logger.info(f"Listing {len(playlists)} playlists of {user.spotify_id}")
+        return listing_response(playlists)
     except Exception as e:
         logger.error(f"Error retrieving playlists for user {user.spotify_id}: {e}")
         logger.info("exception cause" + str(e))
@@ -143,59 +144,209 @@ async def get_playlists(
         raise HTTPException(status_code=500, detail="An unexpected error occurred")
 
 
+def _generation_response(
+    generated_playlist: dict,
+    created_at: datetime,
+) -> PlaylistGenerationResponse:
+    config = Config(
+        model=generated_playlist["config"].get("model"),
+        num_songs=generated_playlist["config"].get("num_songs"),
+        genres=generated_playlist["config"].get("genres"),
+        popularity=generated_playlist["config"].get("popularity"),
+        generate_genres=generated_playlist["config"].get("generate_genres"),
+    )
+
+    context = Context(
+        spotify_id=generated_playlist["context"].get("spotify_id"),
+        created_at=created_at,
+    )
+    return PlaylistGenerationResponse(
+        prompt=generated_playlist.get("prompt"),
+        config=config,
+        context=context,
+    )
+
+
+def _job_response(job: GenerationJob) -> GenerationJobResponse:
+    playlist = None
+    if job.status == DONE and job.result:
+        playlist = _generation_response(job.result, job.updated_at)
+    return GenerationJobResponse(
+        job_id=job.id,
+        status=job.status,
+        error=job.error,
+        playlist=playlist,
+    )
+
+
+def _idempotency_key(
+    new_playlist: PlaylistGenerationRequest, header: Optional[str]
+) -> Optional[str]:
+    """
+    Get the key identifying a generation across retries.
+
+    Without a key from the client, it is derived from the prompt and the
+    config if ``generation_derive_idempotency_key`` is set, so identical
+    requests of a user are generated once. Otherwise the generation has
+    no key, and every request makes a playlist.
+    """
+    if header:
+        return header
+    if not settings.generation_derive_idempotency_key:
+        return None
+    request_data = {
+        "prompt": " ".join(new_playlist.prompt.lower().split()),
+        "config": new_playlist.config.dict(),
+    }
+    digest = hashlib.sha256(json.dumps(request_data, sort_keys=True).encode())
+    return f"derived-{digest.hexdigest()}"
+
+
+async def _generate_in_worker(
+    new_playlist: PlaylistGenerationRequest,
+    request: Request,
+    user: User,
+    session: AsyncSession,
+    key: Optional[str],
+) -> Optional[GenerationJob]:
+    """
+    Queue a generation and wait for a worker to run it.
+
+    The job ID comes from the idempotency key, so a retry handled by
+    another web worker waits for the same job.
+
+    :return: the job, finished unless the wait timed out.
+    """
+    if key is None:
+        job_id = str(uuid.uuid4())
+    else:
+        job_id = str(uuid.uuid5(JOB_ID_NAMESPACE, f"{user.spotify_id}:{key}"))
+    job_dao = GenerationJobDAO(session)
+    await job_dao.enqueue(
+        id=job_id,
+        prompt=new_playlist.prompt,
+        config=new_playlist.config.dict(),
+        # Through JSON, for the dates.
+        context=json.loads(new_playlist.context.json()) if new_playlist.context else {},
+        owner_id=user.spotify_id,
+        max_attempts=settings.generation_job_max_attempts,
+        retention=settings.generation_idempotency_ttl,
+    )
+    return await request.app.state.job_waiter.wait(
+        job_id,
+        lambda: job_dao.get(job_id),
+        timeout=settings.generation_queue_wait,
+    )
+
+
+async def _generate(
+    new_playlist: PlaylistGenerationRequest,
+    request: Request,
+    user: User,
+    key: Optional[str],
+):
+    """
+    Run a generation, in this process or in a queue worker.
+
+    Runs outlive their request (see ``AdmissionController``), so they open
+    their own sessions instead of using the request's one.
+    """
+    if settings.generation_queue_enabled:
+        async with request.app.state.db_session_factory() as session:
+            job = await _generate_in_worker(new_playlist, request, user, session, key)
+        if job is not None and job.status not in (DONE, FAILED):
+            return JSONResponse(
+                status_code=202,
+                content=json.loads(_job_response(job).json()),
+                headers={
+                    "Location": str(
+                        request.url_for("get_generation_job", job_id=job.id)
+                    ),
+                },
+            )
+        generated_playlist = job.result if job is not None else None
+    else:
+        async with request.app.state.db_session_factory() as session:
+            blend = await load_taste_blend(
+                session,
+                user.spotify_id,
+                new_playlist.config.taste_blend,
+            )
+        # Generate playlist using the recommender manager
+        with taste_blend(blend):
+            generated_playlist = await recommender_manager.generate_playlist(
+                prompt=new_playlist.prompt,
+                config=new_playlist.config.dict(),
+                context=new_playlist.context.dict(),
+                access_token=user.spotify_token,
+            )
+
+    if not generated_playlist:
+        logger.error("The playlist was not generated.")
+        raise HTTPException(status_code=500, detail="Playlist generation failed")
+    logger.info("Generated_playlist." + str(generated_playlist))
+
+    # Simulate a delay to ensure Spotify processes the playlist
+    await asyncio.sleep(2)
+
+    response = _generation_response(generated_playlist, datetime.now(timezone.utc))
+
+    logger.debug(f"Response to be returned: {response}")
+
+    return response
+
+
 @router.post("/generate", response_model=PlaylistGenerationResponse)
 async def generate_playlist(
     new_playlist: PlaylistGenerationRequest,
+    request: Request,
     user: User = Depends(get_current_user_sp),
+    idempotency_key: Optional[str] = Header(None, max_length=255),
 ):
     """
     Creates a new playlist with the given prompt, config, and context.
 
+    With the generation queue enabled, the generation is run by a worker.
+    If it takes longer than ``generation_queue_wait``, a 202 with the job
+    is returned instead, to be followed at ``/playlists/jobs/{job_id}``.
+
+    Generations are admitted per user and overall (see
+    ``generation_admission``), rejected ones get a 429 with Retry-After.
+    A request with the ``Idempotency-Key`` of a generation still running,
+    or finished less than ``generation_idempotency_ttl`` seconds ago, gets
+    the result of that generation instead of creating another playlist.
+    Without the header, the key is derived from the prompt and config if
+    ``generation_derive_idempotency_key`` is set.
+
     :param new_playlist: new playlist details.
+    :param idempotency_key: key identifying the request across retries.
     """
 
     try:
         if not user:
             raise HTTPException(status_code=401, detail="Unauthorized request")
 
-        # Generate playlist using the recommender manager
-        generated_playlist = recommender_manager.generate_playlist(
-            prompt=new_playlist.prompt,
-            config=new_playlist.config.dict(),
-            context=new_playlist.context.dict(),
-            access_token=user.spotify_token,
-        )
-
-        if not generated_playlist:
-            logger.error("The playlist was not generated.")
-            raise HTTPException(status_code=500, detail="Playlist generation failed")
-        logger.info("Generated_playlist." + str(generated_playlist))
+        key = _idempotency_key(new_playlist, idempotency_key)
 
-        # Simulate a delay to ensure Spotify processes the playlist
-        time.sleep(2)
+        def _start():
+            return _generate(new_playlist, request, user, key)
 
-        config = Config(
-            model=generated_playlist["config"].get("model"),
-            num_songs=generated_playlist["config"].get("num_songs"),
-            genres=generated_playlist["config"].get("genres"),
-            popularity=generated_playlist["config"].get("popularity"),
-            generate_genres=generated_playlist["config"].get("generate_genres"),
+        if not settings.generation_admission_enabled:
+            return await _start()
+        return await generation_admission.run(
+            user.spotify_id,
+            key,
+            _start,
+            # Queued jobs answer their retries themselves, and 202s must not be replayed.
+            retain=not settings.generation_queue_enabled,
         )
 
-        context = Context(
-            spotify_id=generated_playlist["context"].get("spotify_id"),
-            created_at=datetime.now(timezone.utc),
-        )
-        response = PlaylistGenerationResponse(
-            prompt=generated_playlist.get("prompt"),
-            config=config,
-            context=context,
-        )
-
-        logger.debug(f"Response to be returned: {response}")
-
-        return response
-
+    except (HTTPException, TooManyRequestsError):
+        raise
+    except ServiceUnavailableError as e:
+        # Answered with a 503 by the application's exception handler
+        logger.warning(f"Playlist generation rejected: {e}")
+        raise
     except ValueError as e:
         logger.error(f"An unexpected error occurred: {e}")
         raise HTTPException(status_code=400, detail=f"{e}")
@@ -210,6 +361,26 @@ async def generate_playlist(
         )
 
 
+@router.get("/jobs/{job_id}", response_model=GenerationJobResponse)
+async def get_generation_job(
+    job_id: str,
+    user: User = Depends(get_current_user_sp),
+    job_dao: GenerationJobDAO = Depends(),
+):
+    """
+    Get the state of a queued playlist generation, and its playlist once done.
+
+    :param job_id: ID of the job returned by /generate.
+    """
+    if not user:
+        raise HTTPException(status_code=401, detail="Unauthorized request")
+
+    job = await job_dao.get(job_id)
+    if job is None or job.owner_id != user.spotify_id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _job_response(job)
+
+
 @router.post("/save")
 async def save_playlist(
     playlist_request: PlaylistGenerationRequest,
@@ -1,18 +1,62 @@
+import math
 from importlib import metadata
 from pathlib import Path
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import UJSONResponse
 from fastapi.staticfiles import StaticFiles
 
 from backend.logging import configure_logging
+from backend.services.resilience import ServiceUnavailableError, TooManyRequestsError
 from backend.web.api.router import api_router
 from backend.web.lifetime import register_shutdown_event, register_startup_event
 
 APP_ROOT = Path(__file__).parent.parent
 
 
+async def service_unavailable_handler(
+    request: Request,
+    exc: ServiceUnavailableError,
+) -> UJSONResponse:
+    """
+    Answers requests that failed fast because a dependency is unavailable.
+
+    :param request: current request.
+    :param exc: raised exception.
+    :return: 503 response, with Retry-After when known.
+    """
+    headers = {}
+    if exc.retry_after is not None:
+        headers["Retry-After"] = str(max(int(exc.retry_after), 1))
+    return UJSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers=headers,
+    )
+
+
+async def too_many_requests_handler(
+    request: Request,
+    exc: TooManyRequestsError,
+) -> UJSONResponse:
+    """
+    Answers requests rejected by admission control.
+
+    :param request: current request.
+    :param exc: raised exception.
+    :return: 429 response, with Retry-After when known.
+    """
+    headers = {}
+    if exc.retry_after is not None:
+        headers["Retry-After"] = str(max(math.ceil(exc.retry_after), 1))
+    return UJSONResponse(
+        status_code=429,
+        content={"detail": str(exc)},
+        headers=headers,
+    )
+
+
 def get_app() -> FastAPI:
     """
     Get FastAPI application.
@@ -38,6 +82,9 @@ def get_app() -> FastAPI:
         allow_headers=["*"],
     )
 
+    app.add_exception_handler(ServiceUnavailableError, service_unavailable_handler)
+    app.add_exception_handler(TooManyRequestsError, too_many_requests_handler)
+
     # Adds startup and shutdown events.
     register_startup_event(app)
     register_shutdown_event(app)
@@ -0,0 +1,55 @@
+"""
+JSON responses serialized once and revalidated with ETags.
+
+For data that only changes on deploy (the genres, the model catalog): the
+body is encoded when the process starts, and clients sending back its ETag
+in ``If-None-Match`` get an empty 304.
+"""
+import hashlib
+from typing import Any
+
+import ujson
+from fastapi.encoders import jsonable_encoder
+from starlette.requests import Request
+from starlette.responses import Response
+
+
+class CachedJSON:
+    """Pre-encoded JSON body with a strong ETag."""
+
+    def __init__(self, content: Any, max_age: int):
+        # Encoded like UJSONResponse, the default response class.
+        self.body = ujson.dumps(jsonable_encoder(content), ensure_ascii=False).encode(
+            "utf-8"
+        )
+        self.etag = f'"{hashlib.sha256(self.body).hexdigest()[:32]}"'
+        # Private: the endpoints are authenticated, shared caches must not store them.
+        self.headers = {
+            "ETag": self.etag,
+            "Cache-Control": f"private, max-age={max_age}, must-revalidate",
+        }
+
+    def matches(self, request: Request) -> bool:
+        """
+        Check whether the client already has this body.
+
+        :param request: current request.
+        :return: True if ``If-None-Match`` names the ETag.
+        """
+        if_none_match = request.headers.get("if-none-match")
+        if not if_none_match:
+            return False
+        tags = {tag.strip() for tag in if_none_match.split(",")}
+        # Weak comparison, as RFC 9110 requires for If-None-Match.
+        return "*" in tags or self.etag in tags or f"W/{self.etag}" in tags
+
+    def response(self, request: Request) -> Response:
+        """
+        Answer a request with the body, or a 304 if the client has it.
+
+        :param request: current request.
+        :return: the response.
+        """
+        if self.matches(request):
+            return Response(status_code=304, headers=self.headers)
+        return Response(self.body, media_type="application/json", headers=self.headers)
@@ -1,11 +1,23 @@
+import asyncio
+import sys
 from typing import Awaitable, Callable
 
 from fastapi import FastAPI
+from loguru import logger
 from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 
 from backend.db.meta import meta
+from backend.db.migrate import verify_schema_revision
 from backend.db.models import load_all_models
-from backend.settings import settings
+from backend.services.generation_queue import JobWaiter
+from backend.services.prompt_warmup import PromptWarmup
+from backend.services.recommendations_manager.recommender_manager import (
+    recommender_manager,
+)
+from backend.services.recommendations_manager.track_index import save_track_index
+from backend.services.resources import WEB, apply_resource_plan, create_default_executor
+from backend.services.spotify_manager.spotify_client import close_spotify_http
+from backend.settings import SchemaStartupMode, settings
 
 
 def _setup_db(app: FastAPI) -> None:  # pragma: no cover
@@ -27,13 +39,93 @@ def _setup_db(app: FastAPI) -> None:  # pragma: no cover
     app.state.db_session_factory = session_factory
 
 
-async def _create_tables() -> None:  # pragma: no cover
-    """Populates tables in the database."""
+async def _create_tables(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Populates tables in the database.
+
+    Only meant for local development, deployments run migrations instead.
+
+    :param app: fastAPI application.
+    """
     load_all_models()
-    engine = create_async_engine(str(settings.db_url))
-    async with engine.begin() as connection:
+    async with app.state.db_engine.begin() as connection:
         await connection.run_sync(meta.create_all)
-    await engine.dispose()
+
+
+async def _prepare_schema(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Makes sure the database schema is usable according to the startup mode.
+
+    :param app: fastAPI application.
+    """
+    if settings.db_startup_mode == SchemaStartupMode.VERIFY:
+        await verify_schema_revision(app.state.db_engine)
+    elif settings.db_startup_mode == SchemaStartupMode.CREATE:
+        await _create_tables(app)
+
+
+# Dependencies that must only be imported when a model is loaded.
+HEAVY_MODULES = (
+    "torch",
+    "sentence_transformers",
+    "onnxruntime",
+    "pandas",
+    "openai",
+)
+
+
+def _report_import_costs() -> None:  # pragma: no cover
+    """Logs which heavy dependencies were imported before the app started."""
+    eagerly_imported = [name for name in HEAVY_MODULES if name in sys.modules]
+    if eagerly_imported:
+        logger.warning(
+            f"Heavy modules imported during startup: {eagerly_imported}. "
+            "They should only be imported when a model is loaded.",
+        )
+    logger.info(f"Startup finished with {len(sys.modules)} modules imported")
+
+
+async def _start_job_waiter(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Listens for finished generation jobs, when generations are queued.
+
+    :param app: fastAPI application.
+    """
+    app.state.job_waiter = None
+    if settings.generation_queue_enabled:
+        app.state.job_waiter = JobWaiter()
+        await app.state.job_waiter.start(app.state.db_engine)
+
+
+def _start_models_warmup(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Preloads recommendation models without delaying the startup.
+
+    Workers run the generations when they are queued, the web workers
+    don't need the models then.
+
+    :param app: fastAPI application.
+    """
+    app.state.models_warmup_task = None
+    if settings.models_warmup and not settings.generation_queue_enabled:
+        app.state.models_warmup_task = asyncio.create_task(
+            recommender_manager.warmup(),
+        )
+
+
+def _start_prompt_warmup(app: FastAPI) -> None:  # pragma: no cover
+    """
+    Keeps the popular prompts precomputed, where the generations run.
+
+    :param app: fastAPI application.
+    """
+    app.state.prompt_warmup = None
+    if settings.prompt_warmup_enabled and not settings.generation_queue_enabled:
+        app.state.prompt_warmup = PromptWarmup(
+            app.state.db_engine,
+            app.state.db_session_factory,
+        )
+        app.state.prompt_warmup.start()
 
 
 def register_startup_event(
@@ -52,9 +144,16 @@ def register_startup_event(
     @app.on_event("startup")
     async def _startup() -> None:  # noqa: WPS430
         app.middleware_stack = None
+        # Before any model is loaded, so their thread pools follow the plan.
+        app.state.resource_plan = apply_resource_plan(WEB)
+        asyncio.get_running_loop().set_default_executor(create_default_executor())
         _setup_db(app)
-        await _create_tables()
+        await _prepare_schema(app)
+        await _start_job_waiter(app)
         app.middleware_stack = app.build_middleware_stack()
+        _report_import_costs()
+        _start_models_warmup(app)
+        _start_prompt_warmup(app)
         pass  # noqa: WPS420
 
     return _startup
@@ -72,6 +171,15 @@ def register_shutdown_event(
 
     @app.on_event("shutdown")
     async def _shutdown() -> None:  # noqa: WPS430
+        if app.state.models_warmup_task is not None:
+            app.state.models_warmup_task.cancel()
+        if app.state.prompt_warmup is not None:
+            await app.state.prompt_warmup.stop()
+        if app.state.job_waiter is not None:
+            await app.state.job_waiter.stop()
+        recommender_manager.shutdown()
+        save_track_index()
+        await close_spotify_http()
         await app.state.db_engine.dispose()
 
         pass  # noqa: WPS420
@@ -0,0 +1 @@
+"""Standalone playlist generation workers, see ``python -m backend.worker``."""
@@ -0,0 +1,19 @@
+import asyncio
+
+from backend.logging import configure_logging
+from backend.services.resources import WORKER, apply_resource_plan
+from backend.worker.worker import run_worker
+
+
+def main() -> None:
+    """Entrypoint of a generation worker."""
+    configure_logging()
+    apply_resource_plan(WORKER)
+    try:
+        asyncio.run(run_worker())
+    except KeyboardInterrupt:
+        pass  # noqa: WPS420
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+import asyncio
+import os
+import signal
+import socket
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Optional, Set, TypeVar
+
+from loguru import logger
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from backend.db.dao.generation_job_dao import JOBS_CHANNEL, GenerationJobDAO
+from backend.db.dao.user_dao import UserDAO
+from backend.db.models import load_all_models
+from backend.db.models.generation_job import GenerationJob
+from backend.services.generation_queue import Listener
+from backend.services.prompt_warmup import PromptWarmup
+from backend.services.recommendations_manager.recommender_manager import (
+    recommender_manager,
+)
+from backend.services.recommendations_manager.track_index import save_track_index
+from backend.services.resilience import ServiceUnavailableError
+from backend.services.resources import create_default_executor
+from backend.services.spotify_manager.spotify_client import (
+    PlaylistRecord,
+    close_spotify_http,
+    playlist_record,
+)
+from backend.services.taste_profile import load_taste_blend, taste_blend
+from backend.settings import settings
+from backend.web.api.auth.auth_utils import (
+    refresh_spotify_token,
+    spotify_access_token_valid,
+)
+
+T = TypeVar("T")
+
+
+class Worker:
+    """
+    Runs the queued generations, up to ``worker_concurrency`` at a time.
+
+    Any number of workers, on any node, can consume the same queue: a job
+    is claimed by exactly one of them, which renews its reservation while
+    it runs. If the worker dies, the reservation expires and another one
+    runs the job again, up to its maximum number of attempts. A playlist
+    created by an attempt is recorded on the job, and the next attempts
+    fill it again instead of creating another one.
+    """
+
+    def __init__(self, session_factory: async_sessionmaker, concurrency: int):
+        self.session_factory = session_factory
+        self.concurrency = concurrency
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}"
+        self.wakeup = asyncio.Event()
+        self.stopping = asyncio.Event()
+        self.running: Set["asyncio.Task[None]"] = set()
+
+    async def _queue(self, operation: Callable[[GenerationJobDAO], Awaitable[T]]) -> T:
+        async with self.session_factory() as session:
+            return await operation(GenerationJobDAO(session))
+
+    async def _access_token(self, owner_id: str) -> Optional[str]:
+        """
+        Get the Spotify token of a user, refreshed like the web requests do
+        once it's an hour old.
+        """
+        async with self.session_factory() as session:
+            user_dao = UserDAO(session)
+            user = await user_dao.get_by_spotify_id(owner_id)
+            if user is None:
+                return None
+            if not spotify_access_token_valid(user.spotify_token_created_at):
+                new_spotify_token_created_at = datetime.now(timezone.utc)
+                new_info = await refresh_spotify_token(
+                    old_refresh_token=user.spotify_refresh_token,
+                )
+                if new_info is None:
+                    raise RuntimeError("Spotify token not refreshed")
+                await user_dao.update_spotify_tokens(
+                    spotify_id=owner_id,
+                    spotify_token=new_info["new_access_token"],
+                    spotify_refresh_token=new_info["new_refresh_token"],
+                    spotify_token_created_at=new_spotify_token_created_at,
+                )
+                logger.info(f"User {owner_id} has a new Spotify access token")
+                return new_info["new_access_token"]
+            return user.spotify_token
+
+    async def _record_playlist(self, job: GenerationJob, playlist_id: str) -> None:
+        try:
+            await self._queue(
+                lambda dao: dao.record_playlist(job.id, self.worker_id, playlist_id),
+            )
+        except Exception as e:
+            logger.error(f"Playlist of job {job.id} not recorded: {e}")
+
+    def notify(self, job_id: str) -> None:
+        self.wakeup.set()
+
+    async def _keep_reserved(self, job: GenerationJob) -> None:
+        timeout = settings.generation_job_visibility_timeout
+        while True:
+            await asyncio.sleep(timeout / 3)
+            reserved = await self._queue(
+                lambda dao: dao.extend(job.id, self.worker_id, timeout),
+            )
+            if not reserved:
+                logger.warning(f"Job {job.id} was claimed by another worker")
+                return
+
+    async def _run_job(self, job: GenerationJob) -> None:
+        logger.info(f"Running job {job.id} (attempt {job.attempts}/{job.max_attempts})")
+        heartbeat = asyncio.ensure_future(self._keep_reserved(job))
+        try:
+            access_token = await self._access_token(job.owner_id)
+            if access_token is None:
+                raise ValueError(f"User {job.owner_id} not found")
+            async with self.session_factory() as session:
+                blend = await load_taste_blend(
+                    session,
+                    job.owner_id,
+                    job.config.get("taste_blend"),
+                )
+            record = PlaylistRecord(
+                job.playlist_id,
+                lambda playlist_id: self._record_playlist(job, playlist_id),
+            )
+            with taste_blend(blend), playlist_record(record):
+                playlist = await recommender_manager.generate_playlist(
+                    prompt=job.prompt,
+                    config=dict(job.config),
+                    context=dict(job.context),
+                    access_token=access_token,
+                )
+            if not playlist:
+                # The adapters log their errors and return nothing.
+                raise RuntimeError("Playlist generation failed")
+        except asyncio.CancelledError:
+            await self._fail(job, "Worker stopped", retry_in=0)
+            raise
+        except ServiceUnavailableError as e:
+            await self._fail(
+                job,
+                str(e),
+                retry_in=e.retry_after or settings.generation_job_retry_delay,
+            )
+        except ValueError as e:
+            await self._fail(job, str(e), retry_in=None)
+        except Exception as e:
+            await self._fail(
+                job,
+                str(e),
+                retry_in=settings.generation_job_retry_delay * job.attempts,
+            )
+        else:
+            await self._queue(
+                lambda dao: dao.complete(job.id, self.worker_id, playlist)
+            )
+            logger.info(f"Job {job.id} done")
+        finally:
+            heartbeat.cancel()
+
+    async def _fail(
+        self, job: GenerationJob, error: str, retry_in: Optional[float]
+    ) -> None:
+        status = await asyncio.shield(
+            self._queue(lambda dao: dao.fail(job.id, self.worker_id, error, retry_in)),
+        )
+        logger.warning(f"Job {job.id} failed ({error}), now {status}")
+
+    async def _claim(self) -> Optional[GenerationJob]:
+        try:
+            return await self._queue(
+                lambda dao: dao.claim(
+                    self.worker_id,
+                    settings.generation_job_visibility_timeout,
+                ),
+            )
+        except Exception as e:
+            logger.error(f"Failed to claim a job: {e}")
+            return None
+
+    async def _idle(self) -> None:
+        """Wait for a notification, polling the queue now and then anyway."""
+        try:
+            await self._queue(lambda dao: dao.fail_abandoned())
+        except Exception as e:
+            logger.error(f"Failed to check abandoned jobs: {e}")
+        try:
+            await asyncio.wait_for(
+                self.wakeup.wait(),
+                settings.generation_queue_poll_interval,
+            )
+        except asyncio.TimeoutError:
+            pass  # noqa: WPS420
+        self.wakeup.clear()
+
+    async def run(self) -> None:
+        """Consume the queue until ``stopping`` is set."""
+        slots = asyncio.Semaphore(self.concurrency)
+        logger.info(
+            f"Worker {self.worker_id} running {self.concurrency} jobs at a time"
+        )
+        while not self.stopping.is_set():
+            await slots.acquire()
+            job = await self._claim()
+            if job is None:
+                slots.release()
+                await self._idle()
+                continue
+            task = asyncio.ensure_future(self._run_job(job))
+            self.running.add(task)
+            task.add_done_callback(self.running.discard)
+            task.add_done_callback(lambda _: slots.release())
+
+    async def drain(self, timeout: float) -> None:
+        """
+        Let the running jobs finish, queueing again those that don't in time.
+
+        :param timeout: seconds to wait for them.
+        """
+        if not self.running:
+            return
+        logger.info(f"Waiting for {len(self.running)} running jobs")
+        _, pending = await asyncio.wait(set(self.running), timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.wait(pending)
+
+
+async def run_worker() -> None:
+    """Run a worker until SIGINT or SIGTERM."""
+    # The relationships of the models need all of them mapped.
+    load_all_models()
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(create_default_executor())
+    engine = create_async_engine(str(settings.db_url), echo=settings.db_echo)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    worker = Worker(session_factory, concurrency=settings.worker_concurrency)
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, worker.stopping.set)
+
+    listener = Listener(JOBS_CHANNEL, worker.notify)
+    await listener.start(engine)
+    if settings.models_warmup:
+        await recommender_manager.warmup()
+    prompt_warmup = PromptWarmup(engine, session_factory)
+    if settings.prompt_warmup_enabled:
+        prompt_warmup.start()
+    consuming = asyncio.ensure_future(worker.run())
+    try:
+        await worker.stopping.wait()
+    finally:
+        consuming.cancel()
+        await worker.drain(settings.worker_shutdown_timeout)
+        await prompt_warmup.stop()
+        await listener.stop()
+        recommender_manager.shutdown()
+        save_track_index()
+        await close_spotify_http()
+        await engine.dispose()
+        logger.info(f"Worker {worker.worker_id} stopped")